@@ -0,0 +1,120 @@
+import argparse
+import json
+import os
+import sys
+import time
+import faiss
+import numpy as np
+from rich.console import Console
+from rich.table import Table
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.config import settings
+from core.segment_store import SegmentStore
+from core.vector_index import STORAGE_TYPES, VectorIndex, truncate_embeddings
+
+console = Console()
+
+# Search-time knob swept for each index type
+SWEEPS = {
+    "flat": [None],
+    "ivf_flat": [1, 4, 8, 16, 32, 64, 128],
+    "hnsw": [16, 32, 64, 128, 256],
+    "ivf_pq": [1, 4, 8, 16, 32, 64, 128],
+}
+
+
+def load_vectors(index_dir: str) -> np.ndarray:
+    generation = SegmentStore(index_dir).open_generation()
+    if not generation.segments:
+        raise SystemExit(f"No index found in {index_dir}")
+    return np.concatenate([segment.vectors for segment in generation.segments]).astype(np.float32)
+
+
+def load_queries(vectors: np.ndarray, ground_truth_file: str, n_queries: int) -> np.ndarray:
+    """Embed the ground-truth questions, or fall back to a sample of corpus vectors."""
+    if ground_truth_file:
+        from core.rag_service import RAGService
+        with open(ground_truth_file) as f:
+            queries = [item["query"] for item in json.load(f)]
+        rag = RAGService()
+        return np.asarray(rag.query_cache.embed_queries(queries), dtype=np.float32)
+    rows = np.random.default_rng(0).choice(len(vectors), min(n_queries, len(vectors)), replace=False)
+    return vectors[rows]
+
+
+def recall_at_k(exact: np.ndarray, approx: list, k: int) -> float:
+    hits = sum(len(set(row[:k]) & set(approx_row)) for row, approx_row in zip(exact, approx))
+    return hits / (len(exact) * k)
+
+
+def evaluate(index_dir: str, index_types: list, k: int, ground_truth_file: str, n_queries: int, storage: str):
+    vectors = load_vectors(index_dir)
+    queries = truncate_embeddings(load_queries(vectors, ground_truth_file, n_queries), vectors.shape[1])
+    console.print(f"[bold blue]ANN recall@{k}: {len(vectors)} vectors (dim {vectors.shape[1]}), {len(queries)} queries[/bold blue]")
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, exact_ids = exact.search(queries, k)
+
+    table = Table(title=f"Recall vs. exact search (k={k})")
+    for column in ("Index", "Param", "Recall@K", "Latency (ms/query)", "Build (s)", "Size (MB)"):
+        table.add_column(column, justify="right" if column != "Index" else "left")
+
+    rows = []
+    for index_type in index_types:
+        start = time.time()
+        index = VectorIndex.build(
+            index_type, vectors, storage=storage, nlist=settings.ivf_nlist, hnsw_m=settings.hnsw_m,
+            ef_construction=settings.hnsw_ef_construction, pq_m=settings.pq_m,
+        )
+        build_time = time.time() - start
+        size_mb = len(faiss.serialize_index(index.index)) / 2**20
+        label = index.key if index.nlist is None else f"{index.key} (nlist={index.nlist})"
+
+        for param in SWEEPS[index.index_type]:
+            if index.nlist is not None and param is not None and param > index.nlist:
+                continue
+            search_kwargs = {"nprobe": param} if index.nlist is not None else {"ef_search": param}
+            start = time.time()
+            approx = index.search(queries, k, **search_kwargs)
+            latency_ms = (time.time() - start) * 1000 / len(queries)
+            recall = recall_at_k(exact_ids, approx, k)
+
+            param_label = "-" if param is None else f"{'nprobe' if index.nlist is not None else 'efSearch'}={param}"
+            table.add_row(label, param_label, f"{recall:.4f}", f"{latency_ms:.3f}", f"{build_time:.1f}", f"{size_mb:.1f}")
+            rows.append((label, param_label, recall, latency_ms, build_time, size_mb))
+
+    console.print(table)
+
+    report = f"""# ANN Recall Report
+
+**Date**: {time.strftime('%Y-%m-%d %H:%M:%S')}
+**Vectors**: {len(vectors)} (dim {vectors.shape[1]})
+**Queries**: {len(queries)}
+**K**: {k}
+
+| Index | Param | Recall@{k} | Latency (ms/query) | Build (s) | Size (MB) |
+|-------|-------|-----------|--------------------|-----------|-----------|
+"""
+    for label, param_label, recall, latency_ms, build_time, size_mb in rows:
+        report += f"| {label} | {param_label} | {recall:.4f} | {latency_ms:.3f} | {build_time:.1f} | {size_mb:.1f} |\n"
+    with open("ann_recall_report.md", "w") as f:
+        f.write(report)
+    print("\nReport saved to ann_recall_report.md")
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Measure ANN index recall and latency against exact search.")
+    parser.add_argument("--index-dir", default="./knowledge_base_index")
+    parser.add_argument("--types", nargs="+", default=["ivf_flat", "hnsw", "ivf_pq"], choices=list(SWEEPS))
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", default="", help="ground_truth.json to embed real questions (uses the embedding API)")
+    parser.add_argument("--n-queries", type=int, default=200)
+    parser.add_argument("--storage", default=settings.vector_storage, choices=list(STORAGE_TYPES))
+    args = parser.parse_args()
+    evaluate(args.index_dir, args.types, args.k, args.queries, args.n_queries, args.storage)
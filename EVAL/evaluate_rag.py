@@ -64,16 +64,19 @@ def evaluate(ground_truth_file: str = "ground_truth.json", k: int = 5):
     table.add_column("MRR", justify="right")
     table.add_column("Latency (s)", justify="right")
 
-    for item in ground_truth:
+    # Retrieve for the whole ground truth in one batch
+    # RAGService returns Document objects with metadata 'source'
+    queries = [item['query'] for item in ground_truth]
+    start_time = time.time()
+    batch_results = rag.hybrid_search_batch(queries, k=k)
+    batch_latency = time.time() - start_time
+    # Report the amortized per-query latency of the batch
+    latency = batch_latency / len(queries) if queries else 0
+
+    for item, retrieved_doc_objects in zip(ground_truth, batch_results):
         query = item['query']
         relevant_docs = item['relevant_docs']
         
-        start_time = time.time()
-        # Get retrieved documents
-        # RAGService returns Document objects with metadata 'source'
-        retrieved_doc_objects = rag.hybrid_search(query, k=k)
-        latency = time.time() - start_time
-        
         # Extract source filenames from metadata
         retrieved_sources = [doc.metadata.get('source', '') for doc in retrieved_doc_objects]
         
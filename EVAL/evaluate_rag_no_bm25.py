@@ -47,7 +47,7 @@ def evaluate_no_bm25(ground_truth_file: str = "ground_truth.json", k: int = 1):
 
     rag = RAGService()
     
-    if not rag.vector_store:
+    if rag.vector_index is None:
         console.print("[bold red]Vector store not initialized! Exiting.[/bold red]")
         return
 
@@ -72,9 +72,9 @@ def evaluate_no_bm25(ground_truth_file: str = "ground_truth.json", k: int = 1):
         
         start_time = time.time()
         
-        # --- KEY CHANGE: Use vector_store directly vs hybrid_search ---
+        # --- KEY CHANGE: Use semantic (vector-only) search vs hybrid_search ---
         # rag.hybrid_search(query, k=k) <--- Original
-        retrieved_doc_objects = rag.vector_store.similarity_search(query, k=k)
+        retrieved_doc_objects = rag.semantic_search(query, k=k)
         # -------------------------------------------------------------
         
         latency = time.time() - start_time
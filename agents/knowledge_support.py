@@ -1,15 +1,20 @@
 # agents/knowledge_support.py
 
+import asyncio
 from langchain_core.language_models import BaseLanguageModel
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import AIMessage
 from core.memory_service import MemoryService
-from core.rag_service import RAGService
+from core.retrieval_client import create_rag_service
+from core.context_compressor import ContextCompressor
+from core.answer_cache import SemanticAnswerCache
+from core.bm25_index import tokenize
+from core.config import settings
 from core.farm_log_manager import FarmLogManager
 from core.models import FarmLog
 from langchain_core.output_parsers import JsonOutputParser
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from datetime import datetime
 
 class ExpandedQueries(BaseModel):
@@ -29,7 +34,13 @@ class KnowledgeSupportAgent:
         self.llm = llm
         self.memory = memory_service
         self.log_manager = log_manager
-        self.rag = RAGService()
+        # In-process index, or a client for the shared retrieval server (RETRIEVAL_SERVER_URL)
+        self.rag = create_rag_service()
+        self.compressor = ContextCompressor(settings.context_token_budget)
+        # Generic answers to recent questions; only the personalization step is redone on a hit
+        self.answer_cache = SemanticAnswerCache(
+            settings.answer_cache_threshold, settings.answer_cache_ttl, settings.answer_cache_size
+        )
         
         # Activity Extraction Chain
         self.log_parser = JsonOutputParser(pydantic_object=ActivityLog)
@@ -54,16 +65,27 @@ class KnowledgeSupportAgent:
         # Query Router (Optimization)
         class QueryRouter(BaseModel):
             intent: str = Field(description="The intent of the user. Options: 'GREETING', 'GENERAL_CHAT', 'FARMING_QUERY'.")
+            category: str = Field(default="any", description="For FARMING_QUERY: the knowledge base section to search, or 'any'.")
+            standalone_question: str = Field(default="", description="The latest message rewritten to be understood without the conversation.")
         
         self.router_parser = JsonOutputParser(pydantic_object=QueryRouter)
         router_prompt = ChatPromptTemplate.from_template(
             """Classify the user instructions.
+            Conversation so far:
+            {chat_history}
+
             User Input: "{question}"
             
             Options:
             - GREETING: Hello, Hi, Thanks, Bye.
             - GENERAL_CHAT: How are you?, What is your name?, simple small talk.
             - FARMING_QUERY: Any question about crops, soil, chemicals, diseases, government schemes, prices, "how to", "why".
+
+            Knowledge base sections: {categories}
+            For a FARMING_QUERY, set category to the one section most likely to hold the answer, or "any" if unsure.
+            Set standalone_question to the user input rewritten so it makes sense without the conversation
+            (e.g. "what about for rice?" after a question on wheat sowing -> "When should rice be sown?").
+            Keep it unchanged if it already stands alone.
             
             {format_instructions}
             """
@@ -103,16 +125,160 @@ Respond naturally:
         )
         self.chain = self.prompt | self.llm
 
+        # With the answer cache, the answer is split in two calls: a generic answer to the standalone
+        # question (cached and shared across farmers), then a personalized rewrite of it
+        answer_prompt = ChatPromptTemplate.from_template(
+            """You are 'Farm-AI', an agricultural expert. Answer the farmer's question from the official knowledge base below.
+
+**OFFICIAL KNOWLEDGE BASE (RAG):**
+{retrieved_context}
+
+**QUESTION:** "{question}"
+
+**INSTRUCTIONS:**
+1. Give accurate, concrete advice (doses, timings, eligibility, steps) grounded in the knowledge base.
+2. If the knowledge base does not cover the question, give sound general farming advice.
+3. Write for any farmer: no names, greetings or references to a particular farm.
+
+Answer:
+"""
+        )
+        self.answer_chain = answer_prompt | self.llm
+
+        personalize_prompt = ChatPromptTemplate.from_template(
+            """You are 'Farm-AI', a knowledgeable and encouraging farming companion (Agri-Friend).
+Your goal is to provide expert advice with a warm, personal touch.
+
+**CONTEXT:**
+- **Farmer's Name:** {farmer_name}
+- **Active Crops:** {active_crops}
+- **Current Date:** {current_date}
+- **Recent Activities:** {recent_activities}
+
+**EXPERT ANSWER (from the official knowledge base):**
+{generic_answer}
+
+**Conversation History:**
+{chat_history}
+
+**USER'S MESSAGE:** "{question}"
+
+**INSTRUCTIONS:**
+1. **Be Warm & Personable:** Don't just answer; connect. Use phrases like "I'm glad you asked" or "That's a great question."
+2. **Contextualize:** If the user asks about crops they are growing (context above), mention their specific situation. (e.g., "Since you're growing tomatoes in Chennai, you should watch out for...")
+3. **No Robot-Speak:** Avoid saying "According to the context provided" or "Based on the documents." Just give the advice naturally as an expert.
+4. **Actionable & Encouraging:** End with encouragement or a practical next step.
+5. **Keep the Facts:** Rephrase the expert answer for this farmer, keeping every fact, number and step. Don't add new ones.
+
+Respond naturally:
+"""
+        )
+        self.personalize_chain = personalize_prompt | self.llm
+
     def invoke(self, state: dict) -> dict:
         print("---KNOWLEDGE SUPPORT AGENT (UNIFIED: RAG + LOGGING)---")
-        user_id = state["user_id"]
-        ctx = self.memory.get_context(user_id)
-        
-        last_message = state["messages"][-1]
-        user_query = last_message.content
+        ctx, user_query, history_str = self._prepare(state)
+
+        activity_response = self._log_activity(state, ctx, user_query)
+        if activity_response:
+            return activity_response
+
+        # A follow-up is routed first: the router also rewrites it into the standalone question used as
+        # the cache key. An opening question is its own key, and a hit skips routing altogether.
+        routed = self._route(state, user_query, history_str) if history_str else None
+        if routed and routed[0]:
+            return routed[0]
+        question = routed[2] if routed else user_query
+
+        # A near-duplicate of a recent question reuses its generic answer: no retrieval or answer call
+        query_vector, cached = self._cached_answer(question)
+        if cached:
+            generic_answer = cached.answer
+        else:
+            early_response, categories, _ = routed or self._route(state, user_query, history_str)
+            if early_response:
+                return early_response
+
+            queries = self._rag_queries(question or user_query)
+
+            # 2. Hybrid Search for all queries in one batch, within the routed section if there is one
+            retrieved_docs = []
+            results = self.rag.hybrid_search_batch(queries, k=2, categories=categories)
+            if categories and not any(results):
+                print(f"--- RAG: Nothing found in {categories}, searching all sections ---")
+                results = self.rag.hybrid_search_batch(queries, k=2)
+            for docs in results:
+                retrieved_docs.extend(docs)
+
+            context_str, sources = self._context(question or user_query, retrieved_docs)
+            if query_vector is None:
+                # Nothing will be cached: answer and personalize in a single call
+                response = self.chain.invoke(self._rag_inputs(ctx, user_query, history_str, context_str))
+                return {"messages": [AIMessage(content=response.content)]}
+            generic_answer = self.answer_chain.invoke({"retrieved_context": context_str, "question": question}).content
+            self._store_answer(query_vector, question, generic_answer, sources)
+
+        response = self.personalize_chain.invoke(self._personalize_inputs(ctx, user_query, history_str, generic_answer))
+        return {"messages": [AIMessage(content=response.content)]}
+
+    async def ainvoke(self, state: dict) -> dict:
+        """Async variant of invoke; retrieval runs without blocking the event loop."""
+        print("---KNOWLEDGE SUPPORT AGENT (UNIFIED: RAG + LOGGING, ASYNC)---")
+        ctx, user_query, history_str = await asyncio.to_thread(self._prepare, state)
+
+        activity_response = await asyncio.to_thread(self._log_activity, state, ctx, user_query)
+        if activity_response:
+            return activity_response
+
+        routed = await asyncio.to_thread(self._route, state, user_query, history_str) if history_str else None
+        if routed and routed[0]:
+            return routed[0]
+        question = routed[2] if routed else user_query
+
+        query_vector, cached = await asyncio.to_thread(self._cached_answer, question)
+        if cached:
+            generic_answer = cached.answer
+        else:
+            early_response, categories, _ = routed or await asyncio.to_thread(self._route, state, user_query, history_str)
+            if early_response:
+                return early_response
+
+            queries = self._rag_queries(question or user_query)
+
+            # 2. Hybrid Search, all queries concurrently, within the routed section if there is one
+            retrieved_docs = []
+            results = await asyncio.gather(*[self.rag.ahybrid_search(q, k=2, categories=categories) for q in queries])
+            if categories and not any(results):
+                print(f"--- RAG: Nothing found in {categories}, searching all sections ---")
+                results = await asyncio.gather(*[self.rag.ahybrid_search(q, k=2) for q in queries])
+            for docs in results:
+                retrieved_docs.extend(docs)
+
+            context_str, sources = self._context(question or user_query, retrieved_docs)
+            if query_vector is None:
+                response = await self.chain.ainvoke(self._rag_inputs(ctx, user_query, history_str, context_str))
+                return {"messages": [AIMessage(content=response.content)]}
+            generic_answer = (await self.answer_chain.ainvoke(
+                {"retrieved_context": context_str, "question": question}
+            )).content
+            self._store_answer(query_vector, question, generic_answer, sources)
+
+        response = await self.personalize_chain.ainvoke(
+            self._personalize_inputs(ctx, user_query, history_str, generic_answer)
+        )
+        return {"messages": [AIMessage(content=response.content)]}
+
+    def _prepare(self, state: dict):
+        ctx = self.memory.get_context(state["user_id"])
+        user_query = state["messages"][-1].content
         history_str = "\n".join([f"{msg.type.upper()}: {msg.content}" for msg in state["messages"][:-1]])
+        return ctx, user_query, history_str
+
+    def _log_activity(self, state: dict, ctx: dict, user_query: str) -> Optional[dict]:
+        """Logs a completed farming activity and returns the advice response, or None to carry on."""
+        user_id = state["user_id"]
         detected_activity = state.get("detected_activity")
-        
+
         # --- PATH 1: ACTIVITY LOGGING (Action) ---
         # Trigger if Profile Agent detected activity OR if the user message strongly implies action
         if detected_activity or "I " in user_query: # Simple heuristic + explicit signal
@@ -139,18 +305,40 @@ Respond naturally:
             except Exception as e:
                 print(f"--- KNOWLEDGE: Not a valid activity or error extraction: {e} ---")
                 # Fallthrough to RAG if it wasn't a loggable action
+        return None
         
+    def _route(self, state: dict, user_query: str,
+               history_str: str) -> Tuple[Optional[dict], Optional[List[str]], str]:
+        """
+        The no-RAG fast path. Returns (response, None, question), or (None, categories, question)
+        to continue with RAG, where categories are the knowledge base sections to search (None = all)
+        and question is the user query rewritten to stand alone: unchanged for an opening message,
+        None for a follow-up the router could not rewrite.
+        """
         # --- PATH 2: KNOWLEDGE RAG vs GENERAL CHAT (Dynamic Routing) ---
         print(f"--- KNOWLEDGE: Routing query '{user_query}'... ---")
+        available_categories = self.rag.categories
+        # A section chosen upstream (supervisor) wins over the router's guess
+        categories = [c for c in state.get("knowledge_categories") or [] if c in available_categories] or None
+        question = None if history_str else user_query
         
         try:
             # OPTIMIZATION: Check intent before triggering expensive RAG
             route_result = self.router_chain.invoke({
+                "chat_history": history_str or "None (first message).",
                 "question": user_query,
+                "categories": ", ".join(available_categories) or "any",
                 "format_instructions": self.router_parser.get_format_instructions()
             })
             intent = route_result.get("intent", "FARMING_QUERY")
             print(f"--- KNOWLEDGE: Identified Intent: {intent} ---")
+            if categories is None and route_result.get("category") in available_categories:
+                categories = [route_result["category"]]
+            if categories:
+                print(f"--- KNOWLEDGE: Searching section(s): {categories} ---")
+            if history_str and route_result.get("standalone_question"):
+                question = route_result["standalone_question"]
+                print(f"--- KNOWLEDGE: Standalone question: '{question}' ---")
             
             if intent in ["GREETING", "GENERAL_CHAT"]:
                 # Fast Path: No RAG
@@ -175,47 +363,84 @@ Respond naturally:
                     "question": user_query,
                     "chat_history": history_str
                 })
-                return {"messages": [AIMessage(content=response.content)]}
+                return {"messages": [AIMessage(content=response.content)]}, None, question
                 
         except Exception as e:
             print(f"--- KNOWLEDGE: Router failed ({e}), defaulting to RAG ---")
 
+        return None, categories, question
+
+    def _cached_answer(self, question: Optional[str]):
+        """
+        Looks up a standalone question (a follow-up after rewriting). Returns (query_vector, cached
+        answer or None); (None, None) when the cache doesn't apply and nothing will be stored.
+        """
+        if self.answer_cache.max_entries <= 0:
+            return None, None
+        # A follow-up that was not rewritten means something else in every conversation
+        if question is None:
+            print("--- ANSWER CACHE: Skipped (depends on the conversation) ---")
+            return None, None
+        # Too short to stand alone ("and the dose?" when the rewrite failed)
+        if len(tokenize(question)) < 3:
+            print("--- ANSWER CACHE: Skipped (question too short) ---")
+            return None, None
+        query_vector = self.rag.embed_query(question)
+        if query_vector is None:
+            return None, None
+
+        cached = self.answer_cache.get(query_vector, self.rag.index_version)
+        stats = self.answer_cache.stats()
+        if cached:
+            print(f"--- ANSWER CACHE: Hit for '{cached.query}' (hit rate {stats['hit_rate']:.0%}) ---")
+            print("--- RAG CITATIONS (CACHED) ---")
+            for i, source in enumerate(cached.sources):
+                print(f"[{i+1}] {source}")
+            print("---------------------")
+        else:
+            print(f"--- ANSWER CACHE: Miss (hit rate {stats['hit_rate']:.0%}) ---")
+        return query_vector, cached
+
+    def _store_answer(self, query_vector, user_query: str, answer: str, sources: List[str]):
+        if query_vector is not None:
+            self.answer_cache.put(query_vector, self.rag.index_version, user_query, answer, sources)
+
+    def _rag_queries(self, user_query: str) -> List[str]:
         # --- SLOW PATH: RAG ---
         print("--- KNOWLEDGE: Proceeding to RAG (Farming Query) ---")
-        
-        # --- SLOW PATH: RAG ---
-        print("--- KNOWLEDGE: Proceeding to RAG (Farming Query) ---")
-        
+
         # 1. Direct Search (Optimized)
         queries = [user_query]
         print(f"--- RAG: Using Query: {queries} ---")
+        return queries
 
-        # 2. Hybrid Search for each query
-        retrieved_docs = []
-        for q in queries:
-            docs = self.rag.hybrid_search(q, k=2)
-            retrieved_docs.extend(docs)
-            
+    def _context(self, question: str, retrieved_docs: List) -> Tuple[str, List[str]]:
         # Deduplicate by content
         unique_docs = {}
         for d in retrieved_docs:
             unique_docs[d.page_content] = d
         
         final_docs = list(unique_docs.values())[:4] # Top 4 unique
-        context_str = "\n\n".join([f"[Source: {d.metadata.get('source', 'Unknown')}]\n{d.page_content}" for d in final_docs])
+        # Keep only the sentences relevant to the question, under the token budget
+        context_str = self.compressor.compress(question, final_docs)
         
         if not context_str:
             context_str = "No specific official documents found."
 
         # LOGGING SOURCES FOR USER VERIFICATION
         print("--- RAG CITATIONS ---")
+        sources = []
         for i, d in enumerate(final_docs):
             source = d.metadata.get('source', 'Unknown')
             page = d.metadata.get('page', 'N/A')
-            print(f"[{i+1}] Source: {source} | Page: {page}")
+            sources.append(f"Source: {source} | Page: {page}")
+            print(f"[{i+1}] {sources[-1]}")
         print("---------------------")
 
-        response = self.chain.invoke({
+        return context_str, sources
+
+    def _rag_inputs(self, ctx: dict, user_query: str, history_str: str, context_str: str) -> dict:
+        return {
             "farmer_name": ctx["farmer_name"],
             "active_crops": ctx["active_crops"],
             "current_date": ctx["current_date"],
@@ -223,6 +448,15 @@ Respond naturally:
             "retrieved_context": context_str,
             "chat_history": history_str,
             "question": user_query
-        })
+        }
 
-        return {"messages": [AIMessage(content=response.content)]}
+    def _personalize_inputs(self, ctx: dict, user_query: str, history_str: str, generic_answer: str) -> dict:
+        return {
+            "farmer_name": ctx["farmer_name"],
+            "active_crops": ctx["active_crops"],
+            "current_date": ctx["current_date"],
+            "recent_activities": ctx.get("memory_narrative", "No recent activities."),
+            "generic_answer": generic_answer,
+            "chat_history": history_str,
+            "question": user_query
+        }
@@ -1,7 +1,10 @@
 # agents/market_intelligence.py
 
+import re
 import uuid
+import asyncio
 from datetime import datetime
+from typing import List
 from dotenv import load_dotenv
 from langchain_core.language_models import BaseLanguageModel
 from langchain_core.prompts import ChatPromptTemplate
@@ -92,30 +95,12 @@ class MarketIntelligenceAgent:
 
     def invoke(self, state: dict) -> dict:
         print("---MARKET INTELLIGENCE AGENT (MEMORY SERVICE)---")
-        user_id = state["user_id"]
-        ctx = self.memory.get_context(user_id)
-        
-        messages = state["messages"]
-        last_message = messages[-1].content
+        ctx = self.memory.get_context(state["user_id"])
         
         try:
             # Extract intent with user context
-            today_str = datetime.now().strftime("%d %B %Y")
-            
-            # Use chat history to resolve "it" or implicit crop references
-            # messages[:-1] skips the current user query which is already in 'message'
-            history_str = get_buffer_string(messages[:-1])
-            
-            query_data = self.chain.invoke({
-                "message": last_message,
-                "chat_history": history_str,
-                "location": ctx["location"],
-                "active_crops": ctx["active_crops"],
-                "current_date": today_str,
-                "format_instructions": self.parser.get_format_instructions()
-            })
-            crop = query_data["crop"]
-            location = query_data["location"]
+            query_inputs = self._query_inputs(state, ctx)
+            query_data = self.chain.invoke(query_inputs)
             search_query = query_data["search_query"]
             
             # Execute Search via MCP
@@ -123,63 +108,113 @@ class MarketIntelligenceAgent:
             search_results_str = self.mcp.execute_tool("web_search", {"query": search_query})
             
             # --- SCRAPING LOGIC ---
-            top_content = ""
+            scraping_results = []
             try:
-                # Extract all links using regex
-                import re
-                # Pattern to find all links in the formatted string "Link: (url)"
-                links = re.findall(r"Link: (https?://\S+)", search_results_str)
-                
-                # Try scraping up to 3 unique links
-                unique_links = []
-                for link in links:
-                    if link not in unique_links:
-                        unique_links.append(link)
-                
-                max_scrapes = 3
-                links_to_try = unique_links[:max_scrapes]
-                
-                scraping_results = []
-                
-                print(f"--- MARKETS: Found {len(unique_links)} links. Trying top {len(links_to_try)}... ---")
-                
+                links_to_try = self._links_to_try(search_results_str)
                 for i, link in enumerate(links_to_try):
                     print(f"--- MARKETS: Fetching result {i+1}/{len(links_to_try)}: '{link}' ---")
                     try:
                         content = self.mcp.execute_tool("fetch_page", {"url": link})
-                        
-                        # Check if content indicates an error (the tool returns error strings on exception)
-                        if content and "Failed to fetch page" not in content:
-                            scraping_results.append(f"\n\n--- Content from {link} ---\n{content}\n")
-                            # If we have a good result, we might not need many more, but let's get up to 2 for robustness
-                            if len(scraping_results) >= 2:
-                                break
-                        else:
-                            print(f"--- MARKETS: Failed to fetch {link} (Tool returned error) ---")
-                            
+                        if self._add_page(scraping_results, link, content):
+                            break
                     except Exception as e:
                         print(f"--- MARKETS: Error fetching {link}: {e} ---")
-                
-                if scraping_results:
-                    top_content = "".join(scraping_results)
-                else:
-                    print("--- MARKETS: All scraping attempts failed or no links found ---")
-
             except Exception as e:
                 print(f"--- MARKETS SCRAPE ERROR: {e} ---")
             
             # Summarize with LLM
-            final_response_msg = self.summary_chain.invoke({
-                "query": search_query,
-                "search_results": search_results_str + top_content,
-                "current_date": today_str
-            })
-            
-            final_response = final_response_msg.content + "\n\n*(Source: DuckDuckGo via MCP)*"
-            
-            return {"messages": [AIMessage(content=final_response)]}
+            final_response_msg = self.summary_chain.invoke(
+                self._summary_inputs(search_query, search_results_str, scraping_results, query_inputs["current_date"])
+            )
+            return self._response(final_response_msg)
             
         except Exception as e:
             print(f"Error in Market Agent: {e}")
             return {"messages": [AIMessage(content=f"I couldn't fetch the market data right now. Error: {e}")]}
 
+    async def ainvoke(self, state: dict) -> dict:
+        """Async variant of invoke; search, page fetches and LLM calls don't block the event loop."""
+        print("---MARKET INTELLIGENCE AGENT (MEMORY SERVICE, ASYNC)---")
+        ctx = await asyncio.to_thread(self.memory.get_context, state["user_id"])
+
+        try:
+            query_inputs = self._query_inputs(state, ctx)
+            query_data = await self.chain.ainvoke(query_inputs)
+            search_query = query_data["search_query"]
+
+            print(f"--- MARKETS: Searching for '{search_query}' ---")
+            search_results_str = await self.mcp.execute_tool_async("web_search", {"query": search_query})
+
+            scraping_results = []
+            try:
+                links_to_try = self._links_to_try(search_results_str)
+                for i, link in enumerate(links_to_try):
+                    print(f"--- MARKETS: Fetching result {i+1}/{len(links_to_try)}: '{link}' ---")
+                    try:
+                        content = await self.mcp.execute_tool_async("fetch_page", {"url": link})
+                        if self._add_page(scraping_results, link, content):
+                            break
+                    except Exception as e:
+                        print(f"--- MARKETS: Error fetching {link}: {e} ---")
+            except Exception as e:
+                print(f"--- MARKETS SCRAPE ERROR: {e} ---")
+
+            final_response_msg = await self.summary_chain.ainvoke(
+                self._summary_inputs(search_query, search_results_str, scraping_results, query_inputs["current_date"])
+            )
+            return self._response(final_response_msg)
+
+        except Exception as e:
+            print(f"Error in Market Agent: {e}")
+            return {"messages": [AIMessage(content=f"I couldn't fetch the market data right now. Error: {e}")]}
+
+    def _query_inputs(self, state: dict, ctx: dict) -> dict:
+        messages = state["messages"]
+        # Use chat history to resolve "it" or implicit crop references
+        # messages[:-1] skips the current user query which is already in 'message'
+        return {
+            "message": messages[-1].content,
+            "chat_history": get_buffer_string(messages[:-1]),
+            "location": ctx["location"],
+            "active_crops": ctx["active_crops"],
+            "current_date": datetime.now().strftime("%d %B %Y"),
+            "format_instructions": self.parser.get_format_instructions()
+        }
+
+    @staticmethod
+    def _links_to_try(search_results_str: str, max_scrapes: int = 3) -> List[str]:
+        """Up to `max_scrapes` unique result links, in ranking order."""
+        # Pattern to find all links in the formatted string "Link: (url)"
+        unique_links = []
+        for link in re.findall(r"Link: (https?://\S+)", search_results_str):
+            if link not in unique_links:
+                unique_links.append(link)
+        links_to_try = unique_links[:max_scrapes]
+        print(f"--- MARKETS: Found {len(unique_links)} links. Trying top {len(links_to_try)}... ---")
+        return links_to_try
+
+    @staticmethod
+    def _add_page(scraping_results: List[str], link: str, content: str) -> bool:
+        """Keep a fetched page unless the tool returned an error; True once 2 good pages are in."""
+        if content and "Failed to fetch page" not in content and "MCP Tool Execution Failed" not in content:
+            scraping_results.append(f"\n\n--- Content from {link} ---\n{content}\n")
+            # If we have a good result, we might not need many more, but let's get up to 2 for robustness
+            return len(scraping_results) >= 2
+        print(f"--- MARKETS: Failed to fetch {link} (Tool returned error) ---")
+        return False
+
+    @staticmethod
+    def _summary_inputs(search_query: str, search_results_str: str, scraping_results: List[str],
+                        current_date: str) -> dict:
+        if not scraping_results:
+            print("--- MARKETS: All scraping attempts failed or no links found ---")
+        return {
+            "query": search_query,
+            "search_results": search_results_str + "".join(scraping_results),
+            "current_date": current_date
+        }
+
+    @staticmethod
+    def _response(final_response_msg) -> dict:
+        final_response = final_response_msg.content + "\n\n*(Source: DuckDuckGo via MCP)*"
+        return {"messages": [AIMessage(content=final_response)]}
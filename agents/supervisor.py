@@ -32,6 +32,8 @@ class Supervisor:
     - If the user asks **"HOW to..."**, **"Guide for..."**, or asks advice -> Route to `knowledge_support` (It searches manuals).
     - If the user asks about **Government Schemes**, **Subsidies**, or **Policies** -> Route to `knowledge_support` (It searches RAG/Documents).
     - If the user says **"I HAVE DONE"** or describes a completed action ("I pruned trees", "Watering done") -> Route to `knowledge_support` (It logs the action).
+    - For knowledge questions, append the knowledge base section after a colon so only that section is searched:
+      `knowledge_support:government_schemes` (schemes, subsidies, policies) or `knowledge_support:farming_practices` (how-to, advice).
 4.  **Market Intelligence:** 
     - Queries about **PRICES**, **RATES**, or **MARKET COSTS** ONLY.
     - **CRITICAL:** If user says "find in [Location]" or "price of it" or "find it [location]", route to `market_intelligence`.
@@ -39,7 +41,7 @@ class Supervisor:
 6.  **Weather:** For weather questions.
 7.  **Disease:** For sick plants/images.
 
-Based on the rules, which agent should be called? Respond with only the agent's name.
+Based on the rules, which agent should be called? Respond with only the agent's name (plus the optional `:section` for knowledge_support).
 
 **User Profile Status:** {{profile_status}}
 **User's last message:** "{{last_message}}"
@@ -68,8 +70,11 @@ Based on the rules, which agent should be called? Respond with only the agent's
             "profile_status": profile_status_msg,
             "last_message": last_message.content
         })
-        next_agent_name = response.content.strip()
-        
-        print(f"Supervisor decided next agent is: {next_agent_name}")
-        return {"next_agent": next_agent_name}
+        next_agent_name, _, section = response.content.strip().partition(":")
+        next_agent_name = next_agent_name.strip()
+        section = section.strip().strip("`")
+
+        print(f"Supervisor decided next agent is: {next_agent_name}" + (f" (section: {section})" if section else ""))
+        # The knowledge agent restricts retrieval to this section when the index has it
+        return {"next_agent": next_agent_name, "knowledge_categories": [section] if section else None}
 
@@ -1,5 +1,6 @@
 # agents/weather.py
 
+import asyncio
 from langchain_core.language_models import BaseLanguageModel
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import AIMessage
@@ -49,12 +50,33 @@ Based on these instructions, provide a concise and actionable response.
 
         # Execute Weather Tool via MCP
         print(f"--- WEATHER: Fetching forecast for {ctx['location']} ---")
-        weather_data = self.mcp.execute_tool("get_weather_forecast", {
-            "latitude": ctx["latitude"],
-            "longitude": ctx["longitude"]
-        })
+        weather_data = self.mcp.execute_tool("get_weather_forecast", self._forecast_args(ctx))
 
-        response = self.chain.invoke({
+        response = self.chain.invoke(self._inputs(state, ctx, weather_data))
+
+        return {"messages": [AIMessage(content=response.content)]}
+
+    async def ainvoke(self, state: dict) -> dict:
+        """Async variant of invoke; the forecast call and the LLM call don't block the event loop."""
+        print("---WEATHER AGENT (MCP SERVICE, ASYNC)---")
+        ctx = await asyncio.to_thread(self.memory.get_context, state["user_id"])
+
+        if not ctx.get("latitude") or not ctx.get("longitude"):
+            return {"messages": [AIMessage(content="I can't give a forecast without your location.")]}
+
+        print(f"--- WEATHER: Fetching forecast for {ctx['location']} ---")
+        weather_data = await self.mcp.execute_tool_async("get_weather_forecast", self._forecast_args(ctx))
+
+        response = await self.chain.ainvoke(self._inputs(state, ctx, weather_data))
+        return {"messages": [AIMessage(content=response.content)]}
+
+    @staticmethod
+    def _forecast_args(ctx: dict) -> dict:
+        return {"latitude": ctx["latitude"], "longitude": ctx["longitude"]}
+
+    @staticmethod
+    def _inputs(state: dict, ctx: dict, weather_data: str) -> dict:
+        return {
             "current_time": ctx["current_time"],
             "weather_data": weather_data,
             "location": ctx["location"],
@@ -62,6 +84,4 @@ Based on these instructions, provide a concise and actionable response.
             "active_crops": ctx["active_crops"],
             "recent_activities": ctx["memory_narrative"],
             "question": state["messages"][-1].content
-        })
-
-        return {"messages": [AIMessage(content=response.content)]}
+        }
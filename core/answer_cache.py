@@ -0,0 +1,109 @@
+# core/answer_cache.py
+
+import threading
+import time
+from typing import List, Optional
+import numpy as np
+
+
+class CachedAnswer:
+    __slots__ = ("query", "answer", "sources", "created_at")
+
+    def __init__(self, query: str, answer: str, sources: List[str], created_at: float):
+        self.query = query
+        self.answer = answer
+        self.sources = sources
+        self.created_at = created_at
+
+
+class SemanticAnswerCache:
+    """
+    Generic (not personalized) knowledge-base answers, looked up by query embedding.
+    A question hits when its cosine similarity to a cached question reaches `threshold`
+    and the entry is younger than `ttl_seconds`. All entries belong to one index
+    version; a lookup against a newer version empties the cache.
+    """
+
+    def __init__(self, threshold: float = 0.92, ttl_seconds: float = 86400, max_entries: int = 1000):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.index_version: Optional[int] = None
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._entries: List[CachedAnswer] = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_version(self, index_version: int):
+        if index_version != self.index_version:
+            if self._entries:
+                print(f"--- ANSWER CACHE: Index version {index_version}, dropping {len(self._entries)} answers ---")
+            self.index_version = index_version
+            self._vectors = np.zeros((0, 0), dtype=np.float32)
+            self._entries = []
+
+    def _keep(self, rows):
+        self._vectors = self._vectors[rows]
+        self._entries = [self._entries[i] for i in rows]
+
+    def get(self, query_vector, index_version: int) -> Optional[CachedAnswer]:
+        query_vector = self._normalize(query_vector)
+        with self._lock:
+            self._check_version(index_version)
+            # Drop expired entries first, so they can neither hit nor take up space
+            now = time.time()
+            live = [i for i, e in enumerate(self._entries) if now - e.created_at < self.ttl_seconds]
+            if len(live) < len(self._entries):
+                self._keep(live)
+
+            if self._entries and self._vectors.shape[1] == len(query_vector):
+                similarities = self._vectors @ query_vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self.hits += 1
+                    return self._entries[best]
+            self.misses += 1
+            return None
+
+    def put(self, query_vector, index_version: int, query: str, answer: str, sources: List[str]):
+        if self.max_entries <= 0:
+            return
+        query_vector = self._normalize(query_vector)
+        with self._lock:
+            self._check_version(index_version)
+            if self._entries and self._vectors.shape[1] != len(query_vector):
+                self._check_version(None)  # embedding model changed
+                self.index_version = index_version
+            entry = CachedAnswer(query, answer, sources, time.time())
+            if self._entries:
+                self._vectors = np.vstack([self._vectors, query_vector])
+            else:
+                self._vectors = query_vector[None, :]
+            self._entries.append(entry)
+            # Oldest entries go first
+            if len(self._entries) > self.max_entries:
+                self._keep(range(len(self._entries) - self.max_entries, len(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._check_version(None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "index_version": self.index_version,
+        }
@@ -0,0 +1,91 @@
+# core/batch_embedder.py
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+def is_rate_limit(error: Exception) -> bool:
+    """OpenAI's RateLimitError, or any HTTP 429 from a client that exposes the status code."""
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return type(error).__name__ == "RateLimitError" or status == 429
+
+
+class ConcurrentEmbedder:
+    """
+    Embeds large lists of texts as fixed-size batches sent concurrently.
+    Concurrency adapts AIMD-style: each successful batch raises the limit by
+    1/limit (about +1 per round of batches), a rate-limit error halves it and
+    the batch is retried after a jittered exponential backoff.
+    """
+
+    def __init__(self, embeddings: Embeddings, batch_size: int = 256, max_concurrency: int = 4,
+                 max_retries: int = 6, base_delay: float = 1.0):
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self._limit = float(self.max_concurrency)
+        self._in_flight = 0
+        self._cond = threading.Condition()
+
+    @property
+    def concurrency(self) -> int:
+        return max(1, int(self._limit))
+
+    def _acquire(self):
+        with self._cond:
+            while self._in_flight >= self.concurrency:
+                self._cond.wait()
+            self._in_flight += 1
+
+    def _release(self, rate_limited: bool):
+        with self._cond:
+            self._in_flight -= 1
+            if rate_limited:
+                self._limit = max(1.0, self._limit / 2)
+            else:
+                self._limit = min(float(self.max_concurrency), self._limit + 1 / self._limit)
+            self._cond.notify_all()
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            self._acquire()
+            try:
+                vectors = self.embeddings.embed_documents(texts)
+            except Exception as e:
+                self._release(rate_limited=is_rate_limit(e))
+                if not is_rate_limit(e) or attempt == self.max_retries:
+                    raise
+                delay = min(self.base_delay * 2 ** attempt, 60.0) * (0.5 + random.random())
+                print(f"--- EMBED: Rate limited, retrying in {delay:.1f}s (concurrency {self.concurrency}) ---")
+                time.sleep(delay)
+                continue
+            self._release(rate_limited=False)
+            return vectors
+
+    def embed(self, texts: List[str],
+              on_batch: Optional[Callable[[int, List[List[float]]], None]] = None) -> np.ndarray:
+        """
+        Embed `texts` in order. `on_batch(start, vectors)` is called from a worker thread as each
+        batch completes, e.g. to persist progress before the whole list is done.
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        starts = range(0, len(texts), self.batch_size)
+
+        def run(start: int) -> List[List[float]]:
+            vectors = self._embed_batch(texts[start:start + self.batch_size])
+            if on_batch is not None:
+                on_batch(start, vectors)
+            return vectors
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="embed") as pool:
+            results = list(pool.map(run, starts))
+        return np.asarray([v for vectors in results for v in vectors], dtype=np.float32)
@@ -0,0 +1,258 @@
+# core/bm25_index.py
+
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens used for both indexing and querying."""
+    return TOKEN_RE.findall(text.lower())
+
+
+class PostingsSegment:
+    """
+    Immutable block of postings for a contiguous range of document IDs, in CSR layout:
+    the postings of term `t` are doc_ids[term_offsets[t]:term_offsets[t + 1]]
+    (with matching term_freqs). Terms added to the vocabulary after the segment
+    was built simply have no postings in it.
+    """
+    __slots__ = ("doc_start", "doc_lens", "term_offsets", "doc_ids", "term_freqs")
+
+    FILES = ("doc_lens", "term_offsets", "doc_ids", "term_freqs")
+
+    def __init__(self, doc_start: int, doc_lens: np.ndarray, term_offsets: np.ndarray,
+                 doc_ids: np.ndarray, term_freqs: np.ndarray):
+        self.doc_start = doc_start
+        self.doc_lens = doc_lens
+        self.term_offsets = term_offsets
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+
+    @property
+    def n_docs(self) -> int:
+        return len(self.doc_lens)
+
+    @classmethod
+    def build(cls, doc_start: int, docs_term_ids: List[List[int]], vocab_size: int) -> "PostingsSegment":
+        doc_lens = np.array([len(t) for t in docs_term_ids], dtype=np.uint32)
+
+        rows, terms, freqs = [], [], []
+        for local_id, term_ids in enumerate(docs_term_ids):
+            for term_id, tf in Counter(term_ids).items():
+                rows.append(doc_start + local_id)
+                terms.append(term_id)
+                freqs.append(tf)
+
+        rows = np.asarray(rows, dtype=np.int32)
+        terms = np.asarray(terms, dtype=np.int64)
+        freqs = np.minimum(np.asarray(freqs, dtype=np.int64), np.iinfo(np.uint16).max).astype(np.uint16)
+
+        # Group postings by term (stable, so doc IDs stay sorted within a term)
+        order = np.argsort(terms, kind="stable")
+        term_offsets = np.zeros(vocab_size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=vocab_size), out=term_offsets[1:])
+        return cls(doc_start, doc_lens, term_offsets, rows[order], freqs[order])
+
+    @classmethod
+    def merge(cls, segments: List["PostingsSegment"], live: Optional[np.ndarray], vocab_size: int) -> "PostingsSegment":
+        """
+        One segment holding the postings of the consecutive `segments` minus documents not set in
+        `live` (a mask over their documents; None keeps all). Surviving documents are renumbered
+        consecutively from the first segment's doc_start in their old order, without re-tokenizing.
+        """
+        doc_start = segments[0].doc_start
+        n_docs = sum(segment.n_docs for segment in segments)
+        live = np.ones(n_docs, dtype=bool) if live is None else np.asarray(live, dtype=bool)
+        new_ids = doc_start + np.cumsum(live) - 1
+        rows, terms, freqs = [], [], []
+        for segment in segments:
+            counts = np.diff(np.asarray(segment.term_offsets))
+            seg_terms = np.repeat(np.arange(len(counts), dtype=np.int64), counts)
+            seg_rows = np.asarray(segment.doc_ids) - doc_start
+            keep = live[seg_rows]
+            rows.append(new_ids[seg_rows[keep]])
+            terms.append(seg_terms[keep])
+            freqs.append(np.asarray(segment.term_freqs)[keep])
+
+        rows = np.concatenate(rows).astype(np.int32)
+        terms = np.concatenate(terms)
+        freqs = np.concatenate(freqs)
+        order = np.lexsort((rows, terms))
+        term_offsets = np.zeros(vocab_size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=vocab_size), out=term_offsets[1:])
+        doc_lens = np.concatenate([np.asarray(segment.doc_lens) for segment in segments])[live]
+        return cls(doc_start, doc_lens, term_offsets, rows[order], freqs[order])
+
+    def postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        if term_id + 1 >= len(self.term_offsets):
+            return self.doc_ids[:0], self.term_freqs[:0]
+        lo, hi = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+        return self.doc_ids[lo:hi], self.term_freqs[lo:hi]
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        for name in self.FILES:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, path: str, doc_start: int, mmap: bool = True) -> "PostingsSegment":
+        mode = "r" if mmap else None
+        arrays = [np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode) for name in cls.FILES]
+        return cls(doc_start, *arrays)
+
+
+class BM25Index:
+    """
+    Okapi BM25 over an inverted index of immutable postings segments.
+
+    Documents are identified by consecutive integer IDs in insertion order.
+    Adding documents writes one new segment (no rebuild of existing postings)
+    and removing them only flips a tombstone; segments are persisted, and
+    compacted, by the outer SegmentStore. Scoring is vectorized with NumPy per
+    query term, so any top-k can be requested.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocab: Dict[str, int] = {}
+        self.segments: List[PostingsSegment] = []
+        self.doc_lens = np.zeros(0, dtype=np.float32)
+        self.live = np.zeros(0, dtype=bool)
+        self._live_count = 0
+        self._live_total_len = 0.0
+
+    def __len__(self) -> int:
+        return self._live_count
+
+    @property
+    def n_docs(self) -> int:
+        """Total number of document IDs issued, including removed ones."""
+        return len(self.live)
+
+    # --- Updates ---
+
+    def add_documents(self, texts: Iterable[str]) -> range:
+        """Index texts as a new segment and return the document IDs assigned to them."""
+        docs_term_ids = []
+        for text in texts:
+            term_ids = []
+            for token in tokenize(text):
+                term_id = self.vocab.get(token)
+                if term_id is None:
+                    term_id = self.vocab[token] = len(self.vocab)
+                term_ids.append(term_id)
+            docs_term_ids.append(term_ids)
+
+        doc_start = self.n_docs
+        if not docs_term_ids:
+            return range(doc_start, doc_start)
+
+        segment = PostingsSegment.build(doc_start, docs_term_ids, len(self.vocab))
+        self._append_segment(segment)
+        return range(doc_start, self.n_docs)
+
+    def _append_segment(self, segment: PostingsSegment, live: Optional[np.ndarray] = None):
+        lens = np.asarray(segment.doc_lens, dtype=np.float32)
+        live = np.ones(len(lens), dtype=bool) if live is None else live
+        self.segments.append(segment)
+        self.doc_lens = np.concatenate([self.doc_lens, lens])
+        self.live = np.concatenate([self.live, live])
+        self._live_count += int(live.sum())
+        self._live_total_len += float(lens[live].sum())
+
+    def remove(self, doc_ids: Iterable[int]):
+        """Tombstone documents; their postings are skipped until the next compaction."""
+        ids = np.fromiter(doc_ids, dtype=np.int64)
+        ids = ids[(ids >= 0) & (ids < self.n_docs)]
+        ids = np.unique(ids[self.live[ids]])
+        if len(ids) == 0:
+            return
+        self.live[ids] = False
+        self._live_count -= len(ids)
+        self._live_total_len -= float(self.doc_lens[ids].sum())
+
+    @classmethod
+    def from_segments(cls, vocab_terms: List[str], segments: List[PostingsSegment],
+                      live: Optional[np.ndarray] = None, k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        """Assemble an index from postings segments persisted by an outer store."""
+        index = cls(k1=k1, b=b)
+        index.vocab = {term: i for i, term in enumerate(vocab_terms)}
+        for segment in segments:
+            seg_live = None if live is None else live[segment.doc_start:segment.doc_start + segment.n_docs]
+            index._append_segment(segment, seg_live)
+        return index
+
+    # --- Search ---
+
+    def search(self, query: str, k: int = 4, allowed: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        Return up to k (doc_id, score) pairs, best first. Only documents matching a query term are returned.
+        `allowed` is an optional boolean mask over doc IDs restricting which documents may be returned.
+        """
+        return self.search_batch([query], k, allowed)[0]
+
+    def search_batch(self, queries: List[str], k: int = 4,
+                     allowed: Optional[np.ndarray] = None) -> List[List[Tuple[int, float]]]:
+        """Score a batch of queries; postings for terms shared across queries are gathered once."""
+        postings_cache = {}
+        return [self._search_one(query, k, postings_cache, allowed) for query in queries]
+
+    def _postings(self, term_id: int, cache: dict):
+        if term_id not in cache:
+            ids, tfs = [], []
+            for segment in self.segments:
+                seg_ids, seg_tfs = segment.postings(term_id)
+                if len(seg_ids):
+                    ids.append(seg_ids)
+                    tfs.append(seg_tfs)
+            if ids:
+                ids = np.concatenate(ids)
+                tfs = np.concatenate(tfs).astype(np.float32)
+                alive = self.live[ids]
+                cache[term_id] = (ids[alive], tfs[alive])
+            else:
+                cache[term_id] = None
+        return cache[term_id]
+
+    def _search_one(self, query: str, k: int, postings_cache: dict,
+                    allowed: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        if self._live_count == 0 or k <= 0:
+            return []
+        query_terms = Counter(self.vocab[t] for t in tokenize(query) if t in self.vocab)
+        if not query_terms:
+            return []
+
+        n = self._live_count
+        avgdl = self._live_total_len / n if n else 1.0
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        matched = False
+        for term_id, query_tf in query_terms.items():
+            postings = self._postings(term_id, postings_cache)
+            if postings is None or len(postings[0]) == 0:
+                continue
+            ids, tfs = postings
+            df = len(ids)
+            idf = np.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * self.doc_lens[ids] / avgdl)
+            # A document appears at most once in a term's postings, so plain fancy-index add is safe
+            scores[ids] += query_tf * idf * tfs * (self.k1 + 1.0) / (tfs + norm)
+            matched = True
+
+        if not matched:
+            return []
+        hits = scores > 0
+        if allowed is not None:
+            hits[:len(allowed)] &= allowed
+            hits[len(allowed):] = False
+        candidates = np.flatnonzero(hits)
+        if len(candidates) > k:
+            top = np.argpartition(-scores[candidates], k - 1)[:k]
+            candidates = candidates[top]
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(i), float(scores[i])) for i in order]
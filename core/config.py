@@ -1,6 +1,6 @@
 # core/config.py
 
-from typing import Optional
+from typing import Dict, Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -16,6 +16,80 @@ class Settings(BaseSettings):
     huggingfacehub_api_token: Optional[str] = None
     
     enable_bm25: bool = True
+
+    # Retrieval / Embedding Configuration
+    # Embedding provider: openai, onnx (local CPU model; embedding_model is the model directory)
+    # or hashing (deterministic, for tests/benchmarks; embedding_model is the vector size)
+    embedding_provider: str = "openai"
+    embedding_model: str = "text-embedding-3-small"
+    embedding_cache_dir: str = "./embedding_cache"
+    query_embedding_cache_size: int = 2048
+    # Ingest embedding: texts per request and the most requests in flight (halved on rate limits)
+    embedding_batch_size: int = 256
+    embedding_concurrency: int = 4
+    embedding_max_retries: int = 6
+    # Cached hybrid/semantic results per (query, k, filters, index version); 0 disables
+    result_cache_size: int = 1024
+    # Approximate token budget for retrieved context in the answer prompt; only the sentences that
+    # best match the question are kept (0 passes whole chunks through)
+    context_token_budget: int = 600
+    # Ingest drops chunks whose estimated Jaccard similarity (MinHash over 5-word shingles) to an
+    # indexed or earlier chunk reaches this threshold (0 disables). num_perm must be a multiple of bands.
+    near_duplicate_threshold: float = 0.85
+    minhash_num_perm: int = 128
+    minhash_bands: int = 16
+    # Semantic answer cache: a question reuses the generic answer of a cached one at or above this
+    # cosine similarity, for answer_cache_ttl seconds or until the index changes (size 0 disables)
+    answer_cache_threshold: float = 0.92
+    answer_cache_ttl: float = 86400
+    answer_cache_size: int = 1000
+    # Shared retrieval server (retrieval_server.py). When the URL is set, app processes query it
+    # instead of loading the index themselves
+    retrieval_server_url: Optional[str] = None
+    retrieval_server_port: int = 8002
+    # MCP tools: "http" calls tools/mcp_server_ddg.py over streamable HTTP, "inprocess" calls its tool
+    # functions directly in this process (single-container deployments, no separate server)
+    mcp_transport: str = "http"
+    # MCP client: initialized sessions kept open per server URL; an idle session is pinged before reuse
+    mcp_pool_size: int = 4
+    mcp_ping_after: float = 30.0
+    # Tool responses are cached per tool for this many seconds (tools not listed are not cached),
+    # in an LRU of mcp_cache_size entries shared by all tools (0 disables)
+    mcp_cache_ttls: Dict[str, float] = {"get_weather_forecast": 1800, "web_search": 3600, "fetch_page": 21600}
+    mcp_cache_size: int = 512
+    # Ingest daemon (ingest_daemon.py): new files in inject_new_sources are indexed in micro-batches once
+    # the folder is quiet for ingest_debounce seconds, or at the latest ingest_max_wait seconds after arrival
+    ingest_poll_interval: float = 2.0
+    ingest_debounce: float = 5.0
+    ingest_max_wait: float = 30.0
+    ingest_max_batch_files: int = 50
+    ingest_daemon_port: int = 8003
+    # Seconds between checks for a newer index generation (0 disables hot-reload)
+    index_reload_interval: float = 5.0
+    # Deleted chunks stay in their segments as tombstones; once this fraction of the index is deleted,
+    # the live chunks are rewritten into one segment without them (0 disables)
+    compact_deleted_fraction: float = 0.2
+    # Each commit adds a segment; once segment_merge_factor segments of a similar size (same power of the
+    # factor) trail the index, they are merged into one, keeping doc IDs (size-tiered; below 2 disables)
+    segment_merge_factor: int = 10
+    # Vector index: flat (exact), ivf_flat, hnsw or ivf_pq. nprobe / ef_search are per-query defaults
+    vector_index_type: str = "flat"
+    ivf_nlist: int = 1024
+    ivf_nprobe: int = 16
+    hnsw_m: int = 32
+    hnsw_ef_construction: int = 200
+    hnsw_ef_search: int = 64
+    pq_m: int = 16
+    # Embedding storage: Matryoshka-truncated dimension (None keeps the model's full dimension) and the
+    # in-memory codec (float32, float16 or int8). With either, the top k * rescore_factor candidates are
+    # re-ranked at full precision. By default the full vectors come from the chunk-embedding cache
+    # (chunk_embeddings.sqlite, one lookup per search, no extra copy). store_full_vectors also writes a
+    # memory-mapped float32 copy next to each segment: faster re-ranking that keeps working without the
+    # cache, at the cost of storing every full vector twice.
+    embedding_dimensions: Optional[int] = None
+    vector_storage: str = "float32"
+    store_full_vectors: bool = False
+    rescore_factor: int = 4
     
     # Twilio Configuration
     twilio_account_sid: Optional[str] = None
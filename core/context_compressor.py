@@ -0,0 +1,94 @@
+# core/context_compressor.py
+
+import math
+import re
+from collections import Counter
+from typing import List, Tuple
+from langchain_core.documents import Document
+from core.bm25_index import tokenize
+
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English text)."""
+    return len(text) // 4 + 1
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in SENTENCE_RE.split(text) if s.strip()]
+
+
+class ContextCompressor:
+    """
+    Post-retrieval compression: keeps only the sentences of the retrieved chunks
+    that score highest against the query (BM25 over the sentences) within a token
+    budget. Kept sentences stay in document order under their source labels.
+    """
+
+    def __init__(self, token_budget: int = 600, k1: float = 1.5, b: float = 0.75):
+        self.token_budget = token_budget
+        self.k1 = k1
+        self.b = b
+
+    def _score(self, query: str, sentences: List[str]) -> List[float]:
+        query_terms = set(tokenize(query))
+        sentence_terms = [Counter(tokenize(s)) for s in sentences]
+        n = len(sentences)
+        avg_len = sum(sum(t.values()) for t in sentence_terms) / max(n, 1) or 1.0
+        df = Counter(term for terms in sentence_terms for term in query_terms & terms.keys())
+
+        scores = []
+        for terms in sentence_terms:
+            length = sum(terms.values())
+            score = 0.0
+            for term in query_terms & terms.keys():
+                idf = math.log(1 + (n - df[term] + 0.5) / (df[term] + 0.5))
+                tf = terms[term]
+                score += idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / avg_len))
+            scores.append(score)
+        return scores
+
+    def select(self, query: str, docs: List[Document]) -> List[List[str]]:
+        """Sentences kept per document, in their original order."""
+        sentences: List[Tuple[int, int, str]] = [
+            (d, i, s) for d, doc in enumerate(docs) for i, s in enumerate(split_sentences(doc.page_content))
+        ]
+        scores = self._score(query, [s for _, _, s in sentences])
+
+        # Best sentences first; with no lexical match at all, fall back to reading order
+        order = sorted(range(len(sentences)), key=lambda j: (-scores[j], j))
+        if order and scores[order[0]] <= 0:
+            order = list(range(len(sentences)))
+
+        chosen, used = set(), 0
+        for j in order:
+            if chosen and scores[j] <= 0 < scores[order[0]]:
+                break
+            cost = estimate_tokens(sentences[j][2])
+            if used + cost > self.token_budget and chosen:
+                continue
+            chosen.add(j)
+            used += cost
+
+        kept: List[List[str]] = [[] for _ in docs]
+        previous = {}
+        for j in sorted(chosen):
+            d, i, text = sentences[j]
+            # Mark gaps so the model doesn't read two distant sentences as one passage
+            if kept[d] and previous[d] != i - 1:
+                kept[d].append("...")
+            kept[d].append(text)
+            previous[d] = i
+        return kept
+
+    def compress(self, query: str, docs: List[Document]) -> str:
+        """Context string with a [Source: ...] label per document that kept any sentence."""
+        if self.token_budget <= 0:
+            return "\n\n".join(f"[Source: {d.metadata.get('source', 'Unknown')}]\n{d.page_content}" for d in docs)
+
+        kept = self.select(query, docs)
+        return "\n\n".join(
+            f"[Source: {d.metadata.get('source', 'Unknown')}]\n{' '.join(sentences)}"
+            for d, sentences in zip(docs, kept) if sentences
+        )
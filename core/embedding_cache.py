@@ -0,0 +1,185 @@
+# core/embedding_cache.py
+
+import asyncio
+import os
+import re
+import sqlite3
+import threading
+from array import array
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from core.cache import LRUCache
+
+
+def normalize_query(text: str) -> str:
+    """Canonical form used as the cache key (case and whitespace insensitive)."""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class EmbeddingCache:
+    """
+    Two-level cache for query embeddings.
+    Level 1 is a bounded in-memory LRU, level 2 is a SQLite file on disk that
+    survives restarts. Entries are keyed by (embedding model, normalized query);
+    only the key is normalized, the model always embeds the query as written.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, cache_dir: str, max_entries: int = 2048):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.memory = LRUCache(max_entries)
+        self.disk_hits = 0
+        self.misses = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self.db_path = os.path.join(cache_dir, "query_embeddings.sqlite")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS query_embeddings ("
+            "model TEXT NOT NULL, query TEXT NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (model, query))"
+        )
+        self._conn.commit()
+
+    def _disk_get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT vector FROM query_embeddings WHERE model = ? AND query = ?",
+                (self.model_name, key),
+            ).fetchone()
+        if row is None:
+            return None
+        return array("f", row[0]).tolist()
+
+    def _disk_put_many(self, items: List[Tuple[str, List[float]]]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO query_embeddings (model, query, vector) VALUES (?, ?, ?)",
+                [(self.model_name, key, array("f", vector).tobytes()) for key, vector in items],
+            )
+            self._conn.commit()
+
+    def embed_query(self, text: str) -> List[float]:
+        """Return the embedding for a query, calling the model only on a full miss."""
+        key = normalize_query(text)
+        vector = self.memory.get((self.model_name, key))
+        if vector is not None:
+            return vector
+
+        vector = self._disk_get(key)
+        if vector is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            vector = self.embeddings.embed_query(text)
+            self._disk_put_many([(key, vector)])
+
+        self.memory.put((self.model_name, key), vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Async variant of embed_query; a miss awaits the model's async client."""
+        key = normalize_query(text)
+        vector = self.memory.get((self.model_name, key))
+        if vector is not None:
+            return vector
+
+        vector = await asyncio.to_thread(self._disk_get, key)
+        if vector is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            vector = await self.embeddings.aembed_query(text)
+            await asyncio.to_thread(self._disk_put_many, [(key, vector)])
+
+        self.memory.put((self.model_name, key), vector)
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Batch variant of embed_query: all misses go to the model in a single request."""
+        keys = [normalize_query(t) for t in texts]
+        # First spelling of each key is the one sent to the model
+        originals = {}
+        for key, text in zip(keys, texts):
+            originals.setdefault(key, text)
+        resolved = {}
+        missing = []
+        for key in originals:
+            vector = self.memory.get((self.model_name, key))
+            if vector is None:
+                vector = self._disk_get(key)
+                if vector is not None:
+                    self.disk_hits += 1
+            if vector is None:
+                missing.append(key)
+            else:
+                resolved[key] = vector
+
+        if missing:
+            self.misses += len(missing)
+            vectors = self.embeddings.embed_documents([originals[key] for key in missing])
+            self._disk_put_many(list(zip(missing, vectors)))
+            resolved.update(zip(missing, vectors))
+
+        for key, vector in resolved.items():
+            self.memory.put((self.model_name, key), vector)
+        return [resolved[key] for key in keys]
+
+    def stats(self) -> dict:
+        memory_stats = self.memory.stats()
+        return {
+            "model": self.model_name,
+            "memory_entries": memory_stats["entries"],
+            "memory_hits": memory_stats["hits"],
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+        }
+
+
+class ChunkEmbeddingCache:
+    """
+    Persistent document-chunk embeddings keyed by (embedding model, chunk_id), so
+    re-ingesting or rebuilding an index never pays for the same chunk twice.
+    Vectors are stored as float32 blobs in chunk_embeddings.sqlite.
+    """
+
+    # Stay under SQLite's limit on bound parameters per statement
+    QUERY_BATCH = 500
+
+    def __init__(self, model_name: str, cache_dir: str):
+        self.model_name = model_name
+        os.makedirs(cache_dir, exist_ok=True)
+        self.db_path = os.path.join(cache_dir, "chunk_embeddings.sqlite")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunk_embeddings ("
+            "model TEXT NOT NULL, chunk_id TEXT NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (model, chunk_id))"
+        )
+        self._conn.commit()
+
+    def get_many(self, chunk_ids: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        unique_ids = list(dict.fromkeys(chunk_ids))
+        for start in range(0, len(unique_ids), self.QUERY_BATCH):
+            batch = unique_ids[start:start + self.QUERY_BATCH]
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT chunk_id, vector FROM chunk_embeddings WHERE model = ? "
+                    f"AND chunk_id IN ({','.join('?' * len(batch))})",
+                    [self.model_name, *batch],
+                ).fetchall()
+            for chunk_id, blob in rows:
+                found[chunk_id] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, items: List[Tuple[str, List[float]]]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunk_embeddings (model, chunk_id, vector) VALUES (?, ?, ?)",
+                [(self.model_name, chunk_id, np.asarray(vector, dtype=np.float32).tobytes()) for chunk_id, vector in items],
+            )
+            self._conn.commit()
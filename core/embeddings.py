@@ -0,0 +1,108 @@
+# core/embeddings.py
+
+import hashlib
+import os
+from typing import List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from core.bm25_index import tokenize
+
+EMBEDDING_PROVIDERS = ("openai", "onnx", "hashing")
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic feature-hashing embedder: each token adds +-1 to a hashed
+    dimension. No model and no network, so tests and benchmarks are
+    reproducible and free. Only lexical overlap is captured.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in tokenize(text):
+            h = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[h % self.dim] += 1.0 if h >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence encoder exported to ONNX (e.g. all-MiniLM-L6-v2), run locally on CPU.
+    `model_dir` holds model.onnx and the matching Hugging Face tokenizer.json.
+    Token embeddings are mean-pooled over the attention mask and L2-normalized.
+    """
+
+    def __init__(self, model_dir: str, batch_size: int = 32, max_length: int = 256):
+        try:
+            import onnxruntime
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError(
+                "The 'onnx' embedding provider needs onnxruntime and tokenizers: pip install onnxruntime tokenizers"
+            ) from e
+
+        self.batch_size = batch_size
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, "model.onnx"), providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        batches = []
+        for start in range(0, len(texts), self.batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start + self.batch_size])
+            input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+            mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            feeds = {"input_ids": input_ids, "attention_mask": mask}
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+            hidden = self.session.run(None, feeds)[0]
+            if hidden.ndim == 3:
+                weights = mask[..., None].astype(np.float32)
+                hidden = (hidden * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+            norms = np.linalg.norm(hidden, axis=1, keepdims=True)
+            batches.append(hidden / np.maximum(norms, 1e-12))
+        return np.concatenate(batches).astype(np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self._embed(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0].tolist()
+
+
+def create_embeddings(provider: str, model: str) -> Embeddings:
+    """
+    Build the embedder for a provider. `model` is the OpenAI model name, the
+    local ONNX model directory, or the vector size for "hashing".
+    """
+    if provider == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        from core.config import settings
+        return OpenAIEmbeddings(api_key=settings.openai_api_key, model=model)
+    if provider == "onnx":
+        return OnnxEmbeddings(model)
+    if provider == "hashing":
+        return HashingEmbeddings(int(model))
+    raise ValueError(f"Unknown embedding provider '{provider}', expected one of {EMBEDDING_PROVIDERS}")
+
+
+def embedding_cache_name(provider: str, model: str) -> str:
+    """Name under which query vectors are cached; OpenAI keeps the bare model name used so far."""
+    return model if provider == "openai" else f"{provider}:{model}"
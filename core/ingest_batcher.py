@@ -0,0 +1,71 @@
+# core/ingest_batcher.py
+
+from typing import Dict, List, Tuple
+
+FileSignature = Tuple[int, float]  # (size, mtime)
+
+
+class DebouncedBatcher:
+    """
+    Groups files arriving in a watched folder into micro-batches.
+
+    A file is eligible once its size and mtime have not changed for `settle` seconds
+    (so half-copied files are not picked up). Eligible files are released as a batch
+    when the folder has been quiet for `debounce` seconds, when the oldest waiting file
+    has waited `max_wait` seconds, or when `max_files` are waiting. Released files are
+    remembered and ignored until they change again.
+    """
+
+    def __init__(self, debounce: float = 5.0, max_wait: float = 30.0, max_files: int = 50, settle: float = 2.0):
+        self.debounce = debounce
+        self.max_wait = max_wait
+        self.max_files = max(1, max_files)
+        self.settle = settle
+        # path -> [signature, first seen, last changed]
+        self._pending: Dict[str, list] = {}
+        self._released: Dict[str, FileSignature] = {}
+        self._last_change = 0.0
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def observe(self, files: Dict[str, FileSignature], now: float):
+        """Update the state from a full scan of the folder (path -> signature)."""
+        for path, signature in files.items():
+            if self._released.get(path) == signature:
+                continue
+            self._released.pop(path, None)
+            entry = self._pending.get(path)
+            if entry is None:
+                self._pending[path] = [signature, now, now]
+                self._last_change = now
+            elif entry[0] != signature:
+                entry[0], entry[2] = signature, now
+                self._last_change = now
+        for path in [p for p in self._pending if p not in files]:
+            del self._pending[path]
+        for path in [p for p in self._released if p not in files]:
+            del self._released[path]
+
+    def ready(self, now: float) -> List[Tuple[str, float]]:
+        """Release the next batch as (path, first seen) pairs, or [] if none is due yet."""
+        if not self._pending:
+            return []
+        quiet = now - self._last_change >= self.debounce
+        overdue = now - min(entry[1] for entry in self._pending.values()) >= self.max_wait
+        full = len(self._pending) >= self.max_files
+        if not (quiet or overdue or full):
+            return []
+
+        eligible = sorted(
+            (entry[1], path) for path, entry in self._pending.items() if now - entry[2] >= self.settle
+        )[:self.max_files]
+        for _, path in eligible:
+            self._released[path] = self._pending.pop(path)[0]
+        return [(path, first_seen) for first_seen, path in eligible]
+
+    def forget(self, paths: List[str]):
+        """Treat released files as new again, e.g. to retry a batch that failed."""
+        for path in paths:
+            self._released.pop(path, None)
@@ -0,0 +1,58 @@
+# core/ingest_manifest.py
+
+import os
+import json
+import hashlib
+from typing import Dict, List, Set, Tuple
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestManifest:
+    """
+    What every ingested source file contributed to the index: relative path ->
+    sha256 of the file and the chunk IDs it produced. Stored as JSON next to the
+    index, so re-ingestion can skip unchanged files and delete the chunks of
+    changed or removed ones.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.files: Dict[str, dict] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.files = json.load(f).get("files", {})
+
+    def diff(self, hashes: Dict[str, str]) -> Tuple[List[str], List[str], List[str]]:
+        """(new, changed, removed) paths, comparing current file hashes with the recorded ones."""
+        new = sorted(p for p in hashes if p not in self.files)
+        changed = sorted(p for p in hashes if p in self.files and self.files[p]["sha256"] != hashes[p])
+        removed = sorted(p for p in self.files if p not in hashes)
+        return new, changed, removed
+
+    def chunk_ids(self, path: str) -> List[str]:
+        entry = self.files.get(path)
+        return entry["chunk_ids"] if entry else []
+
+    def set(self, path: str, sha256: str, chunk_ids: List[str]):
+        self.files[path] = {"sha256": sha256, "chunk_ids": chunk_ids}
+
+    def remove(self, path: str):
+        self.files.pop(path, None)
+
+    def referenced(self) -> Set[str]:
+        """Chunk IDs still produced by some recorded file (identical chunks can come from several files)."""
+        return {chunk_id for entry in self.files.values() for chunk_id in entry["chunk_ids"]}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"files": self.files}, f, indent=1)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,206 @@
+# core/mcp_session_pool.py
+
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict
+from mcp import ClientSession
+from mcp.client.streamable_http import streamable_http_client
+from mcp.shared.exceptions import McpError
+
+
+class _PooledSession:
+    """
+    One initialized ClientSession. The transport and session context managers must be
+    entered and exited by the same task, so a dedicated task holds them open until close().
+    """
+
+    def __init__(self, server_url: str):
+        self.server_url = server_url
+        self.session: ClientSession = None
+        self.alive = False
+        self.last_used = time.monotonic()
+        self.calls = 0
+        self._closed = asyncio.Event()
+        self._task = None
+
+    async def open(self):
+        ready = asyncio.get_running_loop().create_future()
+        self._task = asyncio.create_task(self._run(ready))
+        try:
+            await ready
+        except asyncio.CancelledError:
+            # Stop the handshake too, so close() doesn't wait for it to finish
+            self._task.cancel()
+            raise
+
+    async def _run(self, ready: asyncio.Future):
+        try:
+            async with streamable_http_client(self.server_url) as (read, write, _):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    self.session, self.alive = session, True
+                    ready.set_result(None)
+                    await self._closed.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                print(f"--- MCP POOL: Session to {self.server_url} lost: {type(e).__name__}: {e} ---")
+        finally:
+            self.alive = False
+
+    async def call_tool(self, tool_name: str, arguments: Dict[str, Any]):
+        """call_tool that fails fast (instead of waiting forever) if the transport dies mid-call."""
+        call = asyncio.ensure_future(self.session.call_tool(tool_name, arguments=arguments))
+        try:
+            await asyncio.wait({call, self._task}, return_when=asyncio.FIRST_COMPLETED)
+        except BaseException:
+            # Cancelled by the caller: don't leave the request running on its own
+            call.cancel()
+            raise
+        if not call.done():
+            call.cancel()
+            raise ConnectionError(f"MCP session to {self.server_url} closed during the call")
+        return call.result()
+
+    async def close(self):
+        self._closed.set()
+        if self._task:
+            try:
+                await self._task
+            except BaseException:
+                pass
+
+
+class _ServerSessions:
+    def __init__(self):
+        self.idle: Deque[_PooledSession] = deque()
+        self.open = 0
+        self.changed = asyncio.Condition()
+
+
+class MCPSessionPool:
+    """
+    Keeps initialized MCP sessions alive per server URL, so a tool call skips the HTTP
+    connect and `initialize` handshake. Sessions are checked out by one caller at a time
+    (up to `max_sessions` per server), pinged before reuse when idle for `ping_after`
+    seconds, and replaced when the ping or a call on a reused session fails.
+
+    Sessions are bound to the event loop that opened them, so the pool runs its own loop
+    on a background thread; `run()` (blocking) and `run_async()` submit coroutines to it
+    from any thread or event loop.
+    """
+
+    def __init__(self, max_sessions: int = 4, ping_after: float = 30.0, ping_timeout: float = 5.0):
+        self.max_sessions = max(1, max_sessions)
+        self.ping_after = ping_after
+        self.ping_timeout = ping_timeout
+        self._servers: Dict[str, _ServerSessions] = {}
+        self._loop = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="mcp-pool", daemon=True).start()
+            return self._loop
+
+    def run(self, coro) -> Any:
+        """Run `coro` on the pool's loop and block the calling thread until it finishes."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    async def run_async(self, coro) -> Any:
+        """Await `coro` on the pool's loop from any event loop, without blocking it."""
+        loop = self.loop
+        if asyncio.get_running_loop() is loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+    async def _healthy(self, pooled: _PooledSession) -> bool:
+        if not pooled.alive:
+            return False
+        if time.monotonic() - pooled.last_used < self.ping_after:
+            return True
+        try:
+            await asyncio.wait_for(pooled.session.send_ping(), self.ping_timeout)
+            return True
+        except Exception:
+            return False
+
+    async def _acquire(self, server_url: str) -> _PooledSession:
+        server = self._servers.setdefault(server_url, _ServerSessions())
+        while True:
+            while server.idle:
+                pooled = server.idle.pop()
+                try:
+                    healthy = await self._healthy(pooled)
+                except BaseException:
+                    # Cancelled mid-ping: the session is out of the idle list, so give up its slot
+                    await self._discard(server, pooled)
+                    raise
+                if healthy:
+                    return pooled
+                print(f"--- MCP POOL: Dropping stale session to {server_url} ---")
+                await self._discard(server, pooled)
+            if server.open < self.max_sessions:
+                server.open += 1
+                opened = server.open
+                pooled = _PooledSession(server_url)
+                try:
+                    await pooled.open()
+                except BaseException:
+                    await self._discard(server, pooled)
+                    raise
+                print(f"--- MCP POOL: Opened session {opened}/{self.max_sessions} to {server_url} ---")
+                return pooled
+            async with server.changed:
+                await server.changed.wait()
+
+    async def _release(self, server: _ServerSessions, pooled: _PooledSession):
+        pooled.last_used = time.monotonic()
+        pooled.calls += 1
+        server.idle.append(pooled)
+        async with server.changed:
+            server.changed.notify()
+
+    async def _discard(self, server: _ServerSessions, pooled: _PooledSession):
+        server.open -= 1
+        await pooled.close()
+        async with server.changed:
+            server.changed.notify()
+
+    async def call_tool(self, server_url: str, tool_name: str, arguments: Dict[str, Any]):
+        """call_tool on a pooled session. A failure on a reused session is retried once on a new one."""
+        for attempt in range(2):
+            pooled = await self._acquire(server_url)
+            server = self._servers[server_url]
+            reused = pooled.calls > 0
+            try:
+                result = await pooled.call_tool(tool_name, arguments)
+            except McpError:
+                # The server answered with an error: the session itself is fine
+                await self._release(server, pooled)
+                raise
+            except Exception as e:
+                await self._discard(server, pooled)
+                if not reused or attempt == 1:
+                    raise
+                print(f"--- MCP POOL: Call failed on a reused session ({type(e).__name__}), reconnecting ---")
+                continue
+            except BaseException:
+                # Cancelled (or interrupted) mid-call: a late response could still arrive on this
+                # session, so it is closed rather than handed to the next caller
+                await self._discard(server, pooled)
+                raise
+            await self._release(server, pooled)
+            return result
+
+    async def close(self):
+        """Close every pooled session."""
+        for server in self._servers.values():
+            while server.idle:
+                await self._discard(server, server.idle.pop())
@@ -1,45 +1,61 @@
 import asyncio
-import nest_asyncio
-from typing import Any, Dict, Optional
-from mcp import ClientSession
-from mcp.client.streamable_http import streamable_http_client
-
-# Apply nest_asyncio to allow nested event loops (crucial for Streamlit)
-nest_asyncio.apply()
+from typing import Any, Callable, Dict, Optional
+from core.config import settings
+from core.mcp_session_pool import MCPSessionPool
+from core.tool_cache import ToolResponseCache
 
 class MCPWrapper:
     """
-    A synchronous wrapper for MCP Servers via Streamable HTTP.
-    Manages the lifecycle of the connection for each call.
-    Uses nest_asyncio to support execution within existing event loops.
+    A wrapper for MCP Servers via Streamable HTTP, with a sync (execute_tool) and an
+    async (execute_tool_async) API.
+    Calls go through a process-wide pool of initialized sessions (core.mcp_session_pool),
+    so only the first call to a server pays for the connection and handshake.
+    With the "inprocess" transport the co-located tool functions (tools/mcp_server_ddg.py)
+    are called directly instead, behind the same API.
+    Successful responses are cached per tool for its TTL (settings.mcp_cache_ttls).
     """
-    def __init__(self, server_url: str):
+    pool = MCPSessionPool(max_sessions=settings.mcp_pool_size, ping_after=settings.mcp_ping_after)
+    cache = ToolResponseCache(settings.mcp_cache_ttls, max_entries=settings.mcp_cache_size)
+
+    def __init__(self, server_url: str, transport: Optional[str] = None):
         self.server_url = server_url
-        print(f"--- MCP WRAPPER: Initialized for {server_url} ---")
+        self.transport = transport or settings.mcp_transport
+        if self.transport not in ("http", "inprocess"):
+            raise ValueError(f"Unknown MCP transport '{self.transport}' (expected 'http' or 'inprocess')")
+        print(f"--- MCP WRAPPER: Initialized for {server_url} ({self.transport}) ---")
+
+    @staticmethod
+    def _local_tool(tool_name: str) -> Callable[..., str]:
+        # Imported on first use: HTTP-only deployments never load the tool dependencies
+        from tools.mcp_server_ddg import TOOLS
+        if tool_name not in TOOLS:
+            raise ValueError(f"Unknown tool '{tool_name}'")
+        return TOOLS[tool_name]
+
+    def _execute_local(self, tool_name: str, arguments: Dict[str, Any]) -> str:
+        print(f"--- MCP WRAPPER: Calling tool '{tool_name}' in-process with args {arguments} ---")
+        content_text = self._local_tool(tool_name)(**arguments)
+        if not content_text:
+            print("--- MCP WRAPPER: No content returned ---")
+            return "No results returned from tool."
+        print(f"--- MCP WRAPPER: Success. Result length: {len(content_text)} chars ---")
+        return content_text
 
     async def _execute_async(self, tool_name: str, arguments: Dict[str, Any]) -> str:
-        print(f"--- MCP WRAPPER: Connecting to {self.server_url} for tool '{tool_name}' ---")
         try:
-            # Connect to the Streamable HTTP endpoint
-            # Yields: (read, write, get_session_id_callback)
-            async with streamable_http_client(self.server_url) as (read, write, _):
-                async with ClientSession(read, write) as session:
-                    await session.initialize()
-                    
-                    # Log tools for debugging
-                    # tools = await session.list_tools()
-                    # print(f"--- MCP WRAPPER: Tools available: {[t.name for t in tools.tools]} ---")
-                    
-                    print(f"--- MCP WRAPPER: Calling tool '{tool_name}' with args {arguments} ---")
-                    result = await session.call_tool(tool_name, arguments=arguments)
-                    
-                    if result.content:
-                        content_text = result.content[0].text
-                        print(f"--- MCP WRAPPER: Success. Result length: {len(content_text)} chars ---")
-                        return content_text
-                    
-                    print("--- MCP WRAPPER: No content returned ---")
-                    return "No results returned from tool."
+            print(f"--- MCP WRAPPER: Calling tool '{tool_name}' on {self.server_url} with args {arguments} ---")
+            result = await self.pool.call_tool(self.server_url, tool_name, arguments)
+
+            if result.isError:
+                raise RuntimeError(result.content[0].text if result.content else "tool reported an error")
+
+            if result.content:
+                content_text = result.content[0].text
+                print(f"--- MCP WRAPPER: Success. Result length: {len(content_text)} chars ---")
+                return content_text
+
+            print("--- MCP WRAPPER: No content returned ---")
+            return "No results returned from tool."
         except Exception as e:
             print(f"--- MCP WRAPPER INTERNAL ERROR: {type(e).__name__}: {e} ---")
             if hasattr(e, 'exceptions'):
@@ -49,28 +65,49 @@ class MCPWrapper:
                  print(f"--- Cause: {type(e.__cause__).__name__}: {e.__cause__} ---")
             raise e
 
+    def _cached(self, tool_name: str, arguments: Dict[str, Any]) -> Optional[str]:
+        response = self.cache.get(self.server_url, tool_name, arguments)
+        if response is not None:
+            print(f"--- MCP CACHE: Hit for '{tool_name}' with args {arguments} ---")
+        return response
+
+    @staticmethod
+    def _failed(e: Exception) -> str:
+        error_msg = f"MCP Tool Execution Failed: {str(e)}"
+        print(f"--- MCP WRAPPER ERROR: {error_msg} ---")
+        return error_msg
+
     def execute_tool(self, tool_name: str, arguments: Dict[str, Any]) -> str:
         """
-        Executes an MCP tool synchronously via SSE.
-        Handles asyncio event loops gracefully.
+        Executes an MCP tool synchronously, blocking the calling thread.
+        The call runs on the session pool's event loop thread, so no event loop is
+        needed (or nested) in the caller. From async code use execute_tool_async.
         """
+        cached = self._cached(tool_name, arguments)
+        if cached is not None:
+            return cached
         try:
-            # Check if there is a running loop
-            try:
-                loop = asyncio.get_running_loop()
-            except RuntimeError:
-                loop = None
-
-            if loop and loop.is_running():
-                # We are in a running loop, use the loop to run the coroutine
-                # nest_asyncio makes this possible if asyncio.run was called,
-                # but if we are deeply nested, we might needed ensure_future?
-                # Actually, nest_asyncio allows asyncio.run() to be called even if a loop is running.
-                return asyncio.run(self._execute_async(tool_name, arguments))
+            if self.transport == "inprocess":
+                response = self._execute_local(tool_name, arguments)
             else:
-                return asyncio.run(self._execute_async(tool_name, arguments))
+                response = self.pool.run(self._execute_async(tool_name, arguments))
+        except Exception as e:
+            return self._failed(e)
+        self.cache.put(self.server_url, tool_name, arguments, response)
+        return response
 
+    async def execute_tool_async(self, tool_name: str, arguments: Dict[str, Any]) -> str:
+        """Executes an MCP tool without blocking the caller's event loop."""
+        cached = self._cached(tool_name, arguments)
+        if cached is not None:
+            return cached
+        try:
+            if self.transport == "inprocess":
+                # The tools do blocking network I/O
+                response = await asyncio.to_thread(self._execute_local, tool_name, arguments)
+            else:
+                response = await self.pool.run_async(self._execute_async(tool_name, arguments))
         except Exception as e:
-            error_msg = f"MCP Tool Execution Failed: {str(e)}"
-            print(f"--- MCP WRAPPER ERROR: {error_msg} ---")
-            return error_msg
+            return self._failed(e)
+        self.cache.put(self.server_url, tool_name, arguments, response)
+        return response
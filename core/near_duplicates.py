@@ -0,0 +1,93 @@
+# core/near_duplicates.py
+
+import zlib
+from collections import defaultdict
+from typing import Dict, List, Optional
+import numpy as np
+from core.bm25_index import tokenize
+
+# Smallest prime above 2**32; (a * x + b) stays below 2**64 for 32-bit a, x and b
+_PRIME = np.uint64(4294967311)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+
+
+class MinHasher:
+    """
+    MinHash signatures over word shingles. The estimated Jaccard similarity of two
+    texts' shingle sets is the fraction of signature positions that agree.
+    Shingles are hashed with CRC32 and the permutations come from a fixed seed,
+    so signatures are identical across processes and can be stored with the index.
+    """
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 2**32, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 2**32, size=num_perm, dtype=np.uint64)
+
+    def shingles(self, text: str) -> np.ndarray:
+        tokens = tokenize(text)
+        n = self.shingle_size
+        grams = [" ".join(tokens[i:i + n]) for i in range(max(len(tokens) - n + 1, 1))]
+        return np.unique(np.array([zlib.crc32(g.encode("utf-8")) for g in grams], dtype=np.uint64))
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = self.shingles(text)
+        permuted = ((hashes[:, None] * self.a + self.b) % _PRIME) & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def signatures(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.num_perm), dtype=np.uint32)
+        return np.stack([self.signature(t) for t in texts])
+
+
+class MinHashLSH:
+    """
+    Banded LSH over MinHash signatures: two signatures become candidates when all rows of
+    at least one band match, and a candidate is a near duplicate when its estimated Jaccard
+    similarity reaches `threshold`. Keys are insertion positions (document IDs when the
+    corpus is added in order).
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 128, bands: int = 16):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._buckets: List[Dict[bytes, List[int]]] = [defaultdict(list) for _ in range(bands)]
+        self._signatures: List[np.ndarray] = []
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def _band_keys(self, signature: np.ndarray):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def add(self, signature: np.ndarray) -> int:
+        key = len(self._signatures)
+        self._signatures.append(signature)
+        for band, band_key in self._band_keys(signature):
+            self._buckets[band][band_key].append(key)
+        return key
+
+    def add_many(self, signatures: np.ndarray):
+        for signature in signatures:
+            self.add(np.asarray(signature))
+
+    def query(self, signature: np.ndarray, exclude: Optional[np.ndarray] = None) -> Optional[int]:
+        """Key of the most similar near duplicate, or None. Keys where the `exclude` mask is set are ignored."""
+        candidates = set()
+        for band, band_key in self._band_keys(signature):
+            candidates.update(self._buckets[band].get(band_key, ()))
+        best, best_similarity = None, self.threshold
+        for key in candidates:
+            if exclude is not None and key < len(exclude) and exclude[key]:
+                continue
+            similarity = float(np.mean(self._signatures[key] == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = key, similarity
+        return best
@@ -1,188 +1,834 @@
-
 import os
+import re
+import time
+import asyncio
 import pickle
 import hashlib
-from typing import List, Tuple
-from langchain_community.vectorstores import FAISS
-from langchain_community.retrievers import BM25Retriever
-from langchain_openai import OpenAIEmbeddings
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import faiss
+import numpy as np
+from typing import Dict, List, Optional
 from langchain_core.documents import Document
 from core.config import settings
+from core.cache import LRUCache
+from core.embedding_cache import EmbeddingCache, ChunkEmbeddingCache, normalize_query
+from core.batch_embedder import ConcurrentEmbedder
+from core.embeddings import create_embeddings, embedding_cache_name
+from core.bm25_index import BM25Index
+from core.vector_index import VectorIndex, index_key, ivf_nlist_for, truncate_embeddings
+from core.segment_store import SegmentStore, IndexGeneration, EMPTY_GENERATION, tiered_merge_start
+from core.near_duplicates import MinHasher, MinHashLSH
+
+
+class IndexSnapshot:
+    """
+    Everything a search needs for one index generation. Searches read
+    `RAGService._snapshot` once and use that object throughout, so swapping in
+    a new generation never disturbs a search that is already running.
+    """
+    __slots__ = ("generation", "vector_index", "bm25_index", "rescore_dim", "category_masks", "_filter_cache")
+
+    def __init__(self, generation: IndexGeneration, vector_index: Optional[VectorIndex] = None,
+                 bm25_index: Optional[BM25Index] = None):
+        self.generation = generation
+        self.vector_index = vector_index  # row i = doc ID i
+        self.bm25_index = bm25_index
+        self.rescore_dim: Optional[int] = None  # set when candidates are re-ranked with full-precision vectors
+        self.category_masks: Dict[str, np.ndarray] = {}  # category -> boolean mask over doc IDs
+        self._filter_cache: Dict[frozenset, np.ndarray] = {}
+
+    @property
+    def version(self) -> int:
+        return self.generation.version
+
+    @property
+    def ready(self) -> bool:
+        return self.vector_index is not None and self.vector_index.ntotal > 0
+
+    def allowed(self, categories: Optional[List[str]]) -> Optional[np.ndarray]:
+        """
+        Doc-ID mask of searchable documents: not deleted and, with a category filter, in one of
+        `categories` (None means everything is searchable). Unknown categories match nothing.
+        """
+        live = self.generation.live
+        if not categories:
+            return live
+        key = frozenset(categories)
+        mask = self._filter_cache.get(key)
+        if mask is None:
+            mask = np.zeros(self.generation.n_docs, dtype=bool)
+            for category in key:
+                if category in self.category_masks:
+                    mask |= self.category_masks[category]
+            if live is not None:
+                mask &= live
+            self._filter_cache[key] = mask
+        return mask
+
 
 class RAGService:
     def __init__(self, persistence_dir: str = "./knowledge_base_index"):
         self.persistence_dir = persistence_dir
-        self.embeddings = OpenAIEmbeddings(api_key=settings.openai_api_key, model="text-embedding-3-small")
-        self.vector_store = None
-        self.bm25_retriever = None
-        self.documents = []  # Full corpus persistence
-        
+        # Configured embedder; an existing index overrides it with the one recorded in its manifest
+        self.embedding_provider = None
+        self.embedding_model = None
+        self._use_embedder(settings.embedding_provider, settings.embedding_model)
+        # Fused results (doc IDs) per (query, k, filters, index version); popular questions skip retrieval entirely
+        self.result_cache = LRUCache(settings.result_cache_size)
+        # Single on-disk corpus (memory-mapped segments); search indices refer to it by integer doc ID
+        self.store = SegmentStore(persistence_dir)
+        self._snapshot = IndexSnapshot(EMPTY_GENERATION)
+        self._write_lock = threading.Lock()
+        # Near-duplicate detection at ingest: LSH over the committed segments, extended as segments are added
+        self.minhasher = MinHasher(settings.minhash_num_perm)
+        self._lsh: Optional[MinHashLSH] = None
+        self._lsh_docs = 0
+        self._lsh_compacted = 0
+        # Worker threads for the CPU-bound search legs of ahybrid_search
+        self._search_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rag-search")
+
         self.load_index()
 
+        # Pick up generations published by other processes (e.g. ingest_knowledge.py) without a restart
+        if settings.index_reload_interval > 0:
+            threading.Thread(target=self._watch_index, name="rag-index-watcher", daemon=True).start()
+
+    @property
+    def index_version(self) -> int:
+        """Version of the index generation currently served."""
+        return self._snapshot.version
+
+    @property
+    def categories(self) -> List[str]:
+        """Categories present in the served index, for `categories=` filters."""
+        return sorted(self._snapshot.category_masks)
+
+    def stats(self) -> dict:
+        """Version, size and categories of the served index, all read from the same snapshot."""
+        snapshot = self._snapshot
+        return {
+            "ready": snapshot.ready,
+            "index_version": snapshot.version,
+            "documents": snapshot.generation.n_docs,
+            "categories": sorted(snapshot.category_masks),
+        }
+
+    @property
+    def vector_index(self) -> Optional[VectorIndex]:
+        return self._snapshot.vector_index
+
+    @property
+    def bm25_index(self) -> Optional[BM25Index]:
+        return self._snapshot.bm25_index
+
     def load_index(self):
-        """Load FAISS, BM25 indices, and document corpus from disk if they exist."""
-        if os.path.exists(self.persistence_dir):
+        """Open the current index generation and build the in-memory search structures over it."""
+        if self.store.exists():
             print(f"--- RAG: Loading existing index from {self.persistence_dir} ---")
-            
-            # Load Corpus
-            docs_path = os.path.join(self.persistence_dir, "documents.pkl")
-            if os.path.exists(docs_path):
-                try:
-                    with open(docs_path, "rb") as f:
-                        self.documents = pickle.load(f)
-                    print(f"--- RAG: Loaded {len(self.documents)} documents from persistence ---")
-                except Exception as e:
-                    print(f"--- RAG: Error loading documents: {e} ---")
-                    self.documents = []
-
-            # Load FAISS
+            generation = self.store.open_generation()
+            self._set_snapshot(self._build_snapshot(generation))
+            print(f"--- RAG: Loaded {generation.n_live} documents in {len(generation.segments)} segments (version {generation.version}) ---")
+        elif os.path.exists(os.path.join(self.persistence_dir, "documents.pkl")):
+            self._migrate_legacy_index()
+        else:
+            print("--- RAG: No existing index found. Starting fresh. ---")
+
+    def reload(self) -> bool:
+        """
+        Swap in the newest committed generation, if there is one.
+        The new snapshot is built off to the side and published with a single
+        reference assignment; in-flight searches finish on the snapshot they started with.
+        """
+        if self.store.current_version() == self._snapshot.version:
+            return False
+        with self._write_lock:
+            previous = self._snapshot
+            generation = self.store.open_generation(base=previous.generation)
+            if generation.version == previous.version:
+                return False
+            self._set_snapshot(self._build_snapshot(generation, previous))
+        print(f"--- RAG: Hot-reloaded index version {generation.version} ({generation.n_live} documents) ---")
+        return True
+
+    def _use_embedder(self, provider: str, model: str):
+        """Switch the document and query embedder (and its query cache) to provider/model."""
+        self.embeddings = create_embeddings(provider, model)
+        self.embedding_provider, self.embedding_model = provider, model
+        # Repeat questions skip the embedding round trip entirely
+        self.query_cache = EmbeddingCache(
+            self.embeddings,
+            model_name=embedding_cache_name(provider, model),
+            cache_dir=settings.embedding_cache_dir,
+            max_entries=settings.query_embedding_cache_size,
+        )
+        # Ingest: concurrent batches with adaptive backoff, and a per-chunk cache so nothing is embedded twice
+        self.batch_embedder = ConcurrentEmbedder(
+            self.embeddings, settings.embedding_batch_size, settings.embedding_concurrency, settings.embedding_max_retries
+        )
+        self.chunk_cache = ChunkEmbeddingCache(embedding_cache_name(provider, model), settings.embedding_cache_dir)
+
+    def _set_snapshot(self, snapshot: IndexSnapshot):
+        manifest = snapshot.generation.manifest
+        if manifest.get("embedding_model"):
+            # Queries must be embedded by the model that embedded the documents
+            provider = manifest.get("embedding_provider", "openai")
+            if (provider, manifest["embedding_model"]) != (self.embedding_provider, self.embedding_model):
+                print(f"--- RAG: Index was embedded with {provider}:{manifest['embedding_model']}, using that instead of "
+                      f"the configured {self.embedding_provider}:{self.embedding_model} ---")
+                self._use_embedder(provider, manifest["embedding_model"])
+        self._snapshot = snapshot
+        # Cached results are keyed by index version, so older entries can never be served again
+        self.result_cache.clear()
+
+    def _watch_index(self):
+        while True:
+            time.sleep(settings.index_reload_interval)
             try:
-                self.vector_store = FAISS.load_local(
-                    folder_path=self.persistence_dir, 
-                    embeddings=self.embeddings,
-                    allow_dangerous_deserialization=True # We trust our own local files
-                )
+                self.reload()
             except Exception as e:
-                print(f"--- RAG: Error loading FAISS: {e} ---")
-                self.vector_store = None
-            
-            # Load BM25 (only if enabled)
-            if settings.enable_bm25:
-                bm25_path = os.path.join(self.persistence_dir, "bm25.pkl")
-                if os.path.exists(bm25_path):
-                    try:
-                        with open(bm25_path, "rb") as f:
-                            self.bm25_retriever = pickle.load(f)
-                    except Exception as e:
-                        print(f"--- RAG: Error loading BM25: {e} ---")
-                        # Attempt rebuild from documents if load fails
-                        if self.documents:
-                            print("--- RAG: Rebuilding BM25 from loaded documents ---")
-                            self.bm25_retriever = BM25Retriever.from_documents(self.documents)
-                        else:
-                            self.bm25_retriever = None
+                print(f"--- RAG: Index reload failed, keeping version {self.index_version}: {e} ---")
+
+    def _build_snapshot(self, generation: IndexGeneration, previous: Optional[IndexSnapshot] = None,
+                        persist: bool = False) -> IndexSnapshot:
+        """
+        Build search structures for a generation, reusing work from `previous` when its doc IDs still
+        mean the same documents (appends, deletes and merges keep them; compaction renumbers them).
+        With `persist`, a trained vector index is saved for the generation so other processes can load it.
+        """
+        segments = generation.segments
+        n_reused = 0
+        if (previous is not None and previous.vector_index is not None
+                and previous.version < generation.version
+                and generation.manifest.get("compacted_version", 0) <= previous.version):
+            n_reused = previous.generation.n_docs
+
+        vector_index = None
+        if generation.manifest.get("dim"):
+            vector_index = self._build_vector_index(
+                generation, previous.vector_index if n_reused else None, n_reused, persist
+            )
+
+        bm25_index = None
+        if settings.enable_bm25 and generation.n_docs:
+            params = generation.manifest.get("bm25", {})
+            if all(segment.postings is not None for segment in segments):
+                # Deleted documents count neither in the corpus size nor in document frequencies
+                bm25_index = BM25Index.from_segments(
+                    generation.vocab_terms, [segment.postings for segment in segments], live=generation.live, **params
+                )
             else:
-                 self.bm25_retriever = None
+                # Index was written with BM25 disabled: build postings in memory only
+                print("--- RAG: Building BM25 from stored chunks ---")
+                bm25_index = BM25Index(**params)
+                bm25_index.add_documents(generation.iter_texts())
+                bm25_index.remove(generation.deleted)
+
+        snapshot = IndexSnapshot(generation, vector_index, bm25_index)
+        snapshot.rescore_dim = self._rescore_dim(generation, vector_index)
+        snapshot.category_masks = self._category_masks(
+            generation, previous.category_masks if n_reused else None, n_reused
+        )
+        return snapshot
+
+    def _category_masks(self, generation: IndexGeneration, previous_masks: Optional[Dict[str, np.ndarray]],
+                        n_reused: int) -> Dict[str, np.ndarray]:
+        """Per-category bitmaps over doc IDs, extending `previous_masks` with the documents from `n_reused` on."""
+        n_docs = generation.n_docs
+        masks = {}
+        for category, mask in (previous_masks or {}).items():
+            masks[category] = np.zeros(n_docs, dtype=bool)
+            masks[category][:len(mask)] = mask
+        for segment, row in generation.segments_from(n_reused):
+            categories = segment.categories[row:]
+            start = segment.doc_start + row
+            for value in np.unique(categories):
+                if not value:
+                    continue
+                mask = masks.setdefault(value.decode("utf-8"), np.zeros(n_docs, dtype=bool))
+                mask[start:start + len(categories)] = categories == value
+        return masks
+
+    def _vector_index_params(self) -> dict:
+        return {
+            "storage": settings.vector_storage,
+            "nlist": settings.ivf_nlist,
+            "hnsw_m": settings.hnsw_m,
+            "ef_construction": settings.hnsw_ef_construction,
+            "pq_m": settings.pq_m,
+            "nprobe": settings.ivf_nprobe,
+            "ef_search": settings.hnsw_ef_search,
+        }
+
+    def _can_extend(self, vector_index: VectorIndex, n_docs: int) -> bool:
+        """Whether new vectors can simply be added, or the index should be (re)built and trained."""
+        if vector_index.key != index_key(settings.vector_index_type, settings.vector_storage):
+            return False
+        # IVF cells trained on a much smaller corpus get overfull; retrain once the target list count doubles
+        nlist = vector_index.nlist
+        return nlist is None or ivf_nlist_for(n_docs, settings.ivf_nlist) < 2 * nlist
+
+    def _build_vector_index(self, generation: IndexGeneration, previous: Optional[VectorIndex],
+                            n_reused: int, persist: bool) -> VectorIndex:
+        """Vector index over `generation`, extending `previous` (which covers doc IDs below `n_reused`) when it can."""
+        vector_index = None
+        if previous is not None and self._can_extend(previous, generation.n_docs):
+            if n_reused == generation.n_docs:
+                # Nothing appended (a deletion or merge): searches never modify the index, so it can be shared
+                return previous
+            vector_index, start = previous.clone(), n_reused
         else:
-            print("--- RAG: No existing index found. Starting fresh. ---")
+            saved = self._load_saved_vector_index(generation)
+            if saved is not None:
+                vector_index, start = saved
+
+        if vector_index is None:
+            # Vectors are memory-mapped; faiss copies them into its own storage
+            vectors = np.concatenate([segment.vectors for segment in generation.segments])
+            vector_index = VectorIndex.build(settings.vector_index_type, vectors, **self._vector_index_params())
+            persist = True
+        else:
+            for segment, row in generation.segments_from(start):
+                vector_index.add(segment.vectors[row:])
+
+        # Exact flat indexes are a plain copy of the stored vectors, everything else is worth saving
+        if persist and not vector_index.exact:
+            self._save_vector_index(generation, vector_index)
+        return vector_index
+
+    def _rescore_dim(self, generation: IndexGeneration, vector_index: Optional[VectorIndex]) -> Optional[int]:
+        """Dimension of the vectors to re-rank candidates with, or None when that would not change the ranking."""
+        if vector_index is None or settings.rescore_factor <= 1:
+            return None
+        dims = {
+            segment.full_vectors.shape[1] if segment.full_vectors is not None else None
+            for segment in generation.segments
+        }
+        dim = dims.pop() if len(dims) == 1 and None not in dims else None
+        # Segments without a stored full-dimension copy are re-ranked from the chunk-embedding cache
+        full_dim = generation.manifest.get("full_dim")
+        if full_dim and (dim is None or dim < full_dim):
+            dim = full_dim
+        if dim is None:
+            return None
+        if vector_index.exact and dim == generation.manifest["dim"]:
+            return None
+        return dim
 
-    def save_index(self):
-        """Save indices and corpus to disk."""
-        if not os.path.exists(self.persistence_dir):
-            os.makedirs(self.persistence_dir)
-            
-        # Save Corpus
-        if self.documents:
-            with open(os.path.join(self.persistence_dir, "documents.pkl"), "wb") as f:
-                 pickle.dump(self.documents, f)
-            
-        if self.vector_store:
-            self.vector_store.save_local(self.persistence_dir)
-            
-        if self.bm25_retriever and settings.enable_bm25:
-            with open(os.path.join(self.persistence_dir, "bm25.pkl"), "wb") as f:
-                pickle.dump(self.bm25_retriever, f)
-        
-        print(f"--- RAG: Index and corpus saved to {self.persistence_dir} ---")
+    def _saved_vector_indexes(self, key: str) -> List[tuple]:
+        """(version, path) of saved indexes with one layout, newest first."""
+        ann_dir = os.path.join(self.persistence_dir, "ann")
+        if not os.path.isdir(ann_dir):
+            return []
+        pattern = re.compile(rf"{re.escape(key)}-(\d+)\.faiss$")
+        found = [(int(m.group(1)), os.path.join(ann_dir, name))
+                 for name in os.listdir(ann_dir) if (m := pattern.match(name))]
+        return sorted(found, reverse=True)
+
+    def _load_saved_vector_index(self, generation: IndexGeneration):
+        """Newest saved index covering a prefix of `generation`, as (index, first doc ID still to add)."""
+        key = index_key(settings.vector_index_type, settings.vector_storage)
+        for version, path in self._saved_vector_indexes(key):
+            if version > generation.version:
+                continue
+            if version < generation.manifest.get("compacted_version", 0):
+                # Saved before a compaction renumbered the doc IDs
+                return None
+            vector_index = VectorIndex.load(
+                settings.vector_index_type, settings.vector_storage, path,
+                nprobe=settings.ivf_nprobe, ef_search=settings.hnsw_ef_search,
+            )
+            if vector_index.ntotal <= generation.n_docs and self._can_extend(vector_index, generation.n_docs):
+                print(f"--- RAG: Loaded trained {vector_index.key} index from {path} ---")
+                return vector_index, vector_index.ntotal
+            return None
+        return None
+
+    def _save_vector_index(self, generation: IndexGeneration, vector_index: VectorIndex):
+        ann_dir = os.path.join(self.persistence_dir, "ann")
+        os.makedirs(ann_dir, exist_ok=True)
+        path = os.path.join(ann_dir, f"{vector_index.key}-{generation.version:06d}.faiss")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        vector_index.save(tmp_path)
+        os.replace(tmp_path, path)
+        # Only the newest trained index is ever loaded
+        for version, old_path in self._saved_vector_indexes(vector_index.key):
+            if version < generation.version:
+                os.remove(old_path)
+
+    def _migrate_legacy_index(self):
+        """
+        One-time conversion of the old pickle-based index (documents.pkl + index.faiss) into segments.
+        Runs under the writer lock, so of several processes starting together only the first migrates
+        and the others load its result.
+        """
+        with self.store.lock():
+            if self.store.exists():
+                self.load_index()
+                return
+            print(f"--- RAG: Migrating legacy pickle index in {self.persistence_dir} to segment format ---")
+            with open(os.path.join(self.persistence_dir, "documents.pkl"), "rb") as f:
+                documents = pickle.load(f)
+            if not documents:
+                return
+
+            # Reuse the stored vectors when they line up with the corpus (both were appended in the same order)
+            vectors = None
+            faiss_path = os.path.join(self.persistence_dir, "index.faiss")
+            if os.path.exists(faiss_path):
+                legacy_index = faiss.read_index(faiss_path)
+                if legacy_index.ntotal == len(documents):
+                    vectors = legacy_index.reconstruct_n(0, legacy_index.ntotal)
+            if vectors is None:
+                vectors = self._embed_documents([doc.page_content for doc in documents])
+
+            self._append_segment(documents, vectors)
+            print(f"--- RAG: Migrated {len(documents)} documents ---")
 
     def _generate_chunk_id(self, content: str) -> str:
         """Generate a stable hash ID for a document chunk."""
         return hashlib.md5(content.encode('utf-8')).hexdigest()
 
-    def add_documents(self, documents: List[Document]):
-        """Add new documents to the indices with stable IDs and full corpus persistence."""
+    def _embed_documents(self, texts: List[str], chunk_ids: Optional[List[str]] = None) -> np.ndarray:
+        """Embed chunks, reusing vectors cached by chunk ID; only misses are sent to the model."""
+        if chunk_ids is None:
+            chunk_ids = [self._generate_chunk_id(text) for text in texts]
+        cached = self.chunk_cache.get_many(chunk_ids)
+        missing = [i for i, chunk_id in enumerate(chunk_ids) if chunk_id not in cached]
+        print(f"--- RAG: Embedding {len(missing)} chunks ({len(texts) - len(missing)} cached) ---")
+
+        if missing:
+            missing_ids = [chunk_ids[i] for i in missing]
+
+            def store(start: int, vectors: List[List[float]]):
+                # Persist per batch, so an interrupted ingest keeps what it already paid for
+                self.chunk_cache.put_many(list(zip(missing_ids[start:start + len(vectors)], vectors)))
+
+            vectors = self.batch_embedder.embed([texts[i] for i in missing], on_batch=store)
+            cached.update(zip(missing_ids, vectors))
+        return np.stack([cached[chunk_id] for chunk_id in chunk_ids]).astype(np.float32)
+
+    def add_documents(self, documents: List[Document], replacing: Optional[List[str]] = None) -> Dict[str, str]:
+        """
+        Add new documents as a new index generation, skipping chunks that are already indexed.
+        `replacing` lists chunk IDs about to be deleted (the old version of a re-ingested file):
+        they don't count as near duplicates of the new chunks.
+
+        Returns the chunk ID of every chunk dropped as a near duplicate -> the chunk ID of the
+        indexed chunk standing in for it, so callers can reference the copy that is searchable.
+        """
         if not documents:
-            return
-            
+            return {}
+
         print(f"--- RAG: Adding {len(documents)} documents to index ---")
-        
-        # Assign stable IDs and deduplicate against existing corpus logic if needed
-        # For now, we append. Ideally, we should check if ID exists.
-        # Simple deduplication based on ID:
-        existing_ids = {doc.metadata.get("chunk_id") for doc in self.documents if doc.metadata.get("chunk_id")}
-        
-        new_docs_to_add = []
+
         for doc in documents:
             # Generate and assign ID if not present
             if "chunk_id" not in doc.metadata:
                 doc.metadata["chunk_id"] = self._generate_chunk_id(doc.page_content)
-            
-            if doc.metadata["chunk_id"] not in existing_ids:
+
+        # Other writers (processes included) wait until this generation is published, so the
+        # duplicate checks below see every committed chunk and versions are never contended
+        with self.store.lock():
+            # Build on top of the newest committed generation
+            self.reload()
+            survivors = self._add_new_documents(documents, replacing)
+            self._merge_segments()
+            return survivors
+
+    def _merge_segments(self):
+        """
+        Size-tiered merge of the newest segments, so that frequent small commits (the ingest daemon's
+        micro-batches) don't leave searches looping over ever more segments. Caller holds the store lock.
+        """
+        factor = settings.segment_merge_factor
+        with self._write_lock:
+            previous = self._snapshot
+            generation = previous.generation
+            start = tiered_merge_start([segment.n_docs for segment in generation.segments], factor)
+            if start is None:
+                return
+            n_segments = len(generation.segments)
+            while start is not None:
+                generation = self.store.merge(generation, start)
+                start = tiered_merge_start([segment.n_docs for segment in generation.segments], factor)
+            # Doc IDs are unchanged, so the search structures of the previous snapshot carry over
+            self._set_snapshot(self._build_snapshot(generation, previous, persist=True))
+        print(f"--- RAG: Merged {n_segments} segments into {len(generation.segments)}, "
+              f"published index version {generation.version} ---")
+
+    def _add_new_documents(self, documents: List[Document], replacing: Optional[List[str]]) -> Dict[str, str]:
+        # Binary search over each segment's sorted chunk IDs, no in-memory ID map
+        existing = self._snapshot.generation.lookup([doc.metadata["chunk_id"] for doc in documents]) >= 0
+        new_docs_to_add = []
+        batch_ids = set()
+        for doc, already_indexed in zip(documents, existing):
+            chunk_id = doc.metadata["chunk_id"]
+            if not already_indexed and chunk_id not in batch_ids:
                 new_docs_to_add.append(doc)
-                existing_ids.add(doc.metadata["chunk_id"])
-        
+                batch_ids.add(chunk_id)
+
+        # Near-identical chunks (repeated boilerplate, split overlaps) are dropped before embedding
+        signatures = self.minhasher.signatures([doc.page_content for doc in new_docs_to_add])
+        survivors = {}
+        if settings.near_duplicate_threshold > 0 and new_docs_to_add:
+            new_docs_to_add, signatures, survivors = self._drop_near_duplicates(new_docs_to_add, signatures, replacing)
+
         if not new_docs_to_add:
             print("--- RAG: No new documents to add (duplicates skipped) ---")
-            return
+            return survivors
 
         print(f"--- RAG: Actually adding {len(new_docs_to_add)} unique documents ---")
+        vectors = self._embed_documents(
+            [doc.page_content for doc in new_docs_to_add], [doc.metadata["chunk_id"] for doc in new_docs_to_add]
+        )
+        self._append_segment(new_docs_to_add, vectors, signatures)
+        return survivors
 
-        # Update persistent corpus
-        self.documents.extend(new_docs_to_add)
+    def _near_duplicate_index(self, generation: IndexGeneration) -> MinHashLSH:
+        """LSH over every document of `generation` (keys are doc IDs); only documents not yet covered are added."""
+        compacted = generation.manifest.get("compacted_version", 0)
+        if self._lsh is None or compacted != self._lsh_compacted or generation.n_docs < self._lsh_docs:
+            # First use, or the doc IDs were renumbered
+            self._lsh = MinHashLSH(settings.near_duplicate_threshold, settings.minhash_num_perm, settings.minhash_bands)
+            self._lsh_docs, self._lsh_compacted = 0, compacted
+        for segment, row in generation.segments_from(self._lsh_docs):
+            signatures = segment.minhash
+            if signatures is None or signatures.shape[1] != self.minhasher.num_perm:
+                # Segments written before signatures were stored (or with another num_perm)
+                signatures = self.minhasher.signatures([segment.text(i) for i in range(segment.n_docs)])
+            self._lsh.add_many(signatures[row:])
+        self._lsh_docs = generation.n_docs
+        return self._lsh
 
-        # Update FAISS
-        if self.vector_store:
-            self.vector_store.add_documents(new_docs_to_add)
-        else:
-            self.vector_store = FAISS.from_documents(new_docs_to_add, self.embeddings)
-            
-        # Rebuild BM25 if enabled
-        if settings.enable_bm25:
-            # To ensure consistency, we rebuild BM25 on the FULL corpus
-            # This is fast enough for <100k docs.
-            print("--- RAG: Rebuilding BM25 index on full corpus ---")
-            self.bm25_retriever = BM25Retriever.from_documents(self.documents)
-        
-        self.save_index()
-
-    def hybrid_search(self, query: str, k: int = 4) -> List[Document]:
+    def _drop_near_duplicates(self, documents: List[Document], signatures: np.ndarray,
+                              replacing: Optional[List[str]] = None):
+        """
+        Keep only documents that are not near duplicates of a live indexed document or of an earlier one
+        in the batch. Returns the kept documents, their signatures and dropped chunk ID -> kept chunk ID.
+        """
+        generation = self._snapshot.generation
+        corpus = self._near_duplicate_index(generation)
+        # Deleted documents, and those about to be, must not shadow their replacements
+        live = generation.live
+        exclude = ~live if live is not None else np.zeros(generation.n_docs, dtype=bool)
+        if replacing:
+            replaced = generation.lookup(replacing)
+            exclude[replaced[replaced >= 0]] = True
+        batch = MinHashLSH(settings.near_duplicate_threshold, settings.minhash_num_perm, settings.minhash_bands)
+
+        keep, survivors, dropped_indexed, dropped_batch = [], {}, 0, 0
+        for i, signature in enumerate(signatures):
+            chunk_id = documents[i].metadata["chunk_id"]
+            doc_id = corpus.query(signature, exclude)
+            if doc_id is not None:
+                survivors[chunk_id] = generation.chunk_id(doc_id)
+                dropped_indexed += 1
+                continue
+            # Batch keys are positions in `keep`
+            key = batch.query(signature)
+            if key is not None:
+                survivors[chunk_id] = documents[keep[key]].metadata["chunk_id"]
+                dropped_batch += 1
+                continue
+            batch.add(signature)
+            keep.append(i)
+
+        if dropped_indexed or dropped_batch:
+            print(f"--- RAG: Dropped {dropped_indexed + dropped_batch} near-duplicate chunks "
+                  f"({dropped_indexed} of indexed chunks, {dropped_batch} within the batch; "
+                  f"Jaccard >= {settings.near_duplicate_threshold}) ---")
+        return [documents[i] for i in keep], signatures[keep], survivors
+
+    def _append_segment(self, documents: List[Document], vectors: np.ndarray, signatures: Optional[np.ndarray] = None):
+        """Commit documents, their vectors and BM25 postings as one new segment and serve the new generation."""
+        texts = [doc.page_content for doc in documents]
+        for doc in documents:
+            doc.metadata.setdefault("chunk_id", self._generate_chunk_id(doc.page_content))
+        chunk_ids = [doc.metadata["chunk_id"] for doc in documents]
+
+        with self._write_lock:
+            previous = self._snapshot
+            generation = previous.generation
+
+            # The index dimension is fixed by the first commit; later segments follow the manifest
+            full_dim = int(vectors.shape[1])
+            index_dim = generation.manifest.get("dim") or min(settings.embedding_dimensions or full_dim, full_dim)
+            index_vectors = truncate_embeddings(vectors, index_dim)
+            full_vectors = None
+            if settings.vector_storage != "float32":
+                index_vectors = index_vectors.astype(np.float16)
+            if settings.store_full_vectors and (index_dim < full_dim or settings.vector_storage != "float32"):
+                full_vectors = vectors
+
+            postings, new_terms, bm25_params = None, [], {}
+            if settings.enable_bm25 and all(segment.postings is not None for segment in generation.segments):
+                # Extend a private copy so searches on the current snapshot never see a half-updated index
+                bm25_params = generation.manifest.get("bm25") or {"k1": 1.5, "b": 0.75}
+                bm25_index = BM25Index.from_segments(
+                    generation.vocab_terms, [segment.postings for segment in generation.segments],
+                    live=generation.live, **bm25_params
+                )
+                # Incremental: only the new documents are tokenized, as a new postings segment
+                bm25_index.add_documents(texts)
+                postings = bm25_index.segments[-1]
+                new_terms = list(bm25_index.vocab)[len(generation.vocab_terms):]
+
+            new_generation = self.store.commit(
+                generation,
+                texts,
+                [doc.metadata for doc in documents],
+                chunk_ids,
+                index_vectors,
+                postings=postings,
+                new_vocab_terms=new_terms,
+                full_vectors=full_vectors,
+                minhash=signatures if signatures is not None else self.minhasher.signatures(texts),
+                dim=index_dim,
+                full_dim=full_dim,
+                embedding_provider=self.embedding_provider,
+                embedding_model=self.embedding_model,
+                bm25=bm25_params,
+            )
+            self._set_snapshot(self._build_snapshot(new_generation, previous, persist=True))
+
+        print(f"--- RAG: Published index version {new_generation.version} ({new_generation.n_live} documents total) ---")
+
+    def delete_documents(self, chunk_ids: List[str]) -> int:
+        """Tombstone chunks by chunk ID in a new index generation. Returns how many were deleted."""
+        if not chunk_ids:
+            return 0
+
+        with self.store.lock():
+            self.reload()
+            with self._write_lock:
+                previous = self._snapshot
+                doc_ids = previous.generation.lookup(list(chunk_ids))
+                doc_ids = np.unique(doc_ids[doc_ids >= 0])
+                if not len(doc_ids):
+                    print("--- RAG: No indexed chunks to delete ---")
+                    return 0
+                new_generation = self.store.delete(previous.generation, doc_ids)
+                self._set_snapshot(self._build_snapshot(new_generation, previous, persist=True))
+
+        print(f"--- RAG: Deleted {len(doc_ids)} chunks, published index version {new_generation.version} "
+              f"({new_generation.n_live} documents total) ---")
+        fraction = settings.compact_deleted_fraction
+        if fraction > 0 and len(new_generation.deleted) >= fraction * new_generation.n_docs:
+            self.compact()
+        return len(doc_ids)
+
+    def compact(self) -> bool:
+        """
+        Rewrite the index without its deleted chunks, as a new generation with renumbered doc IDs
+        (chunk IDs are unchanged). Returns False when there is nothing to drop.
+        """
+        with self.store.lock():
+            self.reload()
+            with self._write_lock:
+                previous = self._snapshot
+                generation = previous.generation
+                # An index with nothing live left keeps its tombstones
+                if not len(generation.deleted) or not generation.n_live:
+                    return False
+                new_generation = self.store.compact(generation)
+                self._set_snapshot(self._build_snapshot(new_generation, previous, persist=True))
+
+        print(f"--- RAG: Compacted away {len(generation.deleted)} deleted chunks, published index version "
+              f"{new_generation.version} ({new_generation.n_live} documents) ---")
+        return True
+
+    def embed_query(self, query: str) -> List[float]:
+        """Query embedding from the shared query cache (a later search reuses it)."""
+        return self.query_cache.embed_query(query)
+
+    def semantic_search(self, query: str, k: int = 4, categories: Optional[List[str]] = None,
+                        nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> List[Document]:
+        """Vector-only search (used by the no-BM25 evaluation)."""
+        snapshot = self._snapshot
+        if not snapshot.ready:
+            return []
+        key = self._result_key("semantic", query, k, categories, nprobe, ef_search, snapshot)
+        ids = self.result_cache.get(key)
+        if ids is None:
+            ids = self._semantic_search_batch(
+                snapshot, [self.query_cache.embed_query(query)], k, snapshot.allowed(categories), nprobe, ef_search
+            )[0]
+            self.result_cache.put(key, ids)
+        return self._to_documents(snapshot, ids)
+
+    def hybrid_search(self, query: str, k: int = 4, categories: Optional[List[str]] = None,
+                      nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> List[Document]:
         """Perform hybrid search using RRF with stable ID matching."""
-        if not self.vector_store:
+        return self.hybrid_search_batch([query], k=k, categories=categories, nprobe=nprobe, ef_search=ef_search)[0]
+
+    def hybrid_search_batch(self, queries: List[str], k: int = 4, categories: Optional[List[str]] = None,
+                            nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> List[List[Document]]:
+        """
+        Hybrid search for several queries at once.
+        All queries are embedded in one request and FAISS searches the whole query
+        matrix in one call. BM25 still scores each query on its own, but the
+        postings of terms shared by several queries are gathered only once.
+        `categories` restricts both legs to documents whose `category` metadata is listed.
+        `nprobe` (IVF) and `ef_search` (HNSW) trade recall for latency on this call only.
+        Queries answered before on the same index version come from the result cache.
+        """
+        if not queries:
+            return []
+        snapshot = self._snapshot
+        if not snapshot.ready:
              print("--- RAG: Vector index not ready, returning empty ---")
-             return []
+             return [[] for _ in queries]
+
+        keys = [self._result_key("hybrid", q, k, categories, nprobe, ef_search, snapshot) for q in queries]
+        results = [self.result_cache.get(key) for key in keys]
+        missing = [i for i, ids in enumerate(results) if ids is None]
+        if missing:
+            computed = self._hybrid_search_ids(
+                snapshot, [queries[i] for i in missing], k, snapshot.allowed(categories), nprobe, ef_search
+            )
+            for i, ids in zip(missing, computed):
+                results[i] = ids
+                self.result_cache.put(keys[i], ids)
+        return [self._to_documents(snapshot, ids) for ids in results]
 
+    def _hybrid_search_ids(self, snapshot: IndexSnapshot, queries: List[str], k: int, allowed: Optional[np.ndarray],
+                           nprobe: Optional[int], ef_search: Optional[int]) -> List[List[int]]:
         # 1. Semantic Search
         # We fetch more candidates to allow RRF to do its job better
         semantic_k = k * 3 if settings.enable_bm25 else k
-        semantic_docs = self.vector_store.similarity_search(query, k=semantic_k)
-        
-        if not settings.enable_bm25 or not self.bm25_retriever:
-            return semantic_docs[:k]
+        query_vectors = self.query_cache.embed_queries(queries)
+        semantic_results = self._semantic_search_batch(
+            snapshot, query_vectors, semantic_k, allowed, nprobe, ef_search
+        )
+
+        if not settings.enable_bm25 or snapshot.bm25_index is None:
+            return [ids[:k] for ids in semantic_results]
 
         # 2. Keyword Search
         keyword_k = k * 3
-        keyword_docs = self.bm25_retriever.invoke(query)
-        keyword_docs = keyword_docs[:keyword_k]
-        
+        keyword_results = self._keyword_search_batch(snapshot, queries, keyword_k, allowed)
+
         # 3. RRF Fusion
-        combined_docs = self._rrf_merge(semantic_docs, keyword_docs, k=k)
-        return combined_docs
+        return [
+            self._rrf_merge(semantic_ids, keyword_ids, k=k)
+            for semantic_ids, keyword_ids in zip(semantic_results, keyword_results)
+        ]
+
+    async def ahybrid_search(self, query: str, k: int = 4, categories: Optional[List[str]] = None,
+                             nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> List[Document]:
+        """
+        Async hybrid search. The query embedding (network bound) and BM25 scoring
+        (CPU bound, on the search thread pool) run concurrently, so latency is
+        roughly that of the slower leg rather than the sum of both.
+        """
+        snapshot = self._snapshot
+        if not snapshot.ready:
+             print("--- RAG: Vector index not ready, returning empty ---")
+             return []
+        key = self._result_key("hybrid", query, k, categories, nprobe, ef_search, snapshot)
+        ids = self.result_cache.get(key)
+        if ids is None:
+            ids = await self._ahybrid_search_ids(snapshot, query, k, snapshot.allowed(categories), nprobe, ef_search)
+            self.result_cache.put(key, ids)
+        return self._to_documents(snapshot, ids)
+
+    async def _ahybrid_search_ids(self, snapshot: IndexSnapshot, query: str, k: int, allowed: Optional[np.ndarray],
+                                  nprobe: Optional[int], ef_search: Optional[int]) -> List[int]:
+        loop = asyncio.get_running_loop()
+        semantic_k = k * 3 if settings.enable_bm25 else k
+        use_bm25 = settings.enable_bm25 and snapshot.bm25_index is not None
 
-    def _rrf_merge(self, list1: List[Document], list2: List[Document], k: int = 4, c: int = 60) -> List[Document]:
-        """Reciprocal Rank Fusion using stable chunk_ids."""
-        from collections import defaultdict
-        
+        if use_bm25:
+            keyword_k = k * 3
+            query_vector, keyword_results = await asyncio.gather(
+                self.query_cache.aembed_query(query),
+                loop.run_in_executor(
+                    self._search_pool, self._keyword_search_batch, snapshot, [query], keyword_k, allowed
+                ),
+            )
+        else:
+            query_vector = await self.query_cache.aembed_query(query)
+
+        semantic_results = await loop.run_in_executor(
+            self._search_pool, self._semantic_search_batch, snapshot, [query_vector], semantic_k,
+            allowed, nprobe, ef_search,
+        )
+
+        if not use_bm25:
+            return semantic_results[0][:k]
+        return self._rrf_merge(semantic_results[0], keyword_results[0], k=k)
+
+    def _result_key(self, mode: str, query: str, k: int, categories: Optional[List[str]],
+                    nprobe: Optional[int], ef_search: Optional[int], snapshot: IndexSnapshot) -> tuple:
+        # Both legs only see the normalized query (embedding cache key, lowercase BM25 tokens)
+        filters = tuple(sorted(set(categories))) if categories else None
+        return (mode, normalize_query(query), k, filters, nprobe, ef_search, snapshot.version)
+
+    def _semantic_search_batch(self, snapshot: IndexSnapshot, query_vectors: List[List[float]], k: int,
+                               allowed: Optional[np.ndarray] = None, nprobe: Optional[int] = None,
+                               ef_search: Optional[int] = None) -> List[List[int]]:
+        """
+        Run a single FAISS search over the stacked query matrix. Returns doc IDs per query.
+        With quantized or truncated vectors, k * rescore_factor candidates are re-ranked at full precision.
+        """
+        matrix = np.asarray(query_vectors, dtype=np.float32)
+        index_matrix = truncate_embeddings(matrix, snapshot.generation.manifest["dim"])
+        if snapshot.rescore_dim is None:
+            return snapshot.vector_index.search(index_matrix, k, nprobe=nprobe, ef_search=ef_search, allowed=allowed)
+
+        candidates = snapshot.vector_index.search(
+            index_matrix, k * settings.rescore_factor, nprobe=nprobe, ef_search=ef_search, allowed=allowed
+        )
+        # Full vectors of every candidate in the batch at once
+        candidate_ids = sorted({doc_id for doc_ids in candidates for doc_id in doc_ids})
+        full = self._full_vectors(snapshot.generation, candidate_ids, snapshot.rescore_dim)
+        row = {doc_id: i for i, doc_id in enumerate(candidate_ids)}
+        rescore_matrix = truncate_embeddings(matrix, snapshot.rescore_dim)
+        results = []
+        for query, doc_ids in zip(rescore_matrix, candidates):
+            if full is None or not doc_ids:
+                results.append(doc_ids[:k])
+                continue
+            vectors = truncate_embeddings(full[[row[doc_id] for doc_id in doc_ids]], snapshot.rescore_dim)
+            distances = ((vectors - query) ** 2).sum(axis=1)
+            results.append([doc_ids[i] for i in np.argsort(distances)[:k]])
+        return results
+
+    def _full_vectors(self, generation: IndexGeneration, doc_ids: List[int], dim: int) -> Optional[np.ndarray]:
+        """
+        Float32 vectors of at least `dim` components: stored with the segments, else from the
+        chunk-embedding cache. None (keep the index ranking) if a vector is in neither.
+        """
+        if not doc_ids:
+            return None
+        vectors = generation.full_vectors(doc_ids)
+        if vectors is not None and vectors.shape[1] >= dim:
+            return vectors
+        chunk_ids = [generation.chunk_id(doc_id) for doc_id in doc_ids]
+        cached = self.chunk_cache.get_many(chunk_ids)
+        if len(cached) < len(set(chunk_ids)):
+            return None
+        return np.stack([cached[chunk_id] for chunk_id in chunk_ids])
+
+    def _keyword_search_batch(self, snapshot: IndexSnapshot, queries: List[str], k: int,
+                              allowed: Optional[np.ndarray] = None) -> List[List[int]]:
+        """BM25 top-k doc IDs for every query in the batch."""
+        results = snapshot.bm25_index.search_batch(queries, k=k, allowed=allowed)
+        return [[doc_id for doc_id, _ in hits] for hits in results]
+
+    def _to_documents(self, snapshot: IndexSnapshot, doc_ids: List[int]) -> List[Document]:
+        """Materialize Documents from the memory-mapped store (only for the final results)."""
+        return [snapshot.generation.document(i) for i in doc_ids]
+
+    def _rrf_merge(self, list1: List[int], list2: List[int], k: int = 4, c: int = 60) -> List[int]:
+        """Reciprocal Rank Fusion over doc IDs."""
         scores = defaultdict(float)
-        
-        # Map IDs to docs to return the correct objects
-        id_to_doc = {}
-        
-        def process_list(doc_list):
-            for rank, doc in enumerate(doc_list):
-                # Use chunk_id if available, else page_content (fallback for old index compat)
-                doc_id = doc.metadata.get("chunk_id", doc.page_content)
-                id_to_doc[doc_id] = doc
+        for doc_list in (list1, list2):
+            for rank, doc_id in enumerate(doc_list):
                 scores[doc_id] += 1 / (rank + c)
-        
-        process_list(list1)
-        process_list(list2)
-        
+
         # Sort by score
         sorted_ids = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-        
-        merged_docs = []
-        for doc_id, score in sorted_ids[:k]:
-            if doc_id in id_to_doc:
-                merged_docs.append(id_to_doc[doc_id])
-                
-        return merged_docs
+        return [doc_id for doc_id, _ in sorted_ids[:k]]
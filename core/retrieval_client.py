@@ -0,0 +1,178 @@
+# core/retrieval_client.py
+
+import asyncio
+import threading
+import time
+from typing import List, Optional
+import httpx
+from langchain_core.documents import Document
+from core.config import settings
+
+
+class RemoteRAGService:
+    """
+    Drop-in replacement for RAGService's search interface that queries
+    retrieval_server.py over HTTP. The process using it loads no index,
+    so any number of app workers can share one copy in the server.
+
+    The async connection pool is bound to the event loop that opened it, so it lives
+    on a loop of its own on a background thread (as in MCPSessionPool) and serves
+    callers on any event loop. close() / aclose(), or a `with` / `async with` block,
+    release both pools.
+    """
+
+    CATEGORIES_TTL = 30.0
+
+    def __init__(self, base_url: str, timeout: float = 30.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        # Keep-alive connection pools; the async one is opened lazily on the client's own loop
+        self._client = httpx.Client(base_url=self.base_url, timeout=timeout)
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self._health: dict = {}
+        self._health_at = 0.0
+        # Index version the server reported with its latest search results
+        self._index_version: Optional[int] = None
+
+    def _payload(self, queries: List[str], k: int, mode: str, categories, nprobe, ef_search) -> dict:
+        return {
+            "queries": queries, "k": k, "mode": mode,
+            "categories": categories, "nprobe": nprobe, "ef_search": ef_search,
+        }
+
+    def _documents(self, response: httpx.Response) -> List[List[Document]]:
+        response.raise_for_status()
+        body = response.json()
+        if "index_version" in body:
+            self._index_version = body["index_version"]
+        return [
+            [Document(page_content=d["page_content"], metadata=d["metadata"]) for d in docs]
+            for docs in body["results"]
+        ]
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="rag-client", daemon=True).start()
+            return self._loop
+
+    async def _apost(self, path: str, payload: dict) -> httpx.Response:
+        # Runs on self.loop, so the pooled connections never cross event loops
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout)
+        return await self._async_client.post(path, json=payload)
+
+    def _search(self, queries: List[str], k: int, mode: str = "hybrid", categories: Optional[List[str]] = None,
+                nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> List[List[Document]]:
+        if not queries:
+            return []
+        try:
+            response = self._client.post("/search", json=self._payload(queries, k, mode, categories, nprobe, ef_search))
+            return self._documents(response)
+        except Exception as e:
+            print(f"--- RAG CLIENT: Retrieval server error ({e}), returning empty ---")
+            return [[] for _ in queries]
+
+    def hybrid_search(self, query: str, k: int = 4, categories: Optional[List[str]] = None,
+                      nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> List[Document]:
+        return self._search([query], k, "hybrid", categories, nprobe, ef_search)[0]
+
+    def hybrid_search_batch(self, queries: List[str], k: int = 4, categories: Optional[List[str]] = None,
+                            nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> List[List[Document]]:
+        return self._search(queries, k, "hybrid", categories, nprobe, ef_search)
+
+    def semantic_search(self, query: str, k: int = 4, categories: Optional[List[str]] = None,
+                        nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> List[Document]:
+        return self._search([query], k, "semantic", categories, nprobe, ef_search)[0]
+
+    async def ahybrid_search(self, query: str, k: int = 4, categories: Optional[List[str]] = None,
+                             nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> List[Document]:
+        try:
+            payload = self._payload([query], k, "hybrid", categories, nprobe, ef_search)
+            future = asyncio.run_coroutine_threadsafe(self._apost("/search", payload), self.loop)
+            response = await asyncio.wrap_future(future)
+            return self._documents(response)[0]
+        except Exception as e:
+            print(f"--- RAG CLIENT: Retrieval server error ({e}), returning empty ---")
+            return []
+
+    def embed_query(self, query: str) -> Optional[List[float]]:
+        """Query embedding from the server's embedder, so vectors match the index's model."""
+        try:
+            response = self._client.post("/embed", json={"queries": [query]})
+            response.raise_for_status()
+            return response.json()["vectors"][0]
+        except Exception as e:
+            print(f"--- RAG CLIENT: Retrieval server error ({e}) ---")
+            return None
+
+    def health(self) -> dict:
+        """Server status (index version, size, categories, cache stats); cached briefly."""
+        if time.time() - self._health_at > self.CATEGORIES_TTL:
+            try:
+                response = self._client.get("/health")
+                response.raise_for_status()
+                self._health = response.json()
+            except Exception as e:
+                print(f"--- RAG CLIENT: Retrieval server health check failed ({e}) ---")
+            self._health_at = time.time()
+        return self._health
+
+    @property
+    def categories(self) -> List[str]:
+        return self.health().get("categories", [])
+
+    @property
+    def index_version(self) -> int:
+        """
+        Index version the server answered the latest search from, so callers keying
+        caches on it see a new generation as soon as results come from it.
+        Before the first search, the version from /health.
+        """
+        if self._index_version is None:
+            return self.health().get("index_version", 0)
+        return self._index_version
+
+    async def _aclose_async_client(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+    def close(self):
+        """Close both connection pools and stop the async pool's loop."""
+        self._client.close()
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(self._aclose_async_client(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+
+    async def aclose(self):
+        """close() without blocking the caller's event loop."""
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    def __enter__(self) -> "RemoteRAGService":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    async def __aenter__(self) -> "RemoteRAGService":
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+
+def create_rag_service():
+    """RemoteRAGService when RETRIEVAL_SERVER_URL is set, otherwise an in-process RAGService."""
+    if settings.retrieval_server_url:
+        print(f"--- RAG: Using retrieval server at {settings.retrieval_server_url} ---")
+        return RemoteRAGService(settings.retrieval_server_url)
+    # Imported here so workers using the server never load FAISS or the index
+    from core.rag_service import RAGService
+    return RAGService()
@@ -0,0 +1,606 @@
+# core/segment_store.py
+
+import os
+import json
+import shutil
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from core.bm25_index import PostingsSegment
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within one process
+    fcntl = None
+
+
+def _fsync_dir(path: str):
+    """Persist a directory's entries (renames, new files) to disk; a no-op where directories can't be opened."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:  # Windows
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _fsync_tree(path: str):
+    """fsync every file under `path` and the directories holding them."""
+    for root, _, files in os.walk(path):
+        for name in files:
+            with open(os.path.join(root, name), "rb") as f:
+                os.fsync(f.fileno())
+        _fsync_dir(root)
+
+
+def _write_blobs(path: str, name: str, blobs: List[bytes]):
+    """Concatenate byte strings into `<name>.bin` with an offsets array in `<name>_offsets.npy`."""
+    offsets = np.zeros(len(blobs) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in blobs], out=offsets[1:])
+    with open(os.path.join(path, f"{name}.bin"), "wb") as f:
+        for blob in blobs:
+            f.write(blob)
+    np.save(os.path.join(path, f"{name}_offsets.npy"), offsets)
+
+
+def _open_blobs(path: str, name: str):
+    offsets = np.load(os.path.join(path, f"{name}_offsets.npy"), mmap_mode="r")
+    data_path = os.path.join(path, f"{name}.bin")
+    if os.path.getsize(data_path) == 0:
+        return offsets, np.zeros(0, dtype=np.uint8)
+    return offsets, np.memmap(data_path, dtype=np.uint8, mode="r")
+
+
+def _category_array(metadatas: List[dict]) -> np.ndarray:
+    return np.array([str(m.get("category", "")).encode("utf-8") for m in metadatas], dtype="S")
+
+
+class ChunkSegment:
+    """
+    One immutable, memory-mapped slice of the corpus: chunk texts and metadata
+    (UTF-8 / JSON blobs with offset arrays), chunk IDs, the embedding matrix and,
+    when BM25 is enabled, the BM25 postings for the same documents.
+
+    Metadata is interned: chunks of the same page share one JSON blob
+    (meta_index.npy maps each document to it) and the per-chunk `chunk_id` is
+    kept only in chunk_ids.npy. chunk_order.npy sorts the chunk IDs so they
+    can be looked up by binary search without a Python dict.
+
+    `vectors` are what the vector index is built from (possibly truncated and
+    float16). `full_vectors` are float32 vectors used to re-score candidates:
+    the optional vectors_full.npy, else `vectors` when already float32.
+    `minhash` holds the MinHash signatures used for near-duplicate detection
+    (None for segments written before they were stored).
+    """
+
+    def __init__(self, name: str, path: str, doc_start: int):
+        self.name = name
+        self.doc_start = doc_start
+        self.text_offsets, self.text_data = _open_blobs(path, "text")
+        self.meta_offsets, self.meta_data = _open_blobs(path, "meta")
+        meta_index_path = os.path.join(path, "meta_index.npy")
+        self.meta_index = np.load(meta_index_path, mmap_mode="r") if os.path.exists(meta_index_path) else None
+        self.chunk_ids = np.load(os.path.join(path, "chunk_ids.npy"), mmap_mode="r")
+        chunk_order_path = os.path.join(path, "chunk_order.npy")
+        if os.path.exists(chunk_order_path):
+            self.chunk_order = np.load(chunk_order_path, mmap_mode="r")
+        else:
+            self.chunk_order = np.argsort(self.chunk_ids, kind="stable")
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        full_path = os.path.join(path, "vectors_full.npy")
+        if os.path.exists(full_path):
+            self.full_vectors = np.load(full_path, mmap_mode="r")
+        else:
+            self.full_vectors = self.vectors if self.vectors.dtype == np.float32 else None
+        minhash_path = os.path.join(path, "minhash.npy")
+        self.minhash = np.load(minhash_path, mmap_mode="r") if os.path.exists(minhash_path) else None
+        categories_path = os.path.join(path, "categories.npy")
+        self._categories = np.load(categories_path, mmap_mode="r") if os.path.exists(categories_path) else None
+        bm25_path = os.path.join(path, "bm25")
+        self.postings = PostingsSegment.load(bm25_path, doc_start) if os.path.isdir(bm25_path) else None
+
+    @property
+    def n_docs(self) -> int:
+        return len(self.text_offsets) - 1
+
+    def text(self, i: int) -> str:
+        return bytes(self.text_data[self.text_offsets[i]:self.text_offsets[i + 1]]).decode("utf-8")
+
+    def chunk_id(self, i: int) -> str:
+        return self.chunk_ids[i].decode("utf-8")
+
+    def metadata(self, i: int) -> dict:
+        j = i if self.meta_index is None else self.meta_index[i]
+        metadata = json.loads(bytes(self.meta_data[self.meta_offsets[j]:self.meta_offsets[j + 1]]))
+        metadata["chunk_id"] = self.chunk_id(i)
+        return metadata
+
+    def find(self, chunk_ids: np.ndarray) -> np.ndarray:
+        """Row of each chunk ID (bytes array) within this segment, -1 where absent."""
+        if self.n_docs == 0:
+            return np.full(len(chunk_ids), -1, dtype=np.int64)
+        pos = np.searchsorted(self.chunk_ids, chunk_ids, sorter=self.chunk_order)
+        rows = np.asarray(self.chunk_order)[np.minimum(pos, self.n_docs - 1)].astype(np.int64)
+        return np.where(self.chunk_ids[rows] == chunk_ids, rows, -1)
+
+    @property
+    def categories(self) -> np.ndarray:
+        """UTF-8 `category` metadata of every document (b"" when missing), for building filter bitmaps."""
+        if self._categories is None:
+            # Segments written before categories.npy existed: read it from the metadata once
+            self._categories = _category_array([self.metadata(i) for i in range(self.n_docs)])
+        return self._categories
+
+    @staticmethod
+    def write(path: str, texts: List[str], metadatas: List[dict], chunk_ids: List[str],
+              vectors: np.ndarray, postings: Optional[PostingsSegment], full_vectors: Optional[np.ndarray] = None,
+              minhash: Optional[np.ndarray] = None):
+        """Write a segment directory. Written to a temporary name and renamed, so a crash never leaves half a segment."""
+        tmp_path = path + ".tmp"
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+
+        _write_blobs(tmp_path, "text", [t.encode("utf-8") for t in texts])
+        interned, meta_index = {}, np.zeros(len(metadatas), dtype=np.uint32)
+        for i, metadata in enumerate(metadatas):
+            blob = json.dumps({k: v for k, v in metadata.items() if k != "chunk_id"},
+                              sort_keys=True, default=str).encode("utf-8")
+            meta_index[i] = interned.setdefault(blob, len(interned))
+        _write_blobs(tmp_path, "meta", list(interned))
+        np.save(os.path.join(tmp_path, "meta_index.npy"), meta_index)
+
+        chunk_id_array = np.array([c.encode("utf-8") for c in chunk_ids], dtype="S")
+        np.save(os.path.join(tmp_path, "chunk_ids.npy"), chunk_id_array)
+        np.save(os.path.join(tmp_path, "chunk_order.npy"), np.argsort(chunk_id_array, kind="stable").astype(np.int32))
+        np.save(os.path.join(tmp_path, "categories.npy"), _category_array(metadatas))
+        np.save(os.path.join(tmp_path, "vectors.npy"), np.ascontiguousarray(vectors))
+        if full_vectors is not None:
+            np.save(os.path.join(tmp_path, "vectors_full.npy"), np.ascontiguousarray(full_vectors, dtype=np.float32))
+        if minhash is not None:
+            np.save(os.path.join(tmp_path, "minhash.npy"), np.ascontiguousarray(minhash, dtype=np.uint32))
+        if postings is not None:
+            postings.save(os.path.join(tmp_path, "bm25"))
+        # On disk before any manifest can reference it
+        _fsync_tree(tmp_path)
+        os.replace(tmp_path, path)
+        _fsync_dir(os.path.dirname(path))
+
+
+class IndexGeneration:
+    """
+    Immutable view of one committed version of the index: its manifest, the
+    opened segments and the BM25 vocabulary as of that commit. Readers keep
+    using a generation for as long as they hold it, whatever is committed later.
+    `deleted` holds the sorted doc IDs of tombstoned documents; they stay in
+    their segments but must not be returned by searches.
+    """
+
+    def __init__(self, version: int, manifest: Dict, segments: List[ChunkSegment], vocab_terms: List[str],
+                 deleted: Optional[np.ndarray] = None):
+        self.version = version
+        self.manifest = manifest
+        self.segments = segments
+        self.vocab_terms = vocab_terms
+        self.deleted = deleted if deleted is not None else np.zeros(0, dtype=np.int64)
+        self._doc_starts = [segment.doc_start for segment in segments]
+        self._live: Optional[np.ndarray] = None
+
+    @property
+    def n_docs(self) -> int:
+        if not self.segments:
+            return 0
+        last = self.segments[-1]
+        return last.doc_start + last.n_docs
+
+    @property
+    def n_live(self) -> int:
+        return self.n_docs - len(self.deleted)
+
+    @property
+    def live(self) -> Optional[np.ndarray]:
+        """Boolean mask of documents that are not deleted, or None when nothing is."""
+        if not len(self.deleted):
+            return None
+        if self._live is None:
+            live = np.ones(self.n_docs, dtype=bool)
+            live[self.deleted] = False
+            self._live = live
+        return self._live
+
+    def segments_from(self, doc_id: int) -> Iterator[Tuple[ChunkSegment, int]]:
+        """(segment, first row) of every segment holding documents from `doc_id` on."""
+        for segment in self.segments:
+            if segment.doc_start + segment.n_docs > doc_id:
+                yield segment, max(0, doc_id - segment.doc_start)
+
+    def _locate(self, doc_id: int):
+        seg_no = bisect.bisect_right(self._doc_starts, doc_id) - 1
+        segment = self.segments[seg_no]
+        return segment, doc_id - segment.doc_start
+
+    def text(self, doc_id: int) -> str:
+        segment, i = self._locate(doc_id)
+        return segment.text(i)
+
+    def chunk_id(self, doc_id: int) -> str:
+        segment, i = self._locate(doc_id)
+        return segment.chunk_id(i)
+
+    def document(self, doc_id: int) -> Document:
+        segment, i = self._locate(doc_id)
+        return Document(page_content=segment.text(i), metadata=segment.metadata(i))
+
+    def full_vectors(self, doc_ids: List[int]) -> Optional[np.ndarray]:
+        """Full-precision vectors for some documents, or None if a segment has none stored."""
+        rows = []
+        for doc_id in doc_ids:
+            segment, i = self._locate(doc_id)
+            if segment.full_vectors is None:
+                return None
+            rows.append(segment.full_vectors[i])
+        return np.asarray(rows, dtype=np.float32)
+
+    def iter_texts(self):
+        for segment in self.segments:
+            for i in range(segment.n_docs):
+                yield segment.text(i)
+
+    def iter_chunk_ids(self):
+        for segment in self.segments:
+            for chunk_id in segment.chunk_ids:
+                yield chunk_id.decode("utf-8")
+
+    def lookup(self, chunk_ids: List[str]) -> np.ndarray:
+        """Doc ID of each chunk ID, -1 for chunks not in this generation (or deleted)."""
+        keys = np.array([c.encode("utf-8") for c in chunk_ids], dtype="S")
+        doc_ids = np.full(len(keys), -1, dtype=np.int64)
+        live = self.live
+        for segment in self.segments:
+            rows = segment.find(keys)
+            hit = (doc_ids == -1) & (rows >= 0)
+            if live is not None:
+                # A deleted chunk may have been added again in a later segment
+                hit[hit] = live[rows[hit] + segment.doc_start]
+            doc_ids[hit] = rows[hit] + segment.doc_start
+        return doc_ids
+
+
+EMPTY_GENERATION = IndexGeneration(0, {}, [], [])
+
+
+def tiered_merge_start(sizes: List[int], factor: int) -> Optional[int]:
+    """
+    Size-tiered merge policy over segment sizes (in order). A segment's tier is floor(log_factor(size)).
+    Returns where the trailing run to merge starts: the smallest tier t such that the last segments
+    of tier <= t number at least `factor`. None when nothing needs merging (or factor < 2).
+    Merging bottom tiers first keeps about `factor` segments per tier, so the segment count grows
+    with the log of the corpus size while each document is rewritten about once per tier.
+    """
+    if factor < 2 or len(sizes) < factor:
+        return None
+    tiers = []
+    for size in sizes:
+        tier = 0
+        while size >= factor:
+            size //= factor
+            tier += 1
+        tiers.append(tier)
+    for tier in sorted(set(tiers)):
+        start = len(tiers)
+        while start > 0 and tiers[start - 1] <= tier:
+            start -= 1
+        if len(tiers) - start >= factor:
+            return start
+    return None
+
+
+class SegmentStore:
+    """
+    Append-only on-disk corpus made of ChunkSegments, versioned by manifests.
+
+    Layout under `path`:
+        CURRENT                 name of the committed manifest (replaced atomically)
+        manifests/              manifest-NNNNNN.json, one per generation
+        vocab.txt               BM25 vocabulary, one term per line in term-ID order
+        segments/               one directory per ChunkSegment, shared by generations
+        tombstones/             tombstones-NNNNNN.npy, deleted doc IDs as of that generation
+        LOCK                    flock'ed by writers, so concurrent processes commit one at a time
+
+    A commit writes only the new segment and vocabulary terms, then a new
+    manifest, and finally swaps CURRENT. Segments are never modified, so
+    processes still reading an older generation are unaffected. Deletes only
+    write a new tombstone file and manifest. Compaction rewrites the live
+    documents into one new segment; superseded segments are removed once no
+    kept manifest refers to them.
+    """
+
+    FORMAT_VERSION = 1
+    KEEP_MANIFESTS = 5
+
+    def __init__(self, path: str):
+        self.path = path
+        self.segments_dir = os.path.join(path, "segments")
+        self.manifests_dir = os.path.join(path, "manifests")
+        self.tombstones_dir = os.path.join(path, "tombstones")
+        self.current_path = os.path.join(path, "CURRENT")
+        self.lock_path = os.path.join(path, "LOCK")
+        self._lock = threading.RLock()
+        self._lock_depth = 0
+        self._lock_file = None
+
+    @contextmanager
+    def lock(self):
+        """
+        Exclusive writer lock on the index, across threads and processes (flock on LOCK).
+        Re-entrant within a thread. Readers never take it.
+        """
+        with self._lock:
+            if self._lock_depth == 0:
+                os.makedirs(self.path, exist_ok=True)
+                self._lock_file = open(self.lock_path, "a")
+                if fcntl is not None:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0:
+                    # Closing the file releases the flock
+                    self._lock_file.close()
+                    self._lock_file = None
+
+    def exists(self) -> bool:
+        return os.path.exists(self.current_path) or os.path.exists(os.path.join(self.path, "manifest.json"))
+
+    def current_version(self) -> int:
+        """Version the CURRENT pointer refers to (0 when nothing is committed). Cheap enough to poll."""
+        try:
+            with open(self.current_path) as f:
+                name = f.read().strip()
+        except FileNotFoundError:
+            return 0
+        return int(name.split("-")[1].split(".")[0])
+
+    def _adopt_unversioned_manifest(self):
+        """Publish an index written before generations existed (single manifest.json) as version 1."""
+        legacy_path = os.path.join(self.path, "manifest.json")
+        if not os.path.exists(self.current_path) and os.path.exists(legacy_path):
+            with open(legacy_path) as f:
+                manifest = json.load(f)
+            os.makedirs(self.manifests_dir, exist_ok=True)
+            self._publish(1, manifest)
+            os.remove(legacy_path)
+
+    def open_generation(self, base: Optional[IndexGeneration] = None) -> IndexGeneration:
+        """Open the current generation, reusing already-opened segments from `base`."""
+        self._adopt_unversioned_manifest()
+        version = self.current_version()
+        if version == 0:
+            return EMPTY_GENERATION
+        if base is not None and base.version == version:
+            return base
+
+        with open(os.path.join(self.manifests_dir, f"manifest-{version:06d}.json")) as f:
+            manifest = json.load(f)
+
+        opened = {segment.name: segment for segment in base.segments} if base is not None else {}
+        segments = [
+            opened.get(entry["name"])
+            or ChunkSegment(entry["name"], os.path.join(self.segments_dir, entry["name"]), entry["doc_start"])
+            for entry in manifest["segments"]
+        ]
+
+        vocab_terms = []
+        vocab_path = os.path.join(self.path, "vocab.txt")
+        if os.path.exists(vocab_path):
+            with open(vocab_path, "rb") as f:
+                data = f.read(manifest.get("vocab_bytes", 0))
+            vocab_terms = data.decode("utf-8").split("\n")[:-1]
+
+        deleted = None
+        if manifest.get("tombstones"):
+            if base is not None and base.manifest.get("tombstones") == manifest["tombstones"]:
+                deleted = base.deleted
+            else:
+                deleted = np.load(os.path.join(self.tombstones_dir, manifest["tombstones"]))
+
+        return IndexGeneration(version, manifest, segments, vocab_terms, deleted)
+
+    def commit(self, base: IndexGeneration, texts: List[str], metadatas: List[dict], chunk_ids: List[str],
+               vectors: np.ndarray, postings: Optional[PostingsSegment] = None,
+               new_vocab_terms: Optional[List[str]] = None, full_vectors: Optional[np.ndarray] = None,
+               minhash: Optional[np.ndarray] = None, **manifest_fields) -> IndexGeneration:
+        """Write a new segment on top of `base` and publish the result as the next generation."""
+        with self.lock():
+            if self.current_version() != base.version:
+                raise RuntimeError(
+                    f"Index at {self.path} moved to version {self.current_version()} while writing on top of "
+                    f"version {base.version}; reload and retry."
+                )
+            os.makedirs(self.segments_dir, exist_ok=True)
+            os.makedirs(self.manifests_dir, exist_ok=True)
+
+            manifest = dict(base.manifest) or {"format_version": self.FORMAT_VERSION, "segments": [], "next_segment_no": 0}
+            manifest.update(manifest_fields)
+
+            name = f"seg_{manifest['next_segment_no']:05d}"
+            seg_path = os.path.join(self.segments_dir, name)
+            ChunkSegment.write(seg_path, texts, metadatas, chunk_ids, vectors, postings, full_vectors, minhash)
+
+            vocab_terms = base.vocab_terms
+            if new_vocab_terms:
+                manifest["vocab_bytes"] = self._append_vocab(base.manifest.get("vocab_bytes", 0), new_vocab_terms)
+                vocab_terms = base.vocab_terms + list(new_vocab_terms)
+
+            doc_start = base.n_docs
+            manifest["segments"] = manifest["segments"] + [{"name": name, "doc_start": doc_start, "n_docs": len(texts)}]
+            manifest["next_segment_no"] = manifest["next_segment_no"] + 1
+
+            version = base.version + 1
+            self._publish(version, manifest)
+            self._prune_unreferenced()
+            segments = base.segments + [ChunkSegment(name, seg_path, doc_start)]
+            return IndexGeneration(version, manifest, segments, vocab_terms, base.deleted)
+
+    def delete(self, base: IndexGeneration, doc_ids: np.ndarray, **manifest_fields) -> IndexGeneration:
+        """Publish the next generation with `doc_ids` added to the tombstones of `base`."""
+        with self.lock():
+            if self.current_version() != base.version:
+                raise RuntimeError(
+                    f"Index at {self.path} moved to version {self.current_version()} while deleting on top of "
+                    f"version {base.version}; reload and retry."
+                )
+            os.makedirs(self.tombstones_dir, exist_ok=True)
+            version = base.version + 1
+            deleted = np.union1d(base.deleted, np.asarray(doc_ids, dtype=np.int64))
+
+            name = f"tombstones-{version:06d}.npy"
+            tmp_path = os.path.join(self.tombstones_dir, name + ".tmp")
+            with open(tmp_path, "wb") as f:
+                np.save(f, deleted)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, os.path.join(self.tombstones_dir, name))
+            _fsync_dir(self.tombstones_dir)
+
+            manifest = dict(base.manifest)
+            manifest.update(manifest_fields)
+            manifest["tombstones"] = name
+            self._publish(version, manifest)
+            self._prune_unreferenced()
+            return IndexGeneration(version, manifest, base.segments, base.vocab_terms, deleted)
+
+    def compact(self, base: IndexGeneration, **manifest_fields) -> IndexGeneration:
+        """
+        Publish the live documents of `base` rewritten as a single segment, without tombstones.
+        Doc IDs are renumbered; chunk IDs, vectors, signatures, postings and the BM25 vocabulary
+        are carried over as stored. Old segments are removed once no kept manifest refers to them.
+        """
+        return self._rewrite(base, 0, base.live, **manifest_fields)
+
+    def merge(self, base: IndexGeneration, start: int, **manifest_fields) -> IndexGeneration:
+        """
+        Publish `base` with its segments from `start` on rewritten as one segment. Deleted documents
+        are carried over with their tombstones, so every doc ID keeps pointing at the same chunk.
+        """
+        return self._rewrite(base, start, None, **manifest_fields)
+
+    def _rewrite(self, base: IndexGeneration, start: int, live: Optional[np.ndarray],
+                 **manifest_fields) -> IndexGeneration:
+        """Rewrite segments[start:] of `base` as one segment, keeping only the documents set in `live` (None keeps all)."""
+        with self.lock():
+            if self.current_version() != base.version:
+                raise RuntimeError(
+                    f"Index at {self.path} moved to version {self.current_version()} while rewriting "
+                    f"version {base.version}; reload and retry."
+                )
+            rewritten = base.segments[start:]
+            doc_start = rewritten[0].doc_start
+            texts, metadatas, chunk_ids, vectors, full_vectors, minhash = [], [], [], [], [], []
+            for segment in rewritten:
+                rows = np.arange(segment.n_docs)
+                if live is not None:
+                    rows = rows[live[segment.doc_start:segment.doc_start + segment.n_docs]]
+                texts.extend(segment.text(i) for i in rows)
+                metadatas.extend(segment.metadata(i) for i in rows)
+                chunk_ids.extend(segment.chunk_id(i) for i in rows)
+                vectors.append(np.asarray(segment.vectors[rows]))
+                # Only a stored vectors_full.npy is carried over (float32 `vectors` stand in for it otherwise)
+                stored_full = segment.full_vectors is not None and segment.full_vectors is not segment.vectors
+                full_vectors.append(np.asarray(segment.full_vectors[rows]) if stored_full else None)
+                minhash.append(np.asarray(segment.minhash[rows]) if segment.minhash is not None else None)
+
+            postings = None
+            if all(segment.postings is not None for segment in rewritten):
+                postings = PostingsSegment.merge([segment.postings for segment in rewritten],
+                                                 None if live is None else live[doc_start:], len(base.vocab_terms))
+            full_vectors = np.concatenate(full_vectors) if all(v is not None for v in full_vectors) else None
+            # Missing (or mixed num_perm) signatures are recomputed by the reader when needed
+            if all(m is not None for m in minhash) and len({m.shape[1] for m in minhash}) == 1:
+                minhash = np.concatenate(minhash)
+            else:
+                minhash = None
+
+            manifest = dict(base.manifest)
+            manifest.update(manifest_fields)
+            name = f"seg_{manifest['next_segment_no']:05d}"
+            seg_path = os.path.join(self.segments_dir, name)
+            ChunkSegment.write(seg_path, texts, metadatas, chunk_ids, np.concatenate(vectors), postings,
+                               full_vectors, minhash)
+
+            version = base.version + 1
+            manifest["segments"] = manifest["segments"][:start] + [{"name": name, "doc_start": doc_start, "n_docs": len(texts)}]
+            manifest["next_segment_no"] = manifest["next_segment_no"] + 1
+            deleted = base.deleted
+            if live is not None:
+                manifest.pop("tombstones", None)
+                deleted = None
+                # Doc IDs before this version mean something else (e.g. in saved vector indexes)
+                manifest["compacted_version"] = version
+            self._publish(version, manifest)
+            self._prune_unreferenced()
+            segments = base.segments[:start] + [ChunkSegment(name, seg_path, doc_start)]
+            return IndexGeneration(version, manifest, segments, base.vocab_terms, deleted)
+
+    def _prune_unreferenced(self):
+        """Remove segments and tombstone files that no kept manifest refers to."""
+        segments, tombstones = set(), set()
+        for name in os.listdir(self.manifests_dir):
+            if name.endswith(".json"):
+                with open(os.path.join(self.manifests_dir, name)) as f:
+                    manifest = json.load(f)
+                segments.update(entry["name"] for entry in manifest["segments"])
+                tombstones.add(manifest.get("tombstones"))
+        if os.path.isdir(self.segments_dir):
+            for name in os.listdir(self.segments_dir):
+                if name.startswith("seg_") and not name.endswith(".tmp") and name not in segments:
+                    shutil.rmtree(os.path.join(self.segments_dir, name))
+        if os.path.isdir(self.tombstones_dir):
+            for name in os.listdir(self.tombstones_dir):
+                if name.endswith(".npy") and name not in tombstones:
+                    os.remove(os.path.join(self.tombstones_dir, name))
+
+    def _append_vocab(self, committed: int, terms: List[str]) -> int:
+        """Append terms after the committed end of vocab.txt (dropping any uncommitted tail) and return the new size."""
+        vocab_path = os.path.join(self.path, "vocab.txt")
+        with open(vocab_path, "r+b" if os.path.exists(vocab_path) else "wb") as f:
+            f.seek(committed)
+            f.truncate()
+            f.write("".join(t + "\n" for t in terms).encode("utf-8"))
+            return f.tell()
+
+    def _publish(self, version: int, manifest: Dict):
+        """
+        Write the manifest for `version`, then atomically point CURRENT at it.
+        Both are fsynced (with their directories) so that after a crash CURRENT
+        never names a manifest that is missing or partly written.
+        """
+        manifest_name = f"manifest-{version:06d}.json"
+        manifest_path = os.path.join(self.manifests_dir, manifest_name)
+        with open(manifest_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        _fsync_dir(self.manifests_dir)
+
+        tmp_path = self.current_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(manifest_name + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.current_path)
+        _fsync_dir(self.path)
+
+        # Keep a few older manifests for readers that are still switching over
+        for old_version in range(version - self.KEEP_MANIFESTS, 0, -1):
+            old_path = os.path.join(self.manifests_dir, f"manifest-{old_version:06d}.json")
+            if not os.path.exists(old_path):
+                break
+            os.remove(old_path)
@@ -0,0 +1,59 @@
+# core/tool_cache.py
+
+import json
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Optional
+from core.cache import TTLCache
+
+# Tool output that reports a failure rather than data: never cached
+ERROR_PREFIXES = (
+    "MCP Tool Execution Failed",
+    "No results returned from tool.",
+    "Failed to fetch page",
+    "Error fetching weather data",
+)
+
+
+def canonical_arguments(arguments: Dict[str, Any]) -> str:
+    """Arguments as JSON with sorted keys and no whitespace, so equal calls share one key."""
+    return json.dumps(arguments, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class ToolResponseCache:
+    """
+    MCP tool responses cached per (server, tool, canonical arguments) for the tool's TTL
+    in seconds. Tools without a TTL are never cached; the entries of all tools share one
+    size-bounded LRU.
+    """
+
+    def __init__(self, ttls: Dict[str, float], max_entries: int = 512):
+        self.ttls = dict(ttls)
+        self._cache = TTLCache(max_entries)
+        self._lock = threading.Lock()
+        self._tool_counts = defaultdict(lambda: {"hits": 0, "misses": 0})
+
+    def _ttl(self, tool_name: str) -> float:
+        return self.ttls.get(tool_name, 0.0) if self._cache.max_entries > 0 else 0.0
+
+    def get(self, server_url: str, tool_name: str, arguments: Dict[str, Any]) -> Optional[str]:
+        if self._ttl(tool_name) <= 0:
+            return None
+        response = self._cache.get((server_url, tool_name, canonical_arguments(arguments)))
+        with self._lock:
+            self._tool_counts[tool_name]["hits" if response is not None else "misses"] += 1
+        return response
+
+    def put(self, server_url: str, tool_name: str, arguments: Dict[str, Any], response: str):
+        ttl = self._ttl(tool_name)
+        if ttl <= 0 or not response or response.startswith(ERROR_PREFIXES):
+            return
+        self._cache.put((server_url, tool_name, canonical_arguments(arguments)), response, ttl)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            tools = {name: dict(counts) for name, counts in self._tool_counts.items()}
+        return {**self._cache.stats(), "tools": tools}
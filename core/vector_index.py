@@ -0,0 +1,159 @@
+# core/vector_index.py
+
+import math
+from typing import List, Optional
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+# In-memory vector codecs (ivf_pq always stores PQ codes)
+STORAGE_TYPES = ("float32", "float16", "int8")
+_CODECS = {"float32": "Flat", "float16": "SQfp16", "int8": "SQ8"}
+
+# PQ codebooks have 256 centroids per sub-quantizer; fewer vectors than that cannot train them
+MIN_TRAINING_VECTORS = 256
+MAX_TRAINING_VECTORS = 100_000
+
+
+def ivf_nlist_for(n_vectors: int, max_nlist: int) -> int:
+    """Number of IVF lists for a corpus: ~4*sqrt(n), capped by configuration."""
+    return max(1, min(max_nlist, int(4 * math.sqrt(n_vectors))))
+
+
+def index_key(index_type: str, storage: str) -> str:
+    """Name identifying an index layout, e.g. "hnsw" or "hnsw-int8"; used to match saved indexes."""
+    if index_type == "ivf_pq" or storage == "float32":
+        return index_type
+    return f"{index_type}-{storage}"
+
+
+def truncate_embeddings(vectors, dim: Optional[int]) -> np.ndarray:
+    """
+    Matryoshka truncation: keep the first `dim` components and re-normalize.
+    text-embedding-3 models are trained so that these prefixes remain good embeddings.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dim is None or dim >= vectors.shape[1]:
+        return vectors
+    truncated = np.ascontiguousarray(vectors[:, :dim])
+    norms = np.linalg.norm(truncated, axis=1, keepdims=True)
+    return truncated / np.maximum(norms, 1e-12)
+
+
+class VectorIndex:
+    """
+    A FAISS index of one of the supported types, with row i = doc ID i.
+
+    flat      exact search, cost linear in corpus size
+    ivf_flat  inverted lists over k-means cells; `nprobe` cells are scanned per query
+    hnsw      graph search; `ef_search` controls the candidate list size
+    ivf_pq    IVF with product-quantized vectors (smallest memory, approximate distances)
+
+    Except for ivf_pq, vectors are held as float32, float16 or int8 (scalar
+    quantized, 4x smaller than float32) according to `storage`.
+
+    Trained types need a representative sample, so they are trained on the
+    corpus present at build time and later documents are only added.
+    """
+
+    def __init__(self, index_type: str, index, storage: str = "float32", nprobe: int = 16, ef_search: int = 64):
+        self.index_type = index_type
+        self.storage = "float32" if index_type == "ivf_pq" else storage
+        self.index = index
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal
+
+    @property
+    def key(self) -> str:
+        return index_key(self.index_type, self.storage)
+
+    @property
+    def exact(self) -> bool:
+        """True when search distances are exact for the stored vectors."""
+        return self.index_type == "flat" and self.storage == "float32"
+
+    @property
+    def nlist(self) -> Optional[int]:
+        if self.index_type in ("ivf_flat", "ivf_pq"):
+            return faiss.extract_index_ivf(self.index).nlist
+        return None
+
+    @classmethod
+    def build(cls, index_type: str, vectors: np.ndarray, storage: str = "float32", nlist: int = 1024,
+              hnsw_m: int = 32, ef_construction: int = 200, pq_m: int = 16, nprobe: int = 16,
+              ef_search: int = 64) -> "VectorIndex":
+        """Create an index of `index_type` over `vectors`, training it on them if the type needs it."""
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown vector index type '{index_type}', expected one of {INDEX_TYPES}")
+        if storage not in STORAGE_TYPES:
+            raise ValueError(f"Unknown vector storage '{storage}', expected one of {STORAGE_TYPES}")
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        n, dim = vectors.shape
+
+        if index_type in ("ivf_flat", "ivf_pq") and n < MIN_TRAINING_VECTORS:
+            # Too few vectors to train on; exact search is cheap at this size anyway
+            print(f"--- VectorIndex: {n} vectors is too few to train {index_type}, using flat ---")
+            index_type = "flat"
+
+        codec = _CODECS[storage]
+        if index_type == "flat":
+            index = faiss.IndexFlatL2(dim) if storage == "float32" else faiss.index_factory(dim, codec)
+        elif index_type == "hnsw":
+            index = faiss.index_factory(dim, f"HNSW{hnsw_m},{codec}")
+            index.hnsw.efConstruction = ef_construction
+        else:
+            if index_type == "ivf_pq":
+                if dim % pq_m != 0:
+                    raise ValueError(f"pq_m={pq_m} must divide the embedding dimension {dim}")
+                # "np": skip polysemous training, which is slow and unused by our searches
+                codec = f"PQ{pq_m}np"
+            index = faiss.index_factory(dim, f"IVF{ivf_nlist_for(n, nlist)},{codec}")
+
+        if not index.is_trained:
+            sample = vectors
+            if n > MAX_TRAINING_VECTORS:
+                rows = np.random.default_rng(0).choice(n, MAX_TRAINING_VECTORS, replace=False)
+                sample = vectors[np.sort(rows)]
+            print(f"--- VectorIndex: Training {index_key(index_type, storage)} on {len(sample)} vectors ---")
+            index.train(sample)
+
+        vector_index = cls(index_type, index, storage=storage, nprobe=nprobe, ef_search=ef_search)
+        vector_index.add(vectors)
+        return vector_index
+
+    def add(self, vectors: np.ndarray):
+        self.index.add(np.ascontiguousarray(vectors, dtype=np.float32))
+
+    def clone(self) -> "VectorIndex":
+        """Independent copy to extend without touching the original (which may be serving searches)."""
+        return VectorIndex(self.index_type, faiss.clone_index(self.index), self.storage, self.nprobe, self.ef_search)
+
+    def search(self, matrix: np.ndarray, k: int, nprobe: Optional[int] = None,
+               ef_search: Optional[int] = None, allowed: Optional[np.ndarray] = None) -> List[List[int]]:
+        """
+        Top-k doc IDs per query row. `nprobe` / `ef_search` override the defaults for this call only.
+        `allowed` is an optional boolean mask over doc IDs; other documents are skipped during the search.
+        """
+        if self.index_type in ("ivf_flat", "ivf_pq"):
+            params = faiss.SearchParametersIVF(nprobe=nprobe or self.nprobe)
+        elif self.index_type == "hnsw":
+            params = faiss.SearchParametersHNSW(efSearch=ef_search or self.ef_search)
+        else:
+            params = faiss.SearchParameters()
+        if allowed is not None:
+            # `bits` must stay alive for the duration of the search
+            bits = np.packbits(allowed, bitorder="little")
+            params.sel = faiss.IDSelectorBitmap(len(bits), faiss.swig_ptr(bits))
+        _, indices = self.index.search(np.ascontiguousarray(matrix, dtype=np.float32), k, params=params)
+        return [[int(i) for i in row if i != -1] for row in indices]
+
+    def save(self, path: str):
+        faiss.write_index(self.index, path)
+
+    @classmethod
+    def load(cls, index_type: str, storage: str, path: str, nprobe: int = 16, ef_search: int = 64) -> "VectorIndex":
+        return cls(index_type, faiss.read_index(path), storage=storage, nprobe=nprobe, ef_search=ef_search)
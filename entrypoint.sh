@@ -1,26 +1,60 @@
 #!/bin/bash
 
 # Start the MCP Server in the background
-echo "Starting DuckDuckGo MCP Server on port 8000..."
-# Using python directly as dependencies will be installed in the environment
-python tools/mcp_server_ddg.py > mcp_server.log 2>&1 &
-MCP_PID=$!
-
-# Wait for a few seconds to ensure MCP server starts
-sleep 3
-
-# Check if MCP server is running
-if ! kill -0 $MCP_PID > /dev/null 2>&1; then
-    echo "MCP Server failed to start. Check mcp_server.log for details."
-    cat mcp_server.log
-    exit 1
+# (MCP_TRANSPORT=inprocess: the agents call the tool functions directly, no server needed)
+if [ "$MCP_TRANSPORT" != "inprocess" ]; then
+    echo "Starting DuckDuckGo MCP Server on port 8000..."
+    # Using python directly as dependencies will be installed in the environment
+    python tools/mcp_server_ddg.py > mcp_server.log 2>&1 &
+    MCP_PID=$!
+
+    # Wait for a few seconds to ensure MCP server starts
+    sleep 3
+
+    # Check if MCP server is running
+    if ! kill -0 $MCP_PID > /dev/null 2>&1; then
+        echo "MCP Server failed to start. Check mcp_server.log for details."
+        cat mcp_server.log
+        exit 1
+    fi
+
+    echo "MCP Server started with PID $MCP_PID"
 fi
 
-echo "MCP Server started with PID $MCP_PID"
+# Optionally serve the knowledge index from one shared process
+# (set RETRIEVAL_SERVER_URL=http://localhost:8002 so app workers query it instead of loading the index)
+if [[ "$RETRIEVAL_SERVER_URL" == http://localhost:* ]]; then
+    echo "Starting Retrieval Server on port 8002..."
+    python retrieval_server.py > retrieval_server.log 2>&1 &
+    RETRIEVAL_PID=$!
+    sleep 3
+    if ! kill -0 $RETRIEVAL_PID > /dev/null 2>&1; then
+        echo "Retrieval Server failed to start. Check retrieval_server.log for details."
+        cat retrieval_server.log
+        exit 1
+    fi
+    echo "Retrieval Server started with PID $RETRIEVAL_PID"
+fi
+
+# Optionally index files dropped into inject_new_sources/ continuously (INGEST_DAEMON=1)
+if [ "$INGEST_DAEMON" = "1" ]; then
+    echo "Starting Ingest Daemon on port 8003..."
+    python ingest_daemon.py > ingest_daemon.log 2>&1 &
+    INGEST_PID=$!
+    echo "Ingest Daemon started with PID $INGEST_PID"
+fi
 
 # Start Streamlit App
 echo "Starting Streamlit App..."
 streamlit run app.py --server.port 8501 --server.address 0.0.0.0
 
-# When Streamlit exits, kill the MCP server
-kill $MCP_PID
+# When Streamlit exits, kill the MCP server (and the optional background services)
+if [ ! -z "$MCP_PID" ]; then
+    kill $MCP_PID
+fi
+if [ ! -z "$RETRIEVAL_PID" ]; then
+    kill $RETRIEVAL_PID
+fi
+if [ ! -z "$INGEST_PID" ]; then
+    kill $INGEST_PID
+fi
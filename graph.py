@@ -3,6 +3,7 @@
 from typing import TypedDict, Annotated, Optional
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import BaseMessage, AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END
 
 from agents.supervisor import Supervisor
@@ -33,6 +34,7 @@ class AgentState(TypedDict):
     user_id: str
     next_agent: str
     detected_activity: Optional[str]
+    knowledge_categories: Optional[list[str]]
     image_data: Optional[bytes]
 
 # --- AGENT NODE DEFINITIONS ---
@@ -49,9 +51,11 @@ workflow = StateGraph(AgentState)
 # Add all nodes to the graph
 workflow.add_node("supervisor", supervisor_node.invoke)
 workflow.add_node("farmer_profile", profile_agent_node.invoke)
-workflow.add_node("weather", weather_agent_node.invoke)
-workflow.add_node("knowledge_support", knowledge_agent_node.invoke)
-workflow.add_node("market_intelligence", market_agent_node.invoke)
+# Async-capable nodes: ainvoke (used by sms_server) awaits retrieval and MCP tool calls
+# without blocking the event loop, so concurrent requests overlap their I/O
+workflow.add_node("weather", RunnableLambda(weather_agent_node.invoke, afunc=weather_agent_node.ainvoke))
+workflow.add_node("knowledge_support", RunnableLambda(knowledge_agent_node.invoke, afunc=knowledge_agent_node.ainvoke))
+workflow.add_node("market_intelligence", RunnableLambda(market_agent_node.invoke, afunc=market_agent_node.ainvoke))
 workflow.add_node("plant_disease", plant_disease_node.invoke)
 
 # --- ROUTING LOGIC ---
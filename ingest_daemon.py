@@ -0,0 +1,213 @@
+import os
+import time
+import threading
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import FastAPI
+import uvicorn
+
+from core.config import settings
+from core.ingest_batcher import DebouncedBatcher
+from core.ingest_manifest import file_sha256
+from core.rag_service import RAGService
+from ingest_knowledge import (
+    INDEX_BATCH_SIZE, _manifest_for, _record_moved, _replaced_chunks, _run_pipeline, _source_files, move_file,
+)
+
+INJECT_DIR = "inject_new_sources"
+KB_DIR = "knowledge_base"
+# With inotify the folder is only rescanned on events (or while files are waiting), plus this safety net
+FULL_RESCAN_SECONDS = 60.0
+
+
+class IngestDaemon:
+    """
+    Watches `inject_dir` and indexes arriving files in debounced micro-batches: every batch
+    is parsed, embedded and published as a new index version (app processes pick it up on
+    their next hot-reload), then the files are moved into `kb_dir` and recorded in the
+    ingest manifest, exactly as a manual `python ingest_knowledge.py` run would.
+    """
+
+    def __init__(self, inject_dir: str = INJECT_DIR, kb_dir: str = KB_DIR, rag: Optional[RAGService] = None,
+                 workers: Optional[int] = None, batch_size: int = INDEX_BATCH_SIZE):
+        self.inject_dir = inject_dir
+        self.kb_dir = kb_dir
+        self.rag = rag or RAGService()
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = settings.ingest_poll_interval
+        self.batcher = DebouncedBatcher(
+            debounce=settings.ingest_debounce,
+            max_wait=settings.ingest_max_wait,
+            max_files=settings.ingest_max_batch_files,
+            settle=settings.ingest_poll_interval,
+        )
+        self.watcher = "polling"
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._started_at = time.time()
+        self._stats = {
+            "batches": 0, "failed_batches": 0, "files_indexed": 0, "files_failed": 0, "chunks_indexed": 0,
+            "indexing_seconds": 0.0, "last_batch_at": None, "last_batch_seconds": None,
+            "lag_last": None, "lag_max": 0.0, "lag_total": 0.0,
+        }
+
+    def scan(self) -> Dict[str, Tuple[int, float]]:
+        """path -> (size, mtime) of every source file currently in the watched folder."""
+        files = {}
+        for path in _source_files(self.inject_dir):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue  # moved or deleted mid-scan
+            files[path] = (stat.st_size, stat.st_mtime)
+        return files
+
+    def run_once(self, now: Optional[float] = None) -> int:
+        """Observe the folder and index the next due batch, if any. Returns the number of files indexed."""
+        now = time.time() if now is None else now
+        self.batcher.observe(self.scan(), now)
+        batch = self.batcher.ready(now)
+        return self._index_batch(batch) if batch else 0
+
+    def _index_batch(self, batch: List[Tuple[str, float]]) -> int:
+        started = time.time()
+        hashes = {}
+        for path, _ in batch:
+            try:
+                hashes[path] = file_sha256(path)
+            except OSError:
+                continue
+        print(f"--- INGEST DAEMON: Indexing batch of {len(hashes)} files ---")
+        replaced = _replaced_chunks(_manifest_for(self.rag), self.inject_dir, self.kb_dir, list(hashes))
+        # resume: a batch interrupted by a crash or failed commit continues from its checkpoint
+        result = _run_pipeline(self.rag, self.inject_dir, hashes, self.workers, self.batch_size,
+                               replacing=replaced, resume=True)
+        if result is None:
+            print("--- INGEST DAEMON: Batch failed, retrying after the next debounce ---")
+            self.batcher.forget(list(hashes))
+            with self._lock:
+                self._stats["failed_batches"] += 1
+            return 0
+        produced, failed = result
+
+        # Files outside the mapped folders stay where they are (and are skipped until they change).
+        # So do files that failed to parse: a half-written upload is retried once it changes again.
+        moved = []
+        for path in produced:
+            target = move_file(self.inject_dir, self.kb_dir, path)
+            if target:
+                moved.append((path, target))
+        _record_moved(self.rag, self.kb_dir, moved, hashes, produced, [c for ids in failed.values() for c in ids])
+        if failed:
+            print(f"--- INGEST DAEMON: {len(failed)} files failed to parse, left in place: {sorted(failed)} ---")
+
+        published = time.time()
+        lags = [published - first_seen for path, first_seen in batch if path in produced]
+        with self._lock:
+            stats = self._stats
+            stats["batches"] += 1
+            stats["files_indexed"] += len(produced)
+            stats["files_failed"] += len(failed)
+            stats["chunks_indexed"] += sum(map(len, produced.values()))
+            stats["indexing_seconds"] += published - started
+            stats["last_batch_at"] = published
+            stats["last_batch_seconds"] = published - started
+            if lags:
+                stats["lag_last"] = lags[-1]
+                stats["lag_max"] = max(stats["lag_max"], *lags)
+                stats["lag_total"] += sum(lags)
+        print(f"--- INGEST DAEMON: Published index version {self.rag.index_version} "
+              f"({len(produced)} files in {published - started:.1f}s, max lag {max(lags, default=0):.1f}s) ---")
+        return len(produced)
+
+    def _start_observer(self):
+        """inotify (via watchdog) wakes the loop as soon as something changes; None if unavailable."""
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            return None
+        handler = FileSystemEventHandler()
+        handler.on_any_event = lambda event: self._wake.set()
+        observer = Observer()
+        observer.schedule(handler, self.inject_dir, recursive=True)
+        observer.daemon = True
+        observer.start()
+        self.watcher = "inotify"
+        return observer
+
+    def run(self):
+        os.makedirs(self.inject_dir, exist_ok=True)
+        observer = self._start_observer()
+        print(f"--- INGEST DAEMON: Watching '{self.inject_dir}' ({self.watcher}) ---")
+        last_scan = 0.0
+        while not self._stop.is_set():
+            woken = self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            now = time.time()
+            if observer and not woken and not self.batcher.pending and now - last_scan < FULL_RESCAN_SECONDS:
+                continue
+            last_scan = now
+            try:
+                self.run_once(now)
+            except Exception as e:
+                print(f"--- INGEST DAEMON: Error: {e} ---")
+        if observer:
+            observer.stop()
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.run, name="ingest-daemon", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        lag_total = stats.pop("lag_total")
+        stats.update(
+            watcher=self.watcher,
+            pending_files=self.batcher.pending,
+            index_version=self.rag.index_version,
+            uptime_seconds=time.time() - self._started_at,
+            chunks_per_second=stats["chunks_indexed"] / stats["indexing_seconds"] if stats["indexing_seconds"] else 0.0,
+            lag_mean=lag_total / stats["files_indexed"] if stats["files_indexed"] else None,
+        )
+        return stats
+
+
+daemon: Optional[IngestDaemon] = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global daemon
+    daemon = IngestDaemon()
+    daemon.start()
+    yield
+    daemon.stop()
+
+
+app = FastAPI(title="Farm-AI Ingest Daemon", lifespan=lifespan)
+
+
+@app.get("/metrics")
+def metrics():
+    """Throughput (files, chunks, chunks/s), lag (file arrival -> published index version) and failed files so far."""
+    return daemon.metrics()
+
+
+@app.get("/health")
+def health():
+    return {"status": "ok", "watcher": daemon.watcher, "index_version": daemon.rag.index_version}
+
+
+if __name__ == "__main__":
+    # Port 8003: 8000 is the MCP server, 8001 the SMS server, 8002 the retrieval server
+    uvicorn.run(app, host="0.0.0.0", port=settings.ingest_daemon_port)
@@ -2,111 +2,335 @@
 import os
 import sys
 import glob
+import queue
 import shutil
-from typing import List
+import itertools
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from core.rag_service import RAGService
+from core.ingest_manifest import IngestManifest, file_sha256
 from pypdf import PdfReader
 
 # Add project root to path
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 
-def load_documents(directory: str) -> List[Document]:
-    documents = []
-    
-    # Process Markdown and Text
-    for file_path in glob.glob(os.path.join(directory, "**/*.*"), recursive=True):
-        # Determine category from subfolder
-        # e.g. knowledge_base/farming_practices/guide.md -> category: farming_practices
-        rel_path = os.path.relpath(file_path, directory)
-        category = os.path.dirname(rel_path)
-        if category == "":
-            category = "general"
-
-        if file_path.endswith(('.md', '.txt')):
+# Chunking, shared by every worker process
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+# Large PDFs are split into tasks of this many pages so one file can use several cores
+PAGES_PER_TASK = 16
+# Chunks committed to the index per segment
+INDEX_BATCH_SIZE = 1000
+# Source folder name in inject_new_sources -> category folder in knowledge_base
+FOLDER_MAPPING = {
+    "gov_": "government_schemes",
+    "farm-new-source": "farming_practices"
+}
+
+_splitter = None
+
+
+def _get_splitter() -> RecursiveCharacterTextSplitter:
+    global _splitter
+    if _splitter is None:
+        _splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    return _splitter
+
+
+def _category(directory: str, file_path: str) -> str:
+    # Determine category from subfolder
+    # e.g. knowledge_base/farming_practices/guide.md -> category: farming_practices
+    # Inject folders map to the category folder they are moved into (gov_/x.md -> government_schemes)
+    category = os.path.dirname(os.path.relpath(file_path, directory))
+    if not category:
+        return "general"
+    top, _, rest = category.partition(os.sep)
+    return os.path.join(FOLDER_MAPPING.get(top, top), rest) if rest else FOLDER_MAPPING.get(top, top)
+
+
+def _parse_task(task: Tuple[str, str, int, int, int]) -> List[Document]:
+    """
+    Worker: parse and chunk one text file, or pages [start, end) of one PDF.
+    Each PDF page is chunked on its own so its chunks keep the page number (1-based).
+    """
+    file_path, category, start, end = task[:4]
+    metadata = {"source": os.path.basename(file_path), "category": category}
+    splitter = _get_splitter()
+
+    if not file_path.endswith(".pdf"):
+        with open(file_path, "r", encoding="utf-8") as f:
+            return splitter.split_documents([Document(page_content=f.read(), metadata=metadata)])
+
+    reader = PdfReader(file_path)
+    chunks = []
+    for page_no in range(start, end):
+        text = reader.pages[page_no].extract_text() or ""
+        if text.strip():
+            page = Document(page_content=text, metadata={**metadata, "page": page_no + 1})
+            chunks.extend(splitter.split_documents([page]))
+    return chunks
+
+
+def _source_files(directory: str) -> List[str]:
+    return [
+        file_path for file_path in sorted(glob.glob(os.path.join(directory, "**/*.*"), recursive=True))
+        if file_path.endswith((".md", ".txt", ".pdf"))
+    ]
+
+
+def _parse_tasks(directory: str, files: List[str]) -> Iterator[Tuple[str, str, int, int, int]]:
+    """(file path, category, first page, end page, tasks for this file) for every parse task."""
+    for file_path in files:
+        category = _category(directory, file_path)
+        if file_path.endswith((".md", ".txt")):
             print(f"Loading {file_path} (Category: {category})...")
+            yield file_path, category, 0, 0, 1
+        elif file_path.endswith(".pdf"):
             try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    content = f.read()
-                    # Add simple metadata
-                    doc = Document(page_content=content, metadata={
-                        "source": os.path.basename(file_path),
-                        "category": category
-                    })
-                    documents.append(doc)
+                n_pages = len(PdfReader(file_path).pages)
             except Exception as e:
-                print(f"Error loading {file_path}: {e}")
-                
-        elif file_path.endswith('.pdf'):
-            print(f"Loading PDF {file_path} (Category: {category})...")
+                print(f"Error loading PDF {file_path}: {e}")
+                continue
+            print(f"Loading PDF {file_path} ({n_pages} pages, Category: {category})...")
+            # At least one (empty) task, so a PDF without pages still completes
+            n_tasks = max(1, -(-n_pages // PAGES_PER_TASK))
+            for start in range(0, max(n_pages, 1), PAGES_PER_TASK):
+                yield file_path, category, start, min(start + PAGES_PER_TASK, n_pages), n_tasks
+
+
+def iter_chunks(directory: str, workers: Optional[int] = None,
+                files: Optional[List[str]] = None) -> Iterator[Tuple[str, List[Document], bool]]:
+    """
+    Parse and chunk every file under `directory` (or just `files`) in a process pool, yielding
+    (file path, chunks, file complete) for each task as soon as it finishes. "File complete" is
+    set on the last task of a file that parsed without errors. At most 2 tasks per worker are
+    in flight, so memory stays flat however many files there are.
+    """
+    workers = workers or os.cpu_count() or 1
+    tasks = _parse_tasks(directory, _source_files(directory) if files is None else files)
+    remaining, failed = {}, set()
+    # "spawn": forking a process that already runs the index watcher / search threads is unsafe
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pending = {}
+        while True:
+            for task in itertools.islice(tasks, 2 * workers - len(pending)):
+                remaining.setdefault(task[0], task[4])
+                pending[pool.submit(_parse_task, task)] = task
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                file_path = pending.pop(future)[0]
+                remaining[file_path] -= 1
+                try:
+                    chunks = future.result()
+                except Exception as e:
+                    print(f"Error loading {file_path}: {e}")
+                    chunks = []
+                    failed.add(file_path)
+                yield file_path, chunks, remaining[file_path] == 0 and file_path not in failed
+
+
+def load_documents(directory: str, workers: Optional[int] = None) -> List[Document]:
+    """All chunks under `directory` at once (small directories and tests)."""
+    return [chunk for _, chunks, _ in iter_chunks(directory, workers) for chunk in chunks]
+
+
+def _index_worker(rag: RAGService, chunk_queue: "queue.Queue", stats: dict, batch_size: int,
+                  replacing: Optional[List[str]], on_file_indexed: Callable[[str], None],
+                  survivors: Dict[str, str]):
+    """
+    Indexer thread: commits chunks from the queue in batches of `batch_size`, and reports each
+    completed file once all of its chunks are in a committed index generation. Near duplicates
+    dropped by the index are recorded in `survivors` (chunk ID -> the indexed chunk ID).
+    """
+    batch, completed = [], []
+    while True:
+        item = chunk_queue.get()
+        if item is not None:
+            file_path, chunks, file_complete = item
+            batch.extend(chunks)
+            if file_complete:
+                completed.append(file_path)
+        if batch and (item is None or len(batch) >= batch_size) and "error" not in stats:
             try:
-                reader = PdfReader(file_path)
-                text = ""
-                for page in reader.pages:
-                    text += page.extract_text() + "\n"
-                
-                doc = Document(page_content=text, metadata={
-                    "source": os.path.basename(file_path),
-                    "category": category
-                })
-                documents.append(doc)
+                survivors.update(rag.add_documents(batch, replacing=replacing))
+                batch = []
             except Exception as e:
-                print(f"Error loading PDF {file_path}: {e}")
+                # Keep draining so the producer never blocks on a full queue
+                print(f"--- INGESTION: Indexing failed: {e} ---")
+                stats["error"] = e
+        if not batch and "error" not in stats:
+            for done_path in completed:
+                on_file_indexed(done_path)
+            completed = []
+        if item is None:
+            return
 
-    return documents
 
-def move_processed_files(source_base: str, target_base: str):
+def _checkpoint_path(rag: RAGService, directory: str) -> str:
+    return os.path.join(rag.persistence_dir, f"checkpoint-{os.path.basename(os.path.abspath(directory))}.json")
+
+
+def _run_pipeline(rag: RAGService, directory: str, hashes: Dict[str, str], workers: Optional[int], batch_size: int,
+                  replacing: Optional[List[str]] = None,
+                  resume: bool = False) -> Optional[Tuple[Dict[str, List[str]], Dict[str, List[str]]]]:
+    """
+    Parse the files in `hashes` (path -> sha256) and index their chunks. Returns (indexed, failed),
+    or None if indexing failed. `indexed` holds the chunk IDs of each file whose parse tasks all
+    succeeded; a chunk dropped as a near duplicate is listed under the ID of the indexed chunk that
+    stands in for it, so the file keeps that chunk referenced (and deleting another file never
+    removes the only searchable copy). `failed` holds the files that could not be (fully) parsed,
+    with the chunk IDs they produced anyway: callers leave those files as they were and delete
+    these chunks unless something else references them.
+
+    Index generations are committed every `batch_size` chunks, and each file whose chunks are
+    all committed is recorded in a checkpoint next to the index. With `resume`, files recorded
+    by an unfinished earlier run (and unchanged since) are not parsed again.
+    """
+    checkpoint = IngestManifest(_checkpoint_path(rag, directory))
+    if checkpoint.files and not resume:
+        print(f"--- INGESTION: Discarding checkpoint of an unfinished run ({len(checkpoint.files)} files); "
+              f"use --resume to continue it ---")
+        checkpoint.files = {}
+
+    produced, files = {}, []
+    for file_path, sha256 in hashes.items():
+        entry = checkpoint.files.get(os.path.relpath(file_path, directory))
+        if entry and entry["sha256"] == sha256:
+            produced[file_path] = entry["chunk_ids"]
+        else:
+            produced[file_path] = []
+            files.append(file_path)
+    if resume and len(files) < len(hashes):
+        print(f"--- INGESTION: Resuming, {len(hashes) - len(files)} files already indexed ---")
+
+    survivors = {}
+    # Files whose chunks are all committed: checkpointed earlier, or reported by the indexer
+    indexed = set(hashes) - set(files)
+
+    def indexed_ids(file_path: str) -> List[str]:
+        return list(dict.fromkeys(survivors.get(chunk_id, chunk_id) for chunk_id in produced[file_path]))
+
+    def on_file_indexed(file_path: str):
+        indexed.add(file_path)
+        checkpoint.set(os.path.relpath(file_path, directory), hashes[file_path], indexed_ids(file_path))
+        checkpoint.save()
+
+    # Parsing (process pool) -> bounded queue -> indexer thread; a slow indexer holds back parsing
+    chunk_queue = queue.Queue(maxsize=8)
+    stats = {}
+    indexer = threading.Thread(
+        target=_index_worker, args=(rag, chunk_queue, stats, batch_size, replacing, on_file_indexed, survivors),
+        name="ingest-indexer",
+    )
+    indexer.start()
+    try:
+        for file_path, chunks, file_complete in iter_chunks(directory, workers, files):
+            if "error" in stats:
+                break
+            for chunk in chunks:
+                chunk.metadata["chunk_id"] = rag._generate_chunk_id(chunk.page_content)
+                produced[file_path].append(chunk.metadata["chunk_id"])
+            chunk_queue.put((file_path, chunks, file_complete))
+    finally:
+        chunk_queue.put(None)
+        indexer.join()
+
+    if "error" in stats:
+        print("--- INGESTION: Progress is checkpointed; rerun with --resume to continue ---")
+        return None
+    if os.path.exists(checkpoint.path):
+        os.remove(checkpoint.path)
+    failed = {file_path: produced[file_path] for file_path in produced if file_path not in indexed}
+    for file_path in failed:
+        print(f"--- INGESTION: Could not parse {file_path}; left for the next run ---")
+    return {file_path: indexed_ids(file_path) for file_path in produced if file_path in indexed}, failed
+
+def move_processed_files(source_base: str, target_base: str, files: Optional[List[str]] = None) -> List[Tuple[str, str]]:
     """
     Moves files from source subdirectories to target subdirectories based on mapping.
     Mappings:
       gov_ -> government_schemes
       farm-new-source -> farming_practices
+    With `files`, only those are moved (the ones that were indexed); anything else stays
+    for the next run. Returns the (source, destination) path of every moved file.
     """
     print(f"--- POST-PROCESSING: Moving files from {source_base} to {target_base}... ---")
-    
-    # Mapping: Source Folder Name -> Target Folder Name
-    folder_mapping = {
-        "gov_": "government_schemes",
-        "farm-new-source": "farming_practices"
-    }
 
+    moved = []
     if not os.path.exists(source_base):
         print(f"Source directory {source_base} does not exist. Nothing to move.")
-        return
+        return moved
 
-    # Iterate over items in the source base directory
-    for item in os.listdir(source_base):
-        source_subdir = os.path.join(source_base, item)
-        
-        # We only care about directories that match our mapping
-        if os.path.isdir(source_subdir) and item in folder_mapping:
-            target_subdir_name = folder_mapping[item]
-            target_subdir = os.path.join(target_base, target_subdir_name)
-            
-            # Create target subdir if it doesn't exist
-            os.makedirs(target_subdir, exist_ok=True)
-            
-            # Move all files from source_subdir to target_subdir
-            files_moved = 0
-            for filename in os.listdir(source_subdir):
-                file_path = os.path.join(source_subdir, filename)
-                if os.path.isfile(file_path):
-                    shutil.move(file_path, os.path.join(target_subdir, filename))
-                    print(f"Moved: {item}/{filename} -> {target_subdir_name}/{filename}")
-                    files_moved += 1
-            
-            # Remove the source subdirectory if it's empty
-            if not os.listdir(source_subdir):
-                os.rmdir(source_subdir)
-                print(f"Removed empty directory: {source_subdir}")
-    
-    # Clean up the main source base if empty
-    if not os.listdir(source_base):
-        os.rmdir(source_base)
-        print(f"Removed empty source base: {source_base}")
+    if files is None:
+        files = [path for path in glob.glob(os.path.join(source_base, "**", "*"), recursive=True) if os.path.isfile(path)]
+    for file_path in sorted(files):
+        target = move_file(source_base, target_base, file_path)
+        if target:
+            moved.append((file_path, target))
+
+    # Remove source directories left empty (the source base last)
+    for dir_path, _, _ in os.walk(source_base, topdown=False):
+        if not os.listdir(dir_path):
+            os.rmdir(dir_path)
+            print(f"Removed empty directory: {dir_path}")
+    return moved
+
+def _target_path(source_base: str, target_base: str, file_path: str) -> Optional[str]:
+    """Where `file_path` in a mapped source subdirectory is moved to (None if unmapped)."""
+    item = os.path.relpath(file_path, source_base).split(os.sep)[0]
+    if item not in FOLDER_MAPPING:
+        return None
+    return os.path.join(target_base, FOLDER_MAPPING[item], os.path.relpath(file_path, os.path.join(source_base, item)))
+
+def move_file(source_base: str, target_base: str, file_path: str) -> Optional[str]:
+    """Move one file from a mapped source subdirectory to its target; returns the new path (None if unmapped)."""
+    target = _target_path(source_base, target_base, file_path)
+    if target is None or not os.path.isfile(file_path):
+        return None
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    shutil.move(file_path, target)
+    print(f"Moved: {os.path.relpath(file_path, source_base)} -> {os.path.relpath(target, target_base)}")
+    return target
 
-def ingest():
+def _manifest_for(rag: RAGService) -> IngestManifest:
+    return IngestManifest(os.path.join(rag.persistence_dir, "ingest_manifest.json"))
+
+
+def _replaced_chunks(manifest: IngestManifest, source_base: str, target_base: str, files: List[str]) -> List[str]:
+    """Chunk IDs recorded for the knowledge_base files that these injected files will overwrite."""
+    targets = [_target_path(source_base, target_base, file_path) for file_path in files]
+    return [chunk_id for target in targets if target
+            for chunk_id in manifest.chunk_ids(os.path.relpath(target, target_base))]
+
+
+def _record_moved(rag: RAGService, target_base: str, moved: List[Tuple[str, str]],
+                  hashes: Dict[str, str], produced: Dict[str, List[str]], orphaned: List[str] = ()):
+    """
+    Record moved files under their knowledge_base path, so a later --sync sees them as unchanged,
+    and delete the chunks of the versions they overwrote that no other file still produces, along
+    with `orphaned` chunks (committed for files that then failed to parse) that nothing references.
+    The manifest is re-read under the index lock, so concurrent ingest runs don't lose entries.
+    """
+    with rag.store.lock():
+        manifest = _manifest_for(rag)
+        replaced = {chunk_id for _, target in moved
+                    for chunk_id in manifest.chunk_ids(os.path.relpath(target, target_base))}
+        replaced.update(orphaned)
+        for source, target in moved:
+            manifest.set(os.path.relpath(target, target_base), hashes[source], produced[source])
+        stale = replaced - manifest.referenced()
+        if stale:
+            rag.delete_documents(sorted(stale))
+        manifest.save()
+
+
+def ingest(workers: Optional[int] = None, batch_size: int = INDEX_BATCH_SIZE, resume: bool = False):
     inject_dir = "inject_new_sources"
     kb_dir = "knowledge_base"
     
@@ -114,29 +338,98 @@ def ingest():
         print(f"Directory {inject_dir} not found. Nothing to ingest.")
         return
 
-    print(f"--- INGESTION: data from '{inject_dir}'... ---")
-    
-    # Load documents ONLY from the injection directory
-    raw_docs = load_documents(inject_dir)
-    
-    if not raw_docs:
+    print(f"--- INGESTION: data from '{inject_dir}' ({workers or os.cpu_count()} workers)... ---")
+    files = _source_files(inject_dir)
+    if not files:
         print(f"No documents found in {inject_dir}")
         return
 
-    print(f"--- INGESTION: Found {len(raw_docs)} files. Splitting... ---")
-    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    chunked_docs = splitter.split_documents(raw_docs)
-    
-    print(f"--- INGESTION: Created {len(chunked_docs)} chunks. Indexing... ---")
     rag = RAGService()
-    rag.add_documents(chunked_docs)
-    print("--- INGESTION: Indexing Complete! ---")
+    hashes = {file_path: file_sha256(file_path) for file_path in files}
+    # A revised file with the name of an earlier one replaces that file's chunks
+    replaced = _replaced_chunks(_manifest_for(rag), inject_dir, kb_dir, files)
+    result = _run_pipeline(rag, inject_dir, hashes, workers, batch_size, replacing=replaced, resume=resume)
+    if result is None:
+        print("--- INGESTION: Failed, source files left in place ---")
+        return
+    produced, failed = result
+
+    print(f"--- INGESTION: Indexing Complete! ({sum(map(len, produced.values()))} chunks) ---")
     
-    # Move files after successful ingestion
-    move_processed_files(inject_dir, kb_dir)
+    # Move files after successful ingestion; files that failed to parse stay in place
+    moved = move_processed_files(inject_dir, kb_dir, list(produced))
+    _record_moved(rag, kb_dir, moved, hashes, produced, [c for ids in failed.values() for c in ids])
+    if failed:
+        print(f"--- INGESTION: {len(failed)} files failed to parse and were left in {inject_dir} ---")
     print("--- PROCESS COMPLETE ---")
 
+
+def sync(kb_dir: str = "knowledge_base", workers: Optional[int] = None, batch_size: int = INDEX_BATCH_SIZE,
+         resume: bool = False):
+    """
+    Bring the index in line with `kb_dir`: index new files, re-index changed ones and delete
+    the chunks of removed ones. Unchanged files (same sha256 as last time) are not parsed.
+    """
+    if not os.path.exists(kb_dir):
+        print(f"Directory {kb_dir} not found. Nothing to sync.")
+        return
+
+    rag = RAGService()
+    manifest = _manifest_for(rag)
+    hashes = {os.path.relpath(file_path, kb_dir): file_sha256(file_path) for file_path in _source_files(kb_dir)}
+    new, changed, removed = manifest.diff(hashes)
+    print(f"--- SYNC: {len(new)} new, {len(changed)} changed, {len(removed)} removed, "
+          f"{len(hashes) - len(new) - len(changed)} unchanged files in '{kb_dir}' ---")
+    if not (new or changed or removed):
+        return
+
+    # Chunks of the old versions; they are deleted once the new versions are indexed
+    replaced = [chunk_id for path in changed + removed for chunk_id in manifest.chunk_ids(path)]
+
+    to_parse = {os.path.join(kb_dir, path): hashes[path] for path in new + changed}
+    result = _run_pipeline(rag, kb_dir, to_parse, workers, batch_size, replacing=replaced, resume=resume)
+    if result is None:
+        print("--- SYNC: Indexing failed, manifest left unchanged ---")
+        return
+    produced, failed = result
+
+    # Re-read under the index lock, so entries recorded meanwhile by another ingest run are kept
+    with rag.store.lock():
+        manifest = _manifest_for(rag)
+        # Old chunks of the removed files and of the changed files that were re-indexed; a file that
+        # failed to parse keeps its manifest entry and old chunks, and is retried by the next sync
+        stale = {chunk_id for path in removed for chunk_id in manifest.chunk_ids(path)}
+        for file_path, chunk_ids in produced.items():
+            path = os.path.relpath(file_path, kb_dir)
+            stale.update(manifest.chunk_ids(path))
+            manifest.set(path, hashes[path], chunk_ids)
+        for path in removed:
+            manifest.remove(path)
+        stale.update(chunk_id for chunk_ids in failed.values() for chunk_id in chunk_ids)
+
+        # Identical chunks may also come from files that are still present
+        stale = stale - manifest.referenced()
+        rag.delete_documents(sorted(stale))
+        manifest.save()
+    if failed:
+        print(f"--- SYNC: {len(failed)} files failed to parse; their previous chunks are kept and the next sync retries them ---")
+    print("--- SYNC COMPLETE ---")
+
 if __name__ == "__main__":
+    import argparse
     from dotenv import load_dotenv
     load_dotenv()
-    ingest()
+
+    parser = argparse.ArgumentParser(description="Ingest new sources into the knowledge base index.")
+    parser.add_argument("--workers", type=int, default=None, help="PDF parsing processes (default: all cores)")
+    parser.add_argument("--batch-size", type=int, default=INDEX_BATCH_SIZE, help="Chunks per index commit")
+    parser.add_argument("--sync", action="store_true",
+                        help="Re-index only new/changed files under --dir and delete chunks of removed ones")
+    parser.add_argument("--dir", default="knowledge_base", help="Directory to --sync")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted run from its checkpoint instead of starting over")
+    args = parser.parse_args()
+    if args.sync:
+        sync(args.dir, args.workers, args.batch_size, args.resume)
+    else:
+        ingest(args.workers, args.batch_size, args.resume)
@@ -0,0 +1,73 @@
+from fastapi import FastAPI
+from pydantic import BaseModel
+import uvicorn
+from typing import List, Optional
+
+from core.config import settings
+from core.rag_service import RAGService
+
+# One process holds the index; app workers query it through core.retrieval_client.RemoteRAGService
+app = FastAPI(title="Farm-AI Retrieval Server")
+rag = RAGService()
+
+
+class SearchRequest(BaseModel):
+    queries: List[str]
+    k: int = 4
+    mode: str = "hybrid"  # "hybrid" or "semantic"
+    categories: Optional[List[str]] = None
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+
+
+def _serialize(docs) -> List[dict]:
+    return [{"page_content": d.page_content, "metadata": d.metadata} for d in docs]
+
+
+@app.post("/search")
+def search(request: SearchRequest):
+    """
+    Hybrid (or semantic-only) search for a batch of queries.
+    A plain `def` endpoint: FastAPI runs it on its thread pool, so CPU-bound
+    searches never block the event loop.
+    """
+    if request.mode == "semantic":
+        results = [
+            rag.semantic_search(q, k=request.k, categories=request.categories,
+                                nprobe=request.nprobe, ef_search=request.ef_search)
+            for q in request.queries
+        ]
+    else:
+        results = rag.hybrid_search_batch(
+            request.queries, k=request.k, categories=request.categories,
+            nprobe=request.nprobe, ef_search=request.ef_search,
+        )
+    return {"index_version": rag.index_version, "results": [_serialize(docs) for docs in results]}
+
+
+class EmbedRequest(BaseModel):
+    queries: List[str]
+
+
+@app.post("/embed")
+def embed(request: EmbedRequest):
+    """Query embeddings from the index's embedder (through its query cache)."""
+    return {"vectors": rag.query_cache.embed_queries(request.queries)}
+
+
+@app.get("/health")
+def health():
+    stats = rag.stats()
+    return {
+        "status": "ok" if stats["ready"] else "empty",
+        "index_version": stats["index_version"],
+        "documents": stats["documents"],
+        "categories": stats["categories"],
+        "query_cache": rag.query_cache.stats(),
+        "result_cache": rag.result_cache.stats(),
+    }
+
+
+if __name__ == "__main__":
+    # Port 8002: 8000 is the MCP server, 8001 the SMS server
+    uvicorn.run(app, host="0.0.0.0", port=settings.retrieval_server_port)
@@ -78,8 +78,8 @@ async def reply_to_sms(Body: Annotated[str, Form()], From: Annotated[str, Form()
     ai_text = "Sorry, I'm having trouble connecting to the farm brain right now."
     
     try:
-        # Invoke the LangGraph app
-        response = agent_app.invoke(payload)
+        # Invoke the LangGraph app asynchronously so the event loop keeps serving other SMS
+        response = await agent_app.ainvoke(payload)
         
         # Get the AI's response
         if response and "messages" in response and response["messages"]:
@@ -15,10 +15,10 @@ try:
     rag = RAGService()
     print("RAGService initialized.")
     
-    print(f"Vector Store: {rag.vector_store}")
-    print(f"BM25 Retriever: {rag.bm25_retriever}")
+    print(f"Vector Index: {rag.vector_index}")
+    print(f"BM25 Index: {rag.bm25_index}")
     
-    if rag.vector_store and rag.bm25_retriever:
+    if rag.vector_index is not None and rag.bm25_index is not None:
         print("Testing search...")
         results = rag.hybrid_search("tomato", k=2)
         print(f"Search results: {len(results)}")
@@ -0,0 +1,27 @@
+import os
+from contextlib import contextmanager
+
+from core.config import settings
+
+
+@contextmanager
+def hashing_settings(tmpdir, chdir: bool = False, **overrides):
+    """
+    Deterministic hashing embedder (no API calls) with its caches in tmpdir, plus any other
+    setting overrides; with chdir=True also runs in tmpdir (so ./knowledge_base_index is there).
+    Settings and the working directory are restored afterwards.
+    """
+    overrides = {"embedding_provider": "hashing", "embedding_model": "256", "index_reload_interval": 0,
+                 "embedding_cache_dir": os.path.join(tmpdir, "embedding_cache"), **overrides}
+    saved = {name: getattr(settings, name) for name in overrides}
+    cwd = os.getcwd()
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+    if chdir:
+        os.chdir(tmpdir)
+    try:
+        yield
+    finally:
+        os.chdir(cwd)
+        for name, value in saved.items():
+            setattr(settings, name, value)
@@ -0,0 +1,156 @@
+import os
+import sys
+import json
+import asyncio
+import time
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.answer_cache import SemanticAnswerCache
+from core.config import settings
+from agents import knowledge_support
+from agents.knowledge_support import KnowledgeSupportAgent
+
+
+def _vector(*values):
+    return np.array(values, dtype=np.float32)
+
+
+def test_similar_questions_hit():
+    cache = SemanticAnswerCache(threshold=0.9, ttl_seconds=60)
+    cache.put(_vector(1, 0, 0), 1, "PM-KISAN eligibility", "Small and marginal farmers.", ["schemes.pdf"])
+
+    hit = cache.get(_vector(0.95, 0.1, 0), 1)
+    assert hit is not None and hit.answer == "Small and marginal farmers."
+    assert cache.get(_vector(0, 1, 0), 1) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+    print("PASS: Near-duplicate questions hit, unrelated ones miss.")
+
+
+def test_index_change_and_ttl_invalidate():
+    cache = SemanticAnswerCache(threshold=0.9, ttl_seconds=60)
+    cache.put(_vector(1, 0), 1, "q", "old answer", [])
+    # A new index version drops everything cached against the old one
+    assert cache.get(_vector(1, 0), 2) is None
+    assert len(cache) == 0
+
+    cache.put(_vector(1, 0), 2, "q", "answer", [])
+    cache.ttl_seconds = 0.01
+    time.sleep(0.02)
+    assert cache.get(_vector(1, 0), 2) is None and len(cache) == 0
+    print("PASS: Index changes and TTL expiry invalidate answers.")
+
+
+class _FakeRAG:
+    index_version = 1
+    categories = []
+
+    def __init__(self):
+        self.searches = []
+
+    def embed_query(self, query):
+        # Same text, same vector; anything else is orthogonal
+        vector = np.zeros(64, dtype=np.float32)
+        vector[hash(query.lower()) % 64] = 1
+        return vector
+
+    def hybrid_search_batch(self, queries, k=4, categories=None):
+        self.searches.extend(queries)
+        return [[Document(page_content="Wheat is sown from the first to the third week of November.",
+                          metadata={"source": "wheat.md"})] for _ in queries]
+
+
+class _FakeMemory:
+    def get_context(self, user_id):
+        return {"farmer_name": "Ravi", "active_crops": "wheat", "current_date": "2026-10-17"}
+
+
+class _ScriptedLLM:
+    """Stands in for the chat model: answers each prompt by its kind and records the calls."""
+
+    def __init__(self, rewrites):
+        self.rewrites = rewrites
+        self.calls = []
+
+    def __call__(self, prompt_value):
+        text = prompt_value.to_string()
+        if "Classify the user instructions" in text:
+            self.calls.append("route")
+            question = text.split('User Input: "')[1].split('"')[0]
+            return AIMessage(content=json.dumps({"intent": "FARMING_QUERY", "category": "any",
+                                                 "standalone_question": self.rewrites.get(question, question)}))
+        if "EXPERT ANSWER" in text:
+            self.calls.append("personalize")
+            return AIMessage(content="Personalized: " + text.split("**EXPERT ANSWER (from the official knowledge base):**")[1].strip().split("\n")[0])
+        if "Answer the farmer's question" in text:
+            self.calls.append("answer")
+            return AIMessage(content="Sow wheat in November.")
+        self.calls.append("single")
+        return AIMessage(content="Ravi, sow your wheat in November.")
+
+
+def _agent(llm, cache_size=100):
+    original = knowledge_support.create_rag_service
+    knowledge_support.create_rag_service = _FakeRAG
+    saved_size = settings.answer_cache_size
+    settings.answer_cache_size = cache_size
+    try:
+        return KnowledgeSupportAgent(RunnableLambda(llm), _FakeMemory(), log_manager=None)
+    finally:
+        knowledge_support.create_rag_service = original
+        settings.answer_cache_size = saved_size
+
+
+def _state(*messages):
+    return {"user_id": "u1", "messages": [HumanMessage(content=m) if i % 2 == 0 else AIMessage(content=m)
+                                          for i, m in enumerate(messages)]}
+
+
+def test_follow_up_hits_the_cache_through_its_standalone_question():
+    llm = _ScriptedLLM({"and what is the sowing time for it?": "What is the sowing time for wheat?"})
+    agent = _agent(llm)
+
+    # An opening question fills the cache: generic answer, then personalization
+    first = agent.invoke(_state("What is the sowing time for wheat?"))
+    assert llm.calls == ["route", "answer", "personalize"]
+    assert first["messages"][0].content == "Personalized: Sow wheat in November."
+
+    # A follow-up in another conversation is rewritten by the router and reuses that answer
+    llm.calls.clear()
+    follow_up = agent.invoke(_state("Tell me about wheat", "Wheat is a rabi crop.", "and what is the sowing time for it?"))
+    assert llm.calls == ["route", "personalize"]
+    assert follow_up["messages"][0].content == "Personalized: Sow wheat in November."
+    assert agent.rag.searches == ["What is the sowing time for wheat?"]
+    assert agent.answer_cache.stats()["hits"] == 1
+    llm.calls.clear()
+    asyncio.run(agent.ainvoke(_state("Tell me about wheat", "Wheat is a rabi crop.", "and what is the sowing time for it?")))
+    assert llm.calls == ["route", "personalize"] and agent.answer_cache.stats()["hits"] == 2
+
+    # A follow-up the router leaves unresolved is answered without touching the cache
+    llm.calls.clear()
+    llm.rewrites = {}
+    agent.router_chain = RunnableLambda(lambda _: {"intent": "FARMING_QUERY"})
+    agent.invoke(_state("Tell me about rice", "Rice needs standing water.", "what is the sowing time for it?"))
+    assert llm.calls == ["single"] and len(agent.answer_cache) == 1
+    print("PASS: A follow-up hits the answer cache through its standalone rewrite.")
+
+
+def test_uncached_answers_take_one_call():
+    llm = _ScriptedLLM({})
+    agent = _agent(llm, cache_size=0)
+    response = agent.invoke(_state("What is the sowing time for wheat?"))
+    assert llm.calls == ["route", "single"]
+    assert response["messages"][0].content == "Ravi, sow your wheat in November."
+    print("PASS: With the answer cache off, RAG answers take a single LLM call.")
+
+
+if __name__ == "__main__":
+    test_similar_questions_hit()
+    test_index_change_and_ttl_invalidate()
+    test_follow_up_hits_the_cache_through_its_standalone_question()
+    test_uncached_answers_take_one_call()
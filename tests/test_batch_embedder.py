@@ -0,0 +1,75 @@
+import os
+import sys
+import tempfile
+import threading
+import numpy as np
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.batch_embedder import ConcurrentEmbedder
+from core.embedding_cache import ChunkEmbeddingCache
+from core.embeddings import HashingEmbeddings
+
+
+class RateLimitError(Exception):
+    pass
+
+
+class FlakyEmbeddings(HashingEmbeddings):
+    """Hashing embedder that rejects the first few requests as rate limited."""
+
+    def __init__(self, failures: int):
+        super().__init__(32)
+        self.failures = failures
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.calls += 1
+            if self.failures > 0:
+                self.failures -= 1
+                raise RateLimitError("429 Too Many Requests")
+        return super().embed_documents(texts)
+
+
+def test_batches_keep_order_and_back_off():
+    texts = [f"crop advisory number {i}" for i in range(50)]
+    flaky = FlakyEmbeddings(failures=2)
+    embedder = ConcurrentEmbedder(flaky, batch_size=8, max_concurrency=4, base_delay=0.01)
+    completed = []
+    vectors = embedder.embed(texts, on_batch=lambda start, batch: completed.append((start, len(batch))))
+
+    assert np.allclose(vectors, np.array(HashingEmbeddings(32).embed_documents(texts)))
+    assert sorted(completed) == [(start, min(8, 50 - start)) for start in range(0, 50, 8)]
+    # 7 batches plus the 2 rejected attempts
+    assert flaky.calls == 9
+
+    # AIMD: a rate limit halves the concurrency, successes win it back gradually
+    embedder = ConcurrentEmbedder(flaky, max_concurrency=8)
+    embedder._acquire()
+    embedder._release(rate_limited=True)
+    assert embedder.concurrency == 4
+    embedder._acquire()
+    embedder._release(rate_limited=False)
+    assert embedder.concurrency == 4 and embedder._limit > 4
+    print("PASS: Concurrent batches keep input order and back off on rate limits.")
+
+
+def test_chunk_cache_round_trip():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = ChunkEmbeddingCache("hashing:32", cache_dir)
+        cache.put_many([("a", [0.5, 1.0]), ("b", [2.0, 3.0])])
+
+        reopened = ChunkEmbeddingCache("hashing:32", cache_dir)
+        found = reopened.get_many(["b", "missing", "a"])
+        assert set(found) == {"a", "b"} and np.allclose(found["b"], [2.0, 3.0])
+        # Other models never see these vectors
+        assert ChunkEmbeddingCache("openai:other", cache_dir).get_many(["a"]) == {}
+    print("PASS: Chunk embeddings persist per model and chunk ID.")
+
+
+if __name__ == "__main__":
+    test_batches_keep_order_and_back_off()
+    test_chunk_cache_round_trip()
@@ -0,0 +1,50 @@
+import os
+import sys
+import numpy as np
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.bm25_index import BM25Index
+
+CORPUS = [
+    "Tomato late blight is controlled with copper fungicide sprays.",
+    "PM-KISAN gives eligible farmers income support in three instalments.",
+    "Prune mango trees after harvest to open the canopy.",
+    "Drip irrigation saves water for tomato and chilli crops.",
+    "Early blight of tomato shows concentric rings on older leaves.",
+]
+
+
+def test_top_k_beyond_default():
+    index = BM25Index()
+    index.add_documents(CORPUS)
+    hits = index.search("tomato blight", k=10)
+    ids = [doc_id for doc_id, _ in hits]
+    # Every document mentioning a query term is returned, best first
+    assert set(ids) == {0, 3, 4}
+    assert ids[-1] == 3
+    assert index.search("banana", k=10) == []
+
+    # A category bitmap restricts results without changing their scores
+    allowed = np.array([False, False, False, True, True])
+    assert index.search("tomato blight", k=10, allowed=allowed) == [h for h in hits if h[0] in (3, 4)]
+    print("PASS: BM25 returns the full requested top-k.")
+
+
+def test_incremental_add_and_remove():
+    index = BM25Index()
+    index.add_documents(CORPUS[:2])
+    new_ids = index.add_documents(CORPUS[2:])
+    assert list(new_ids) == [2, 3, 4]
+    assert len(index.segments) == 2
+
+    index.remove([0])
+    assert 0 not in [doc_id for doc_id, _ in index.search("tomato blight", k=10)]
+    assert len(index) == 4
+    print("PASS: BM25 supports incremental add and remove.")
+
+
+if __name__ == "__main__":
+    test_top_k_beyond_default()
+    test_incremental_add_and_remove()
@@ -0,0 +1,48 @@
+import os
+import sys
+from langchain_core.documents import Document
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.context_compressor import ContextCompressor, estimate_tokens
+
+
+DOCS = [
+    Document(
+        page_content="Tomatoes need full sun. Early blight shows as dark rings on lower leaves. "
+                     "Spray copper fungicide every 7 days to control blight. Harvest when fruits turn red.",
+        metadata={"source": "tomato_guide.pdf"},
+    ),
+    Document(
+        page_content="PM-KISAN pays 6000 rupees a year. Apply at the nearest Common Service Centre.",
+        metadata={"source": "schemes.pdf"},
+    ),
+]
+
+
+def test_keeps_relevant_sentences_under_budget():
+    compressor = ContextCompressor(token_budget=30)
+    context = compressor.compress("how to control tomato blight with fungicide", DOCS)
+
+    assert "[Source: tomato_guide.pdf]" in context
+    assert "copper fungicide" in context
+    assert "PM-KISAN" not in context and "[Source: schemes.pdf]" not in context
+    assert estimate_tokens(context) < sum(estimate_tokens(d.page_content) for d in DOCS)
+    print("PASS: Only query-relevant sentences are kept, with their source labels.")
+
+
+def test_order_and_passthrough():
+    kept = ContextCompressor(token_budget=1000).select("blight", DOCS)
+    # Both blight sentences, in document order, with a gap marker between non-adjacent ones
+    assert kept[0] == ["Early blight shows as dark rings on lower leaves.",
+                       "Spray copper fungicide every 7 days to control blight."]
+
+    full = ContextCompressor(token_budget=0).compress("blight", DOCS)
+    assert all(d.page_content in full for d in DOCS)
+    print("PASS: Kept sentences stay in order; a zero budget disables compression.")
+
+
+if __name__ == "__main__":
+    test_keeps_relevant_sentences_under_budget()
+    test_order_and_passthrough()
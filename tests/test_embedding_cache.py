@@ -0,0 +1,75 @@
+import os
+import sys
+import tempfile
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.embedding_cache import EmbeddingCache
+
+
+class CountingEmbeddings:
+    """Fake embedding model that records how often it is called."""
+    def __init__(self):
+        self.calls = 0
+        self.texts = []
+
+    def embed_query(self, text):
+        self.calls += 1
+        self.texts.append(text)
+        return [float(len(text)), 1.0, 0.5]
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        self.texts.extend(texts)
+        return [[float(len(t)), 1.0, 0.5] for t in texts]
+
+
+def test_embedding_cache():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        model = CountingEmbeddings()
+        cache = EmbeddingCache(model, "fake-model", cache_dir, max_entries=2)
+
+        first = cache.embed_query("How to control  Tomato Blight?")
+        second = cache.embed_query("how to control tomato blight?")
+        assert first == second
+        assert model.calls == 1
+        # Only the cache key is normalized; the model sees the query as the user wrote it
+        assert model.texts == ["How to control  Tomato Blight?"]
+        assert cache.stats()["memory_hits"] == 1
+
+        # A fresh cache (new process) is served from disk
+        reloaded = EmbeddingCache(model, "fake-model", cache_dir, max_entries=2)
+        assert reloaded.embed_query("how to control tomato blight?") == first
+        assert model.calls == 1
+        assert reloaded.stats()["disk_hits"] == 1
+
+        # Vectors from another model are never reused
+        other = EmbeddingCache(model, "other-model", cache_dir)
+        other.embed_query("how to control tomato blight?")
+        assert model.calls == 2
+        print("PASS: Query embedding cache works across memory, disk and models.")
+
+
+def test_embed_queries_batches_misses():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        model = CountingEmbeddings()
+        cache = EmbeddingCache(model, "fake-model", cache_dir)
+        cache.embed_query("tomato blight")
+
+        vectors = cache.embed_queries(["Tomato Blight", "mango pruning", "rice irrigation", "mango pruning"])
+        assert len(vectors) == 4
+        assert vectors[1] == vectors[3]
+        # One call for the single query, one for the whole batch of misses
+        assert model.calls == 2
+        assert cache.stats()["misses"] == 3
+        assert model.texts[1:] == ["mango pruning", "rice irrigation"]
+
+        cache.embed_queries(["Onion  Storage", "onion storage"])
+        assert model.texts[-1] == "Onion  Storage"
+        print("PASS: Batch embedding sends all misses in one request.")
+
+
+if __name__ == "__main__":
+    test_embedding_cache()
+    test_embed_queries_batches_misses()
@@ -0,0 +1,41 @@
+import os
+import sys
+import numpy as np
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.embeddings import HashingEmbeddings, create_embeddings, embedding_cache_name
+
+
+def test_hashing_embeddings():
+    embedder = create_embeddings("hashing", "128")
+    assert isinstance(embedder, HashingEmbeddings)
+
+    docs = np.array(embedder.embed_documents([
+        "Tomato blight is controlled with copper fungicide.",
+        "PM-KISAN scheme eligibility for small farmers.",
+    ]))
+    query = np.array(embedder.embed_query("copper spray for tomato blight"))
+    assert docs.shape == (2, 128)
+    assert np.allclose(np.linalg.norm(docs, axis=1), 1.0)
+    # Deterministic across instances (and processes), and lexical overlap ranks first
+    assert np.array_equal(query, HashingEmbeddings(128).embed_query("copper spray for tomato blight"))
+    assert docs[0] @ query > docs[1] @ query
+    print("PASS: Hashing embedder is deterministic and normalized.")
+
+
+def test_provider_names():
+    assert embedding_cache_name("openai", "text-embedding-3-small") == "text-embedding-3-small"
+    assert embedding_cache_name("onnx", "/models/minilm") == "onnx:/models/minilm"
+    try:
+        create_embeddings("word2vec", "x")
+        assert False, "unknown provider should fail"
+    except ValueError:
+        pass
+    print("PASS: Providers are validated and cached under distinct names.")
+
+
+if __name__ == "__main__":
+    test_hashing_embeddings()
+    test_provider_names()
@@ -0,0 +1,46 @@
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.ingest_batcher import DebouncedBatcher
+
+
+def test_batches_wait_for_a_quiet_folder():
+    batcher = DebouncedBatcher(debounce=5, max_wait=30, max_files=10, settle=2)
+    batcher.observe({"a.md": (10, 1.0)}, now=0)
+    batcher.observe({"a.md": (10, 1.0), "b.md": (5, 1.0)}, now=3)
+    # b.md arrived 1s ago: the folder is not quiet yet
+    assert batcher.ready(now=4) == []
+    # Still being written: b.md grows, which restarts the debounce
+    batcher.observe({"a.md": (10, 1.0), "b.md": (9, 2.0)}, now=6)
+    assert batcher.ready(now=10) == []
+    assert batcher.ready(now=11) == [("a.md", 0), ("b.md", 3)]
+
+    # Released files are ignored until they change
+    batcher.observe({"a.md": (10, 1.0), "b.md": (9, 2.0)}, now=12)
+    assert batcher.pending == 0
+    batcher.observe({"a.md": (12, 13.0), "b.md": (9, 2.0)}, now=13)
+    assert batcher.pending == 1
+    print("PASS: Files are batched once the folder has been quiet for the debounce window.")
+
+
+def test_steady_arrivals_are_flushed_by_max_wait():
+    batcher = DebouncedBatcher(debounce=5, max_wait=30, max_files=100, settle=2)
+    files = {}
+    released = []
+    # A new file every 3 seconds never leaves a quiet window
+    for t in range(0, 40, 3):
+        files[f"f{t}.md"] = (1, float(t))
+        batcher.observe(dict(files), now=t)
+        released += batcher.ready(now=t)
+    assert released and max(first_seen for _, first_seen in released) <= 30
+    # Only settled files are taken; the newest one waits for the next batch
+    assert "f39.md" not in {path for path, _ in released}
+    print("PASS: A steady stream of files is still flushed within max_wait.")
+
+
+if __name__ == "__main__":
+    test_batches_wait_for_a_quiet_folder()
+    test_steady_arrivals_are_flushed_by_max_wait()
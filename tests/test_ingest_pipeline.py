@@ -0,0 +1,200 @@
+import os
+import sys
+import tempfile
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.ingest_manifest import IngestManifest
+from core.rag_service import RAGService
+from helpers import hashing_settings
+from ingest_knowledge import iter_chunks, load_documents, ingest, sync, _category, _parse_task
+
+KB_PDF = os.path.join(os.path.dirname(__file__), "..", "knowledge_base", "government_schemes",
+                      "GOVERNMENT_SCHEMES_FOR_AGRICULTURE__Revised-26.12.2019.pdf")
+
+PASSAGE = ("Farmers with cultivable land are eligible for PM-KISAN. The benefit of 6000 rupees per year "
+           "is paid in three equal instalments directly into the bank accounts of the beneficiaries. "
+           "Institutional land holders and income tax payers are excluded from the scheme.")
+
+
+def test_text_files_are_chunked_with_category():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.makedirs(os.path.join(tmpdir, "farming_practices"))
+        with open(os.path.join(tmpdir, "farming_practices", "mulch.md"), "w") as f:
+            f.write("Mulching keeps soil moist. " * 100)
+        with open(os.path.join(tmpdir, "notes.txt"), "w") as f:
+            f.write("Rotate crops every season.")
+
+        chunks = load_documents(tmpdir, workers=2)
+        categories = {c.metadata["source"]: c.metadata["category"] for c in chunks}
+        assert categories == {"mulch.md": "farming_practices", "notes.txt": "general"}
+        assert len(chunks) > 2 and all(len(c.page_content) <= 1000 for c in chunks)
+        # Streaming: one list of chunks per finished task
+        streamed = list(iter_chunks(tmpdir, workers=1))
+        assert sum(len(batch) for _, batch, _ in streamed) == len(chunks)
+        # Each file is marked complete exactly once, on its last task
+        assert sorted(os.path.basename(path) for path, _, complete in streamed if complete) == ["mulch.md", "notes.txt"]
+    print("PASS: Text files are chunked in the worker pool with their category.")
+
+
+def test_inject_folders_map_to_their_category():
+    inject = "inject_new_sources"
+    assert _category(inject, os.path.join(inject, "gov_", "pm_kisan.md")) == "government_schemes"
+    assert _category(inject, os.path.join(inject, "farm-new-source", "drip", "guide.md")) == \
+        os.path.join("farming_practices", "drip")
+    assert _category("knowledge_base", os.path.join("knowledge_base", "government_schemes", "x.md")) == "government_schemes"
+    print("PASS: Inject folders are indexed under the category they are moved into.")
+
+
+def test_removing_a_file_keeps_the_indexed_copy_of_its_near_duplicates():
+    with tempfile.TemporaryDirectory() as tmpdir, hashing_settings(tmpdir, chdir=True):
+        os.makedirs(os.path.join("knowledge_base", "government_schemes"))
+        a_path = os.path.join("knowledge_base", "government_schemes", "a.md")
+        with open(a_path, "w") as f:
+            f.write(PASSAGE)
+        with open(os.path.join("knowledge_base", "government_schemes", "b.md"), "w") as f:
+            f.write(PASSAGE + " Page 4 of 12.")
+        sync("knowledge_base", workers=1)
+        assert RAGService()._snapshot.generation.n_live == 1
+
+        # b.md was dropped as a near duplicate of a.md's chunk, so it references that chunk
+        os.remove(a_path)
+        sync("knowledge_base", workers=1)
+        rag = RAGService()
+        assert rag._snapshot.generation.n_live == 1
+        assert [doc.page_content for doc in rag.hybrid_search("PM-KISAN instalments", k=2)] == [PASSAGE]
+    print("PASS: Deleting a file never removes the only indexed copy of a near duplicate.")
+
+
+def test_resume_skips_files_committed_before_a_failure():
+    notes = {
+        "a_mulch.md": "Mulching with paddy straw keeps soil moist through the dry months.",
+        "b_drip.md": "Drip lines should be flushed every fortnight to stop emitters clogging.",
+        "c_neem.md": "Neem seed kernel extract at five percent controls early stage aphids.",
+    }
+    with tempfile.TemporaryDirectory() as tmpdir, hashing_settings(tmpdir, chdir=True):
+        os.makedirs(os.path.join("knowledge_base", "farming_practices"))
+        for name, text in notes.items():
+            with open(os.path.join("knowledge_base", "farming_practices", name), "w") as f:
+                f.write(text)
+
+        indexed, calls = [], []
+        add_documents = RAGService.add_documents
+
+        def flaky_add_documents(self, documents, **kwargs):
+            calls.append(len(documents))
+            indexed.extend(doc.page_content for doc in documents)
+            if len(calls) == 2:
+                raise RuntimeError("embedding service unavailable")
+            return add_documents(self, documents, **kwargs)
+
+        RAGService.add_documents = flaky_add_documents
+        try:
+            # One chunk per commit: the first file is committed, the second batch fails
+            sync("knowledge_base", workers=1, batch_size=1)
+            rag = RAGService()
+            assert rag._snapshot.generation.n_live == 1
+            assert not IngestManifest(os.path.join(rag.persistence_dir, "ingest_manifest.json")).files
+            checkpoint = IngestManifest(os.path.join(rag.persistence_dir, "checkpoint-knowledge_base.json"))
+            assert list(checkpoint.files) == [os.path.join("farming_practices", "a_mulch.md")]
+
+            indexed.clear()
+            sync("knowledge_base", workers=1, batch_size=1, resume=True)
+        finally:
+            RAGService.add_documents = add_documents
+
+        # Only the files after the checkpoint were parsed and indexed again
+        assert sorted(indexed) == sorted([notes["b_drip.md"], notes["c_neem.md"]])
+        rag = RAGService()
+        assert rag._snapshot.generation.n_live == 3
+        assert not os.path.exists(checkpoint.path)
+        manifest = IngestManifest(os.path.join(rag.persistence_dir, "ingest_manifest.json"))
+        assert sorted(manifest.files) == sorted(os.path.join("farming_practices", name) for name in notes)
+        assert len(manifest.referenced()) == 3
+    print("PASS: --resume continues after the files an interrupted run already committed.")
+
+
+def test_files_that_fail_to_parse_are_left_for_the_next_run():
+    mulch = "Mulching with paddy straw keeps soil moist through the dry months."
+    with tempfile.TemporaryDirectory() as tmpdir, hashing_settings(tmpdir, chdir=True):
+        practices = os.path.join("knowledge_base", "farming_practices")
+        os.makedirs(practices)
+        with open(os.path.join(practices, "mulch.md"), "w") as f:
+            f.write(mulch)
+        with open(os.path.join(practices, "scan.pdf"), "wb") as f:
+            f.write(b"%PDF-1.4 truncated upload")
+        sync("knowledge_base", workers=1)
+
+        manifest_path = os.path.join("knowledge_base_index", "ingest_manifest.json")
+        assert sorted(IngestManifest(manifest_path).files) == [os.path.join("farming_practices", "mulch.md")]
+
+        # A changed version that fails to parse keeps the previous version indexed and recorded
+        recorded = IngestManifest(manifest_path).files
+        with open(os.path.join(practices, "mulch.md"), "wb") as f:
+            f.write(b"Mulch \xff\xfe not utf-8")
+        sync("knowledge_base", workers=1)
+        assert IngestManifest(manifest_path).files == recorded
+        assert [doc.page_content for doc in RAGService().hybrid_search("paddy straw mulching", k=1)] == [mulch]
+
+        # Once fixed, the next sync picks it up and replaces the old chunks
+        with open(os.path.join(practices, "mulch.md"), "w") as f:
+            f.write("Mulch tomato beds with black polythene film to control weeds.")
+        sync("knowledge_base", workers=1)
+        assert IngestManifest(manifest_path).files != recorded
+        assert RAGService()._snapshot.generation.n_live == 1
+
+        # ingest(): a broken upload stays in the inject folder, out of the knowledge base and the manifest
+        upload = os.path.join("inject_new_sources", "farm-new-source")
+        os.makedirs(upload)
+        with open(os.path.join(upload, "drip.md"), "w") as f:
+            f.write("Flush drip lines every fortnight so the emitters do not clog.")
+        with open(os.path.join(upload, "brochure.pdf"), "wb") as f:
+            f.write(b"%PDF-1.4 half written")
+        ingest(workers=1)
+        assert os.listdir(upload) == ["brochure.pdf"]
+        assert not os.path.exists(os.path.join(practices, "brochure.pdf"))
+        assert sorted(IngestManifest(manifest_path).files) == \
+            [os.path.join("farming_practices", name) for name in ("drip.md", "mulch.md")]
+    print("PASS: Files that fail to parse are not recorded, moved or allowed to replace their old chunks.")
+
+
+def test_daemon_counts_failed_files_and_leaves_them_in_place():
+    from ingest_daemon import IngestDaemon
+    with tempfile.TemporaryDirectory() as tmpdir, hashing_settings(tmpdir, chdir=True):
+        upload = os.path.join("inject_new_sources", "gov_")
+        os.makedirs(upload)
+        good, broken = os.path.join(upload, "kisan.md"), os.path.join(upload, "scan.pdf")
+        with open(good, "w") as f:
+            f.write(PASSAGE)
+        with open(broken, "wb") as f:
+            f.write(b"%PDF-1.4 half written")
+
+        daemon = IngestDaemon(rag=RAGService(), workers=1)
+        assert daemon._index_batch([(good, 0.0), (broken, 0.0)]) == 1
+        metrics = daemon.metrics()
+        assert metrics["files_indexed"] == 1 and metrics["files_failed"] == 1
+        assert os.path.exists(broken) and not os.path.exists(good)
+        assert os.path.exists(os.path.join("knowledge_base", "government_schemes", "kisan.md"))
+    print("PASS: The ingest daemon leaves unparseable uploads in place and counts them in /metrics.")
+
+
+def test_pdf_pages_keep_page_numbers():
+    if not os.path.exists(KB_PDF):
+        print("SKIP: knowledge base PDF not found")
+        return
+    chunks = _parse_task((KB_PDF, "government_schemes", 2, 4))
+    pages = {c.metadata["page"] for c in chunks}
+    assert pages and pages <= {3, 4}
+    assert all(c.metadata["source"] == os.path.basename(KB_PDF) for c in chunks)
+    print("PASS: PDF chunks carry their 1-based page number.")
+
+
+if __name__ == "__main__":
+    test_text_files_are_chunked_with_category()
+    test_inject_folders_map_to_their_category()
+    test_removing_a_file_keeps_the_indexed_copy_of_its_near_duplicates()
+    test_resume_skips_files_committed_before_a_failure()
+    test_files_that_fail_to_parse_are_left_for_the_next_run()
+    test_daemon_counts_failed_files_and_leaves_them_in_place()
+    test_pdf_pages_keep_page_numbers()
@@ -0,0 +1,204 @@
+import os
+import sys
+import time
+import socket
+import asyncio
+import threading
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp.server.fastmcp import FastMCP
+from core.mcp_session_pool import MCPSessionPool
+from core.mcp_wrapper import MCPWrapper
+
+_server_url = None
+
+
+def _serve() -> str:
+    """Start a local streamable-HTTP MCP server (once per test run) and return its URL."""
+    global _server_url
+    if _server_url is None:
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        mcp = FastMCP("Test", host="127.0.0.1", port=port, log_level="WARNING")
+
+        @mcp.tool()
+        def echo(text: str) -> str:
+            return f"echo: {text}"
+
+        @mcp.tool()
+        async def slow(seconds: float) -> str:
+            await asyncio.sleep(seconds)
+            return "done"
+
+        threading.Thread(target=lambda: mcp.run(transport="streamable-http"), daemon=True).start()
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+        _server_url = f"http://127.0.0.1:{port}/mcp"
+    return _server_url
+
+
+def test_pool_reuses_one_session():
+    url = _serve()
+    pool = MCPSessionPool(max_sessions=2)
+    for i in range(3):
+        result = pool.run(pool.call_tool(url, "echo", {"text": f"hi {i}"}))
+        assert result.content[0].text == f"echo: hi {i}"
+    server = pool._servers[url]
+    # Sequential calls check out the same initialized session
+    assert server.open == 1 and len(server.idle) == 1 and server.idle[0].calls == 3
+    pool.run(pool.close())
+    assert server.open == 0
+    print("PASS: Sequential calls reuse one pooled session.")
+
+
+def test_pool_reconnects_after_a_lost_session():
+    url = _serve()
+    pool = MCPSessionPool(max_sessions=1, ping_after=0)
+    pool.run(pool.call_tool(url, "echo", {"text": "first"}))
+    server = pool._servers[url]
+    first = server.idle[0]
+
+    # The transport went away while idle: the ping fails and a new session is opened
+    pool.run(first.close())
+    result = pool.run(pool.call_tool(url, "echo", {"text": "second"}))
+    assert result.content[0].text == "echo: second"
+    assert server.open == 1 and server.idle[0] is not first
+
+    # A call that fails on a reused session is retried once on a fresh one
+    second = server.idle[0]
+
+    async def broken_call(tool_name, arguments):
+        raise ConnectionError("connection reset")
+
+    second.call_tool = broken_call
+    result = pool.run(pool.call_tool(url, "echo", {"text": "third"}))
+    assert result.content[0].text == "echo: third"
+    assert server.open == 1 and server.idle[0] not in (first, second)
+    pool.run(pool.close())
+    print("PASS: Lost pooled sessions are replaced transparently.")
+
+
+def test_cancelled_call_frees_its_session():
+    url = _serve()
+    pool = MCPSessionPool(max_sessions=1)
+
+    async def cancel_then_call():
+        try:
+            await asyncio.wait_for(pool.call_tool(url, "slow", {"seconds": 5}), 0.5)
+            assert False, "call should time out"
+        except asyncio.TimeoutError:
+            pass
+        assert pool._servers[url].open == 0
+        # With the only slot given back, the next call does not wait forever
+        return await asyncio.wait_for(pool.call_tool(url, "echo", {"text": "again"}), 5)
+
+    assert pool.run(cancel_then_call()).content[0].text == "echo: again"
+    pool.run(pool.close())
+    print("PASS: A cancelled call discards its session instead of leaking the slot.")
+
+
+def test_execute_tool_async_does_not_block_the_loop():
+    wrapper = MCPWrapper(_serve(), transport="http")
+
+    async def main():
+        ticks = []
+
+        async def ticker():
+            while True:
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.05)
+
+        tick_task = asyncio.create_task(ticker())
+        start = time.monotonic()
+        results = await asyncio.gather(*(wrapper.execute_tool_async("slow", {"seconds": 0.5}) for _ in range(3)))
+        elapsed = time.monotonic() - start
+        tick_task.cancel()
+        return results, elapsed, ticks
+
+    results, elapsed, ticks = asyncio.run(main())
+    assert results == ["done"] * 3
+    # The three calls ran side by side on pooled sessions, and the caller's loop kept running meanwhile
+    assert elapsed < 1.2
+    assert len(ticks) >= 5
+    # Failures come back as a message, as with execute_tool
+    failed = asyncio.run(wrapper.execute_tool_async("missing_tool", {}))
+    assert failed.startswith("MCP Tool Execution Failed")
+    assert wrapper.execute_tool("echo", {"text": "sync"}) == "echo: sync"
+    print("PASS: execute_tool_async runs tool calls concurrently without blocking the event loop.")
+
+
+class _LocalToolsWrapper(MCPWrapper):
+    """In-process wrapper over test tools instead of tools/mcp_server_ddg.py."""
+    calls = []
+
+    @staticmethod
+    def _local_tool(tool_name):
+        def lookup(crop: str) -> str:
+            _LocalToolsWrapper.calls.append((crop, threading.current_thread().name))
+            time.sleep(0.2)
+            return f"{crop}: sow in June"
+
+        def empty() -> str:
+            return ""
+
+        def broken() -> str:
+            raise RuntimeError("upstream API down")
+
+        tools = {"lookup": lookup, "empty": empty, "broken": broken}
+        if tool_name not in tools:
+            raise ValueError(f"Unknown tool '{tool_name}'")
+        return tools[tool_name]
+
+
+def test_inprocess_transport_calls_tools_directly():
+    url = "http://inprocess.invalid/mcp"
+    wrapper = _LocalToolsWrapper(url, transport="inprocess")
+    assert wrapper.execute_tool("lookup", {"crop": "rice"}) == "rice: sow in June"
+    assert wrapper.execute_tool("empty", {}) == "No results returned from tool."
+    assert wrapper.execute_tool("broken", {}).startswith("MCP Tool Execution Failed: upstream API down")
+    assert wrapper.execute_tool("missing", {}).startswith("MCP Tool Execution Failed: Unknown tool")
+
+    async def main():
+        ticks = []
+
+        async def ticker():
+            while True:
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.05)
+
+        tick_task = asyncio.create_task(ticker())
+        result = await wrapper.execute_tool_async("lookup", {"crop": "wheat"})
+        tick_task.cancel()
+        return result, ticks
+
+    result, ticks = asyncio.run(main())
+    assert result == "wheat: sow in June"
+    # The blocking tool ran on a worker thread while the caller's loop kept ticking
+    assert _LocalToolsWrapper.calls[-1][1] != threading.main_thread().name and len(ticks) >= 3
+    # Nothing went through the HTTP session pool
+    assert url not in MCPWrapper.pool._servers
+
+    try:
+        MCPWrapper(url, transport="stdio")
+        assert False, "unknown transport should be rejected"
+    except ValueError:
+        pass
+    print("PASS: The inprocess transport calls the tool functions directly behind the same API.")
+
+
+if __name__ == "__main__":
+    test_pool_reuses_one_session()
+    test_pool_reconnects_after_a_lost_session()
+    test_cancelled_call_frees_its_session()
+    test_execute_tool_async_does_not_block_the_loop()
+    test_inprocess_transport_calls_tools_directly()
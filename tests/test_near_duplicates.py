@@ -0,0 +1,43 @@
+import os
+import sys
+import numpy as np
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.near_duplicates import MinHasher, MinHashLSH
+
+PASSAGE = ("Farmers with cultivable land are eligible for PM-KISAN. The benefit of 6000 rupees per year "
+           "is paid in three equal instalments directly into the bank accounts of the beneficiaries. "
+           "Institutional land holders and income tax payers are excluded from the scheme.")
+
+
+def test_signatures_estimate_jaccard():
+    hasher = MinHasher(num_perm=128)
+    original = hasher.signature(PASSAGE)
+    # Same passage with a different footer: most shingles are shared
+    variant = hasher.signature(PASSAGE + " Page 4 of 12.")
+    unrelated = hasher.signature("Tomato early blight is controlled by spraying copper fungicide every week.")
+
+    assert np.array_equal(original, MinHasher(num_perm=128).signature(PASSAGE))
+    assert np.mean(original == variant) > 0.8
+    assert np.mean(original == unrelated) < 0.1
+    print("PASS: MinHash signatures are stable and track Jaccard similarity.")
+
+
+def test_lsh_finds_near_duplicates():
+    hasher = MinHasher(num_perm=128)
+    lsh = MinHashLSH(threshold=0.8, num_perm=128, bands=16)
+    lsh.add_many(hasher.signatures([
+        "Tomato early blight is controlled by spraying copper fungicide every week.",
+        PASSAGE,
+    ]))
+
+    assert lsh.query(hasher.signature(PASSAGE + " Page 4 of 12.")) == 1
+    assert lsh.query(hasher.signature("Drip irrigation saves water in sugarcane fields.")) is None
+    print("PASS: LSH returns the near-duplicate document and nothing for new text.")
+
+
+if __name__ == "__main__":
+    test_signatures_estimate_jaccard()
+    test_lsh_finds_near_duplicates()
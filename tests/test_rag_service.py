@@ -0,0 +1,236 @@
+import os
+import sys
+import time
+import pickle
+import tempfile
+import threading
+import numpy as np
+from langchain_core.documents import Document
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.bm25_index import BM25Index
+from core.rag_service import RAGService
+from helpers import hashing_settings
+
+CROPS = ["rice", "wheat", "maize", "cotton", "sugarcane", "tomato", "onion", "mango", "banana", "chilli"]
+TOPICS = ["irrigation schedule", "fertilizer dose", "pest control", "sowing window", "harvest timing"]
+
+
+def _documents():
+    return [
+        Document(page_content=f"{crop.title()} {topic}: advice number {i} for {crop} growers on {topic}.",
+                 metadata={"source": f"{crop}.md", "category": "farming_practices"})
+        for i, (crop, topic) in enumerate((crop, topic) for crop in CROPS for topic in TOPICS)
+    ]
+
+
+def test_truncated_vectors_are_rescored_from_the_chunk_cache():
+    with tempfile.TemporaryDirectory() as tmpdir, \
+            hashing_settings(tmpdir, embedding_dimensions=128, vector_storage="float16"):
+        rag = RAGService(os.path.join(tmpdir, "index"))
+        docs = _documents()
+        rag.add_documents(docs)
+
+        # The default keeps no second float32 copy next to the segments
+        segment_dir = rag.store.segments_dir
+        assert not any(os.path.exists(os.path.join(segment_dir, name, "vectors_full.npy"))
+                       for name in os.listdir(segment_dir))
+        assert rag._snapshot.rescore_dim == 256
+
+        # Re-ranked with the full 256-dim vectors: the same top 2 as an exact full-precision search
+        query = "rice pest control"
+        texts = [doc.page_content for doc in docs]
+        full = np.asarray(rag.embeddings.embed_documents(texts), dtype=np.float32)
+        distances = ((full - np.asarray(rag.embed_query(query), dtype=np.float32)) ** 2).sum(axis=1)
+        expected = [texts[i] for i in np.argsort(distances, kind="stable")[:2]]
+        assert [doc.page_content for doc in rag.semantic_search(query, k=2)] == expected
+    print("PASS: Truncated float16 vectors are re-ranked from the chunk-embedding cache.")
+
+
+def test_deleted_documents_leave_bm25_statistics():
+    with tempfile.TemporaryDirectory() as tmpdir, hashing_settings(tmpdir, compact_deleted_fraction=0):
+        rag = RAGService(os.path.join(tmpdir, "index"))
+        docs = _documents()
+        rag.add_documents(docs)
+        removed = [doc.metadata["chunk_id"] for doc in docs if doc.metadata["source"] in ("rice.md", "wheat.md")]
+        assert rag.delete_documents(removed) == len(removed)
+
+        # Same scores as an index that never contained the deleted documents
+        live_texts = [doc.page_content for doc in docs if doc.metadata["chunk_id"] not in removed]
+        fresh = BM25Index()
+        fresh.add_documents(live_texts)
+        assert len(rag.bm25_index) == len(live_texts)
+        for query in ["pest control", "rice irrigation schedule", "mango harvest timing"]:
+            scores = [round(score, 5) for _, score in rag.bm25_index.search(query, k=10)]
+            assert scores == [round(score, 5) for _, score in fresh.search(query, k=10)]
+    print("PASS: Tombstoned documents are excluded from BM25 corpus statistics.")
+
+
+def test_compaction_drops_deleted_documents():
+    with tempfile.TemporaryDirectory() as tmpdir, hashing_settings(tmpdir, compact_deleted_fraction=0.5):
+        rag = RAGService(os.path.join(tmpdir, "index"))
+        docs = _documents()
+        rag.add_documents(docs[:25])
+        rag.add_documents(docs[25:])
+        by_source = {}
+        for doc in docs:
+            by_source.setdefault(doc.metadata["source"], []).append(doc.metadata["chunk_id"])
+
+        # 10 of 50 deleted: below the threshold, so only tombstoned
+        rag.delete_documents(by_source["rice.md"] + by_source["mango.md"])
+        assert rag._snapshot.generation.n_docs == 50
+        before = {query: [doc.page_content for doc in rag.hybrid_search(query, k=5)]
+                  for query in ["wheat pest control", "banana harvest timing", "mango fertilizer dose"]}
+
+        assert rag.compact()
+        generation = rag._snapshot.generation
+        assert generation.n_docs == generation.n_live == 40 and len(generation.segments) == 1
+        assert not len(generation.deleted)
+        # Same results from the rewritten segment, and chunk IDs still resolve
+        for query, expected in before.items():
+            assert [doc.page_content for doc in rag.hybrid_search(query, k=5)] == expected
+        assert list(generation.lookup(by_source["rice.md"][:1])) == [-1]
+        assert generation.document(int(generation.lookup(by_source["wheat.md"][:1])[0])).page_content == docs[5].page_content
+        assert not rag.compact()
+
+        # Another process opening the index sees the compacted generation
+        assert RAGService(os.path.join(tmpdir, "index"))._snapshot.generation.n_docs == 40
+
+        # Crossing the threshold compacts straight away
+        rag.delete_documents(by_source["wheat.md"] + by_source["maize.md"] + by_source["cotton.md"]
+                             + by_source["onion.md"])
+        generation = rag._snapshot.generation
+        assert generation.n_docs == generation.n_live == 20
+
+        # Superseded segments are removed once no kept manifest refers to them
+        for i in range(rag.store.KEEP_MANIFESTS):
+            rag.add_documents([Document(page_content=f"Extra note {i} on soil testing.", metadata={"source": "soil.md"})])
+        assert sorted(os.listdir(rag.store.segments_dir)) == sorted(s.name for s in rag._snapshot.generation.segments)
+    print("PASS: Compaction rewrites the live documents without tombstones.")
+
+
+def test_reader_hot_reloads_a_writers_generation():
+    with tempfile.TemporaryDirectory() as tmpdir, hashing_settings(tmpdir):
+        path = os.path.join(tmpdir, "index")
+        docs = _documents()
+        writer = RAGService(path)
+        writer.add_documents(docs[:25])
+        reader = RAGService(path)
+        assert reader.index_version == writer.index_version == 1
+        assert not reader.reload()
+
+        writer.add_documents(docs[25:])
+        stale = reader._snapshot
+        assert reader.index_version == 1 and stale.generation.n_live == 25
+        assert reader.reload()
+        assert reader.index_version == writer.index_version == 2
+        assert reader._snapshot.generation.n_live == 50
+        # The old snapshot is untouched (a search still running on it finishes unchanged), and the
+        # first generation's segment is reused rather than reopened
+        assert stale.generation.n_live == 25
+        assert reader._snapshot.generation.segments[0] is stale.generation.segments[0]
+        query = "mango harvest timing"
+        assert [d.page_content for d in reader.hybrid_search(query, k=3)] == \
+            [d.page_content for d in writer.hybrid_search(query, k=3)]
+
+        # Deletes propagate the same way
+        writer.delete_documents([docs[0].metadata["chunk_id"]])
+        assert reader.reload() and reader._snapshot.generation.n_live == 49
+    print("PASS: A reader picks up generations published by another RAGService.")
+
+
+def test_cached_results_are_not_served_from_an_older_version():
+    with tempfile.TemporaryDirectory() as tmpdir, hashing_settings(tmpdir):
+        path = os.path.join(tmpdir, "index")
+        docs = _documents()
+        writer = RAGService(path)
+        writer.add_documents(docs)
+        reader = RAGService(path)
+        query = "Rice pest control"
+
+        first = [doc.page_content for doc in reader.hybrid_search(query, k=3)]
+        assert len(reader.result_cache) == 1
+        # A repeat (normalized the same way) is a cache hit
+        hits = reader.result_cache.hits
+        assert [doc.page_content for doc in reader.hybrid_search("  rice PEST control ", k=3)] == first
+        assert reader.result_cache.hits == hits + 1
+
+        # Another process deletes the top result: the reloaded reader drops its cached results
+        top = next(doc for doc in docs if doc.page_content == first[0])
+        writer.delete_documents([top.metadata["chunk_id"]])
+        assert reader.reload() and len(reader.result_cache) == 0
+        second = [doc.page_content for doc in reader.hybrid_search(query, k=3)]
+        assert first[0] not in second and second[:2] == first[1:]
+        assert reader.result_cache.hits == hits + 1
+    print("PASS: The result cache is invalidated when a new index version is served.")
+
+
+def test_small_commits_are_merged():
+    with tempfile.TemporaryDirectory() as tmpdir, hashing_settings(tmpdir, segment_merge_factor=3):
+        rag = RAGService(os.path.join(tmpdir, "index"))
+        docs = _documents()
+        for start in range(0, 50, 5):
+            rag.add_documents(docs[start:start + 5])
+            assert len(rag._snapshot.generation.segments) < 3
+        generation = rag._snapshot.generation
+        assert generation.n_docs == 50 and [s.n_docs for s in generation.segments] == [45, 5]
+
+        # Same results as one unmerged segment, filters included
+        with hashing_settings(tmpdir, segment_merge_factor=0):
+            single = RAGService(os.path.join(tmpdir, "single"))
+            single.add_documents(docs)
+        for query in ["wheat pest control", "banana harvest timing"]:
+            assert [d.page_content for d in rag.hybrid_search(query, k=4)] == \
+                [d.page_content for d in single.hybrid_search(query, k=4)]
+        assert rag.categories == ["farming_practices"]
+        # Near-duplicate detection still sees the merged documents
+        assert rag.add_documents([docs[7]]) == {} and rag._snapshot.generation.n_docs == 50
+    print("PASS: Micro-batch segments are merged in size tiers without changing results.")
+
+
+class _SlowMigration(RAGService):
+    """Embeds slowly, so services started together all find the legacy index before any has migrated it."""
+
+    def _embed_documents(self, texts, chunk_ids=None):
+        time.sleep(0.3)
+        return super()._embed_documents(texts, chunk_ids)
+
+
+def test_concurrent_startups_migrate_a_legacy_index_once():
+    with tempfile.TemporaryDirectory() as tmpdir, hashing_settings(tmpdir):
+        index_dir = os.path.join(tmpdir, "index")
+        os.makedirs(index_dir)
+        docs = _documents()[:10]
+        with open(os.path.join(index_dir, "documents.pkl"), "wb") as f:
+            pickle.dump(docs, f)
+
+        services, errors = [], []
+
+        def start():
+            try:
+                services.append(_SlowMigration(index_dir))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=start) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+        # One migration committed version 1; the other services loaded it instead of migrating again
+        assert [rag.index_version for rag in services] == [1, 1, 1]
+        assert all(rag._snapshot.generation.n_live == 10 for rag in services)
+    print("PASS: Services starting together migrate a legacy index exactly once.")
+
+
+if __name__ == "__main__":
+    test_truncated_vectors_are_rescored_from_the_chunk_cache()
+    test_deleted_documents_leave_bm25_statistics()
+    test_compaction_drops_deleted_documents()
+    test_reader_hot_reloads_a_writers_generation()
+    test_cached_results_are_not_served_from_an_older_version()
+    test_small_commits_are_merged()
+    test_concurrent_startups_migrate_a_legacy_index_once()
@@ -0,0 +1,91 @@
+import os
+import sys
+import time
+import socket
+import asyncio
+import threading
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import uvicorn
+from fastapi import FastAPI
+from core.retrieval_client import RemoteRAGService
+
+_server_url = None
+# Version the stub server reports; bump it to simulate a newly published generation
+_version = {"search": 1, "health": 1}
+
+
+def _serve() -> str:
+    """Start a stub retrieval server (once per test run) and return its URL."""
+    global _server_url
+    if _server_url is None:
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        app = FastAPI()
+
+        @app.post("/search")
+        def search(request: dict):
+            results = [[{"page_content": f"about {q}", "metadata": {"source": "stub"}}] for q in request["queries"]]
+            return {"index_version": _version["search"], "results": results}
+
+        @app.get("/health")
+        def health():
+            return {"status": "ok", "index_version": _version["health"], "categories": ["crops"]}
+
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        threading.Thread(target=server.run, daemon=True).start()
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+        _server_url = f"http://127.0.0.1:{port}"
+    return _server_url
+
+
+def test_index_version_follows_search_responses():
+    _version.update(search=1, health=1)
+    with RemoteRAGService(_serve()) as client:
+        # Before any search the version comes from /health
+        assert client.index_version == 1
+        _version.update(search=2)
+        assert client.hybrid_search("wheat")[0].page_content == "about wheat"
+        # The new generation is seen with the first results served from it, not after the health TTL
+        assert client.index_version == 2
+        _version.update(search=3)
+        asyncio.run(client.ahybrid_search("rice"))
+        assert client.index_version == 3
+    print("PASS: index_version tracks the version reported with search results.")
+
+
+def test_async_searches_share_one_pool_across_event_loops():
+    client = RemoteRAGService(_serve())
+    for crop in ("wheat", "rice"):
+        # Each asyncio.run is a new event loop; the pooled client is not re-created for it
+        docs = asyncio.run(client.ahybrid_search(crop))
+        assert docs[0].page_content == f"about {crop}"
+    pooled = client._async_client
+    assert pooled is not None
+    asyncio.run(client.ahybrid_search("maize"))
+    assert client._async_client is pooled
+
+    async def search_then_close():
+        async with client:
+            return await asyncio.gather(*(client.ahybrid_search(q) for q in ("a", "b", "c")))
+
+    results = asyncio.run(search_then_close())
+    assert [docs[0].page_content for docs in results] == ["about a", "about b", "about c"]
+    assert pooled.is_closed and client._client.is_closed and client._async_client is None
+    print("PASS: Async searches reuse one connection pool, released by close().")
+
+
+if __name__ == "__main__":
+    test_index_version_follows_search_responses()
+    test_async_searches_share_one_pool_across_event_loops()
@@ -0,0 +1,238 @@
+import os
+import sys
+import tempfile
+import multiprocessing
+import numpy as np
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.bm25_index import BM25Index
+from core.segment_store import SegmentStore, EMPTY_GENERATION, tiered_merge_start
+
+
+def test_append_and_reopen():
+    with tempfile.TemporaryDirectory() as path:
+        store = SegmentStore(path)
+        assert not store.exists()
+
+        generation = EMPTY_GENERATION
+        bm25 = BM25Index()
+        batches = [
+            (["Tomato blight needs copper spray.", "PM-KISAN eligibility rules."], [{"source": "tomato.md"}, {"source": "kisan.pdf", "page": 3}]),
+            (["Mango pruning after harvest."], [{"source": "mango.md"}]),
+        ]
+        for texts, metadatas in batches:
+            vocab_before = len(bm25.vocab)
+            bm25.add_documents(texts)
+            generation = store.commit(
+                generation, texts, metadatas, [f"id-{generation.n_docs + i}" for i in range(len(texts))],
+                np.random.rand(len(texts), 8).astype(np.float32),
+                postings=bm25.segments[-1], new_vocab_terms=list(bm25.vocab)[vocab_before:], dim=8,
+            )
+
+        assert store.current_version() == 2
+        reopened = SegmentStore(path).open_generation()
+        assert reopened.version == 2
+        assert reopened.n_docs == 3
+        assert len(reopened.segments) == 2
+        doc = reopened.document(1)
+        assert doc.page_content == "PM-KISAN eligibility rules."
+        assert doc.metadata == {"source": "kisan.pdf", "page": 3, "chunk_id": "id-1"}
+        assert reopened.text(2) == "Mango pruning after harvest."
+        assert list(reopened.iter_chunk_ids()) == ["id-0", "id-1", "id-2"]
+        assert list(reopened.lookup(["id-2", "missing", "id-0"])) == [2, -1, 0]
+        # Vectors come back memory-mapped
+        assert isinstance(reopened.segments[0].vectors, np.memmap)
+
+        # BM25 rebuilt from the persisted postings matches the in-memory index
+        restored = BM25Index.from_segments(reopened.vocab_terms, [s.postings for s in reopened.segments])
+        for query in ["tomato blight", "mango", "kisan eligibility"]:
+            assert restored.search(query, k=3) == bm25.search(query, k=3)
+    print("PASS: Segment store appends segments and reopens them memory-mapped.")
+
+
+def test_generations_are_isolated():
+    with tempfile.TemporaryDirectory() as path:
+        store = SegmentStore(path)
+        first = store.commit(EMPTY_GENERATION, ["Rice irrigation."], [{}], ["a"], np.zeros((1, 4), np.float32), dim=4)
+        second = store.commit(first, ["Wheat rust."], [{}], ["b"], np.ones((1, 4), np.float32))
+
+        # An older generation keeps serving its own view after a newer commit
+        assert first.n_docs == 1 and second.n_docs == 2
+        assert second.segments[0] is first.segments[0]
+        # Opening on top of the old generation reuses its already-opened segments
+        reopened = store.open_generation(base=first)
+        assert reopened.version == 2 and reopened.segments[0] is first.segments[0]
+
+        # A writer working from a stale generation is refused instead of clobbering the newer one
+        try:
+            store.commit(first, ["Cotton bollworm."], [{}], ["c"], np.ones((1, 4), np.float32))
+            assert False, "stale commit should fail"
+        except RuntimeError:
+            pass
+        assert store.current_version() == 2
+    print("PASS: Generations are immutable and stale writers are rejected.")
+
+
+def test_metadata_is_interned():
+    with tempfile.TemporaryDirectory() as path:
+        metadatas = [{"source": "kisan.pdf", "page": i // 10, "chunk_id": f"c{i}"} for i in range(30)]
+        generation = SegmentStore(path).commit(
+            EMPTY_GENERATION, [f"chunk {i}" for i in range(30)], metadatas,
+            [f"c{i}" for i in range(30)], np.zeros((30, 4), np.float32), dim=4,
+        )
+        segment = generation.segments[0]
+        # One metadata blob per page, chunk IDs live only in chunk_ids.npy
+        assert len(segment.meta_offsets) - 1 == 3
+        assert generation.document(25).metadata == {"source": "kisan.pdf", "page": 2, "chunk_id": "c25"}
+        assert list(generation.lookup(["c7", "c29", "c30"])) == [7, 29, -1]
+    print("PASS: Metadata is interned and chunk IDs are looked up by binary search.")
+
+
+def test_deletes_are_tombstoned():
+    with tempfile.TemporaryDirectory() as path:
+        store = SegmentStore(path)
+        first = store.commit(EMPTY_GENERATION, ["Old scheme.", "Rice irrigation."], [{}, {}], ["old", "rice"],
+                             np.zeros((2, 4), np.float32), dim=4)
+        deleted = store.delete(first, np.array([0]))
+        assert deleted.segments == first.segments and deleted.n_live == 1
+        assert list(deleted.live) == [False, True]
+        assert list(deleted.lookup(["old", "rice"])) == [-1, 1]
+        # The earlier generation still sees the chunk
+        assert list(first.lookup(["old"])) == [0]
+
+        # Re-adding the same chunk later makes it findable again, in its new segment
+        readded = store.commit(deleted, ["Old scheme."], [{}], ["old"], np.zeros((1, 4), np.float32))
+        reopened = SegmentStore(path).open_generation()
+        assert list(reopened.deleted) == [0] and list(reopened.lookup(["old"])) == [2]
+        assert readded.n_live == 2
+    print("PASS: Deleted chunks are tombstoned without rewriting segments.")
+
+
+def test_merge_keeps_doc_ids():
+    with tempfile.TemporaryDirectory() as path:
+        store = SegmentStore(path)
+        generation = EMPTY_GENERATION
+        bm25 = BM25Index()
+        for i in range(4):
+            texts = [f"Crop {i} note {j} on irrigation." for j in range(3)]
+            vocab_before = len(bm25.vocab)
+            bm25.add_documents(texts)
+            generation = store.commit(
+                generation, texts, [{"source": f"{i}.md"}] * 3, [f"c{i}-{j}" for j in range(3)],
+                np.full((3, 4), i, np.float32), postings=bm25.segments[-1],
+                new_vocab_terms=list(bm25.vocab)[vocab_before:], dim=4,
+            )
+        generation = store.delete(generation, np.array([4]))
+        before = [generation.document(i) for i in range(generation.n_docs)]
+
+        merged = store.merge(generation, 1)
+        assert len(merged.segments) == 2 and merged.segments[0] is generation.segments[0]
+        assert merged.segments[1].doc_start == 3 and merged.n_docs == 12
+        # Same document behind every doc ID, and the tombstone still applies
+        assert [merged.document(i) for i in range(12)] == before
+        assert list(merged.deleted) == [4] and list(merged.lookup(["c1-1", "c3-2"])) == [-1, 11]
+        restored = BM25Index.from_segments(merged.vocab_terms, [s.postings for s in merged.segments], live=merged.live)
+        original = BM25Index.from_segments(generation.vocab_terms, [s.postings for s in generation.segments],
+                                           live=generation.live)
+        assert restored.search("crop 2 irrigation", k=5) == original.search("crop 2 irrigation", k=5)
+        # Segments only the old manifests use are removed once those manifests are pruned
+        reopened = SegmentStore(path).open_generation()
+        assert [s.name for s in reopened.segments] == [s.name for s in merged.segments]
+    print("PASS: Merging trailing segments keeps doc IDs and tombstones.")
+
+
+def test_tiered_merge_policy():
+    assert tiered_merge_start([50] * 9, 10) is None
+    assert tiered_merge_start([50] * 10, 10) == 0
+    # Only the small tail is merged, not the large segment in front of it
+    assert tiered_merge_start([5000] + [50] * 10, 10) == 1
+    assert tiered_merge_start([5000, 500, 500] + [50] * 3, 10) is None
+    assert tiered_merge_start([50] * 10, 0) is None
+    # Simulated daemon: 1000 commits of 50 documents stay in a handful of segments
+    sizes = []
+    for _ in range(1000):
+        sizes.append(50)
+        start = tiered_merge_start(sizes, 10)
+        while start is not None:
+            sizes = sizes[:start] + [sum(sizes[start:])]
+            start = tiered_merge_start(sizes, 10)
+    assert sum(sizes) == 50000 and len(sizes) <= 10
+    print("PASS: The size-tiered policy bounds the segment count.")
+
+
+def test_publish_syncs_before_and_after_the_rename():
+    if not os.path.isdir("/proc/self/fd"):
+        print("SKIP: needs /proc to map file descriptors to paths.")
+        return
+    events = []
+    fsync, replace = os.fsync, os.replace
+
+    def recording_fsync(fd):
+        events.append(("fsync", os.readlink(f"/proc/self/fd/{fd}")))
+        fsync(fd)
+
+    def recording_replace(src, dst):
+        events.append(("replace", os.path.realpath(dst)))
+        replace(src, dst)
+
+    with tempfile.TemporaryDirectory() as path:
+        path = os.path.realpath(path)
+        store = SegmentStore(path)
+        os.fsync, os.replace = recording_fsync, recording_replace
+        try:
+            store.commit(EMPTY_GENERATION, ["Rice irrigation."], [{}], ["rice"], np.zeros((1, 4), np.float32), dim=4)
+        finally:
+            os.fsync, os.replace = fsync, replace
+
+        manifest = os.path.join(path, "manifests", "manifest-000001.json")
+        current = os.path.join(path, "CURRENT")
+        at = events.index(("replace", current))
+        segment = events.index(("replace", os.path.join(store.segments_dir, store.open_generation().segments[0].name)))
+        # Segment files, the manifest and CURRENT's contents reach the disk before CURRENT points at them...
+        assert any(kind == "fsync" and name.endswith("vectors.npy") for kind, name in events[:segment])
+        assert events.index(("fsync", manifest)) < at
+        assert events.index(("fsync", current + ".tmp")) < at
+        assert ("fsync", os.path.join(path, "manifests")) in events[:at]
+        # ...and the rename itself is made durable
+        assert ("fsync", path) in events[at:]
+    print("PASS: Publishing fsyncs the segment, manifest and CURRENT, and the directories holding them.")
+
+
+def _commit_repeatedly(path: str, writer: int, n: int):
+    store = SegmentStore(path)
+    for i in range(n):
+        # The writer pattern RAGService uses: reopen the newest generation under the lock, then commit
+        with store.lock():
+            base = store.open_generation()
+            store.commit(base, [f"writer {writer} chunk {i}"], [{}], [f"w{writer}-{i}"],
+                         np.full((1, 4), writer, np.float32), dim=4)
+
+
+def test_concurrent_writers_are_serialized():
+    with tempfile.TemporaryDirectory() as path:
+        context = multiprocessing.get_context("spawn")
+        writers = [context.Process(target=_commit_repeatedly, args=(path, w, 10)) for w in range(3)]
+        for process in writers:
+            process.start()
+        for process in writers:
+            process.join()
+        assert all(process.exitcode == 0 for process in writers)
+
+        generation = SegmentStore(path).open_generation()
+        assert generation.version == 30 and generation.n_docs == 30
+        assert len({segment.name for segment in generation.segments}) == 30
+        assert sorted(generation.iter_chunk_ids()) == sorted(f"w{w}-{i}" for w in range(3) for i in range(10))
+    print("PASS: Writers in separate processes commit one at a time without losing versions.")
+
+
+if __name__ == "__main__":
+    test_append_and_reopen()
+    test_generations_are_isolated()
+    test_metadata_is_interned()
+    test_deletes_are_tombstoned()
+    test_merge_keeps_doc_ids()
+    test_tiered_merge_policy()
+    test_publish_syncs_before_and_after_the_rename()
+    test_concurrent_writers_are_serialized()
@@ -0,0 +1,53 @@
+import os
+import sys
+import time
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.tool_cache import ToolResponseCache, canonical_arguments
+
+URL = "http://localhost:8000/mcp"
+
+
+def test_responses_are_cached_per_tool_ttl():
+    cache = ToolResponseCache({"web_search": 60, "fetch_page": 0.05}, max_entries=10)
+    cache.put(URL, "web_search", {"query": "tomato price", "max_results": 5}, "Title: Mandi rates")
+    # Argument order does not matter
+    assert cache.get(URL, "web_search", {"max_results": 5, "query": "tomato price"}) == "Title: Mandi rates"
+    assert cache.get(URL, "web_search", {"query": "onion price", "max_results": 5}) is None
+
+    cache.put(URL, "fetch_page", {"url": "https://x.test"}, "Tomato 20 Rs/kg")
+    assert cache.get(URL, "fetch_page", {"url": "https://x.test"}) == "Tomato 20 Rs/kg"
+    time.sleep(0.1)
+    assert cache.get(URL, "fetch_page", {"url": "https://x.test"}) is None
+
+    # Tools without a TTL are not cached at all
+    cache.put(URL, "get_weather_forecast", {"latitude": 9.9, "longitude": 78.1}, "Sunny")
+    assert cache.get(URL, "get_weather_forecast", {"latitude": 9.9, "longitude": 78.1}) is None
+
+    stats = cache.stats()
+    assert stats["tools"]["web_search"] == {"hits": 1, "misses": 1}
+    assert stats["tools"]["fetch_page"] == {"hits": 1, "misses": 1}
+    assert canonical_arguments({"b": 1, "a": 2}) == '{"a":2,"b":1}'
+    print("PASS: Tool responses are cached per tool TTL with canonical argument keys.")
+
+
+def test_errors_are_never_cached_and_size_is_bounded():
+    cache = ToolResponseCache({"fetch_page": 60}, max_entries=2)
+    cache.put(URL, "fetch_page", {"url": "a"}, "Failed to fetch page: 403 Forbidden")
+    cache.put(URL, "fetch_page", {"url": "b"}, "MCP Tool Execution Failed: connection refused")
+    assert cache.get(URL, "fetch_page", {"url": "a"}) is None
+    assert cache.get(URL, "fetch_page", {"url": "b"}) is None
+
+    for url in ("c", "d", "e"):
+        cache.put(URL, "fetch_page", {"url": url}, f"page {url}")
+    assert cache.get(URL, "fetch_page", {"url": "c"}) is None
+    assert cache.get(URL, "fetch_page", {"url": "e"}) == "page e"
+    assert cache.stats()["entries"] == 2
+    print("PASS: Error responses are never cached and the LRU stays bounded.")
+
+
+if __name__ == "__main__":
+    test_responses_are_cached_per_tool_ttl()
+    test_errors_are_never_cached_and_size_is_bounded()
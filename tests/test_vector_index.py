@@ -0,0 +1,84 @@
+import os
+import sys
+import tempfile
+import numpy as np
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import faiss
+from core.vector_index import VectorIndex, truncate_embeddings
+
+
+def _data():
+    rng = np.random.default_rng(42)
+    vectors = rng.random((2000, 32), dtype=np.float32)
+    queries = vectors[:50] + rng.normal(0, 0.01, (50, 32)).astype(np.float32)
+    return vectors, queries
+
+
+def test_index_types_recall():
+    vectors, queries = _data()
+    exact = VectorIndex.build("flat", vectors).search(queries, 10)
+
+    for index_type, wide in (("ivf_flat", {"nprobe": 64}), ("hnsw", {"ef_search": 256}), ("ivf_pq", {"nprobe": 64})):
+        index = VectorIndex.build(index_type, vectors, nlist=64, pq_m=8)
+        assert index.index_type == index_type and index.ntotal == len(vectors)
+        approx = index.search(queries, 10, **wide)
+        # PQ distances are approximate, but the nearest neighbour itself is still found
+        top1 = np.mean([a[0] == e[0] for a, e in zip(approx, exact)])
+        assert top1 >= 0.9, (index_type, top1)
+    print("PASS: IVF-Flat, HNSW and IVF-PQ find the exact nearest neighbours.")
+
+
+def test_per_query_params_and_persistence():
+    vectors, queries = _data()
+    index = VectorIndex.build("ivf_flat", vectors, nlist=64, nprobe=1)
+    exact = VectorIndex.build("flat", vectors).search(queries, 10)
+
+    def recall(results):
+        return np.mean([len(set(a) & set(e)) / 10 for a, e in zip(results, exact)])
+
+    # Scanning more lists on a single call raises recall without changing the default
+    assert recall(index.search(queries, 10, nprobe=64)) > recall(index.search(queries, 10))
+
+    with tempfile.TemporaryDirectory() as path:
+        index.save(os.path.join(path, "ivf.faiss"))
+        loaded = VectorIndex.load("ivf_flat", "float32", os.path.join(path, "ivf.faiss"), nprobe=1)
+        assert loaded.nlist == index.nlist
+        assert loaded.search(queries, 10) == index.search(queries, 10)
+
+    # Only documents in the allowed bitmap are returned
+    allowed = np.zeros(len(vectors), dtype=bool)
+    allowed[::5] = True
+    filtered = index.search(queries, 10, nprobe=64, allowed=allowed)
+    assert all(len(row) == 10 and all(i % 5 == 0 for i in row) for row in filtered)
+
+    # Too few vectors to train: falls back to exact search
+    assert VectorIndex.build("ivf_pq", vectors[:100], pq_m=8).index_type == "flat"
+    print("PASS: nprobe is tunable per query and trained indexes round-trip through disk.")
+
+
+def test_quantized_and_truncated_storage():
+    vectors, queries = _data()
+    exact = VectorIndex.build("flat", vectors).search(queries, 1)
+
+    float32_size = len(faiss.serialize_index(VectorIndex.build("hnsw", vectors).index))
+    for storage in ("float16", "int8"):
+        index = VectorIndex.build("hnsw", vectors, storage=storage)
+        assert index.key == f"hnsw-{storage}" and not index.exact
+        assert len(faiss.serialize_index(index.index)) < float32_size
+        top1 = np.mean([a[0] == e[0] for a, e in zip(index.search(queries, 1, ef_search=128), exact)])
+        assert top1 >= 0.9, (storage, top1)
+
+    truncated = truncate_embeddings(vectors, 8)
+    assert truncated.shape == (len(vectors), 8)
+    assert np.allclose(np.linalg.norm(truncated, axis=1), 1.0, atol=1e-5)
+    assert truncate_embeddings(vectors, None) is not None and truncate_embeddings(vectors, 64).shape[1] == 32
+    print("PASS: float16 / int8 storage shrinks the index and truncation re-normalizes.")
+
+
+if __name__ == "__main__":
+    test_index_types_recall()
+    test_per_query_params_and_persistence()
+    test_quantized_and_truncated_storage()
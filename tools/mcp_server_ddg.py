@@ -6,7 +6,6 @@ from bs4 import BeautifulSoup
 # Initialize FastMCP Server
 mcp = FastMCP("DuckDuckGo Search & Weather Forecast")
 
-@mcp.tool()
 def web_search(query: str, max_results: int = 10) -> str:
     """
     Performs a web search using DuckDuckGo (Free, No API Key).
@@ -24,7 +23,6 @@ def web_search(query: str, max_results: int = 10) -> str:
 
     return "\n---\n".join(formatted_results)
 
-@mcp.tool()
 def fetch_page(url: str) -> str:
     """
     Fetches the text content of a webpage.
@@ -60,7 +58,6 @@ def fetch_page(url: str) -> str:
     except Exception as e:
         return f"Failed to fetch page: {e}"
 
-@mcp.tool()
 def get_weather_forecast(latitude: float, longitude: float) -> str:
     """
     Fetches the 7-day weather forecast for a specific latitude and longitude.
@@ -102,6 +99,11 @@ def get_weather_forecast(latitude: float, longitude: float) -> str:
     except Exception as e:
         return f"Error fetching weather data: {e}"
 
+# The functions stay plain callables: MCPWrapper calls them directly with MCP_TRANSPORT=inprocess
+TOOLS = {tool.__name__: tool for tool in (web_search, fetch_page, get_weather_forecast)}
+for tool in TOOLS.values():
+    mcp.tool()(tool)
+
 if __name__ == "__main__":
     # Run as SSE Server on port 8000
     mcp.run(transport="streamable-http", port=8000)